@@ -0,0 +1,56 @@
+"""
+Benchmark the per-request cost of bearer-token authentication
+with and without the verified-token cache.
+
+Usage: python benchmark_auth.py [iterations]
+"""
+import sys
+import time
+
+from starlette.requests import Request
+
+from utils.auth import create_access_token, get_current_user, token_cache
+
+
+def _make_request(token: str) -> Request:
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/api/workouts/",
+        "headers": [(b"authorization", f"Bearer {token}".encode("latin-1"))],
+    }
+    return Request(scope)
+
+
+def _run(request: Request, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        get_current_user(request)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    token = create_access_token(data={"user_id": 1, "email": "bench@gymble.com", "role": "member"})
+    request = _make_request(token)
+
+    original_size = token_cache.max_size
+
+    token_cache.max_size = 0
+    token_cache.clear()
+    uncached = _run(request, iterations)
+
+    token_cache.max_size = original_size or 10000
+    token_cache.clear()
+    cached = _run(request, iterations)
+
+    token_cache.max_size = original_size
+
+    print(f"Iterations: {iterations}")
+    print(f"Without cache: {uncached:.2f} µs/request")
+    print(f"With cache:    {cached:.2f} µs/request")
+    print(f"Speedup:       {uncached / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
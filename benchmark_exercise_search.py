@@ -0,0 +1,88 @@
+"""
+Benchmark exercise search latency over a synthetic catalog.
+
+Builds `size` exercises in memory (no database), builds the search index,
+then times a mix of typeahead prefixes, whole words, misspellings and
+multi-word queries and reports p50/p99/max latency per query.
+
+Usage: python benchmark_exercise_search.py [size] [queries]
+"""
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import schemas
+from utils.exercise_catalog import CatalogSnapshot
+
+MODIFIERS = ["Incline", "Decline", "Seated", "Standing", "Single Arm", "Single Leg", "Wide Grip",
+             "Close Grip", "Reverse", "Paused", "Tempo", "Deficit", "Kneeling", "Lying", "Alternating"]
+MOVEMENTS = ["Bench Press", "Squat", "Deadlift", "Row", "Curl", "Extension", "Fly", "Raise",
+             "Lunge", "Pulldown", "Pullup", "Shrug", "Press", "Kickback", "Crunch", "Bridge", "Thrust"]
+EQUIPMENT = ["barbell", "dumbbell", "cable", "machine", "kettlebell", "band", "bodyweight", "smith machine"]
+MUSCLE_GROUPS = ["chest", "back", "legs", "shoulders", "arms", "core"]
+DESCRIPTION_WORDS = ["compound", "isolation", "stability", "control", "explosive", "hypertrophy",
+                     "strength", "posterior", "anterior", "unilateral", "bilateral", "mobility"]
+
+QUERIES = ["ba", "bar", "barb", "squ", "squat", "dead", "deadlift", "pull", "pulldown", "kett",
+           "sqaut", "benhc", "dumbel", "kettlebel", "pulldwon", "shurg",
+           "incline bench", "single leg dead", "seated cable row", "wide grip pul", "hip thrust"]
+
+
+def _catalog(size: int) -> CatalogSnapshot:
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    exercises = []
+    for index in range(size):
+        equipment = rng.choice(EQUIPMENT)
+        name = f"{rng.choice(MODIFIERS)} {equipment.title()} {rng.choice(MOVEMENTS)}"
+        if index >= len(MODIFIERS) * len(EQUIPMENT) * len(MOVEMENTS):
+            name = f"{name} {index}"  # user-defined variants
+        exercises.append(schemas.Exercise(
+            id=index + 1,
+            name=name,
+            description=" ".join(rng.sample(DESCRIPTION_WORDS, 4)),
+            muscle_group=rng.choice(MUSCLE_GROUPS),
+            equipment=equipment,
+            difficulty=rng.choice(["beginner", "intermediate", "advanced"]),
+            created_at=now,
+        ))
+    return CatalogSnapshot(exercises, version=1)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    catalog = _catalog(size)
+    start = time.perf_counter()
+    index = catalog.search_index
+    print(f"{size} exercises, index built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    for query in QUERIES:
+        index.search(query)  # warm up
+
+    rng = random.Random(7)
+    timings = []
+    for _ in range(queries):
+        query = rng.choice(QUERIES)
+        start = time.perf_counter()
+        index.search(query, limit=20)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(f"{queries} queries: p50 {statistics.median(timings):.3f} ms, "
+          f"p99 {timings[int(len(timings) * 0.99) - 1]:.3f} ms, max {timings[-1]:.3f} ms")
+
+    print(f"\n{'query':>18} {'ms':>7}  top result")
+    for query in QUERIES:
+        start = time.perf_counter()
+        results = index.search(query, limit=20)
+        elapsed = (time.perf_counter() - start) * 1000
+        top = catalog.by_id[results[0][0]].name if results else "-"
+        print(f"{query:>18} {elapsed:>7.3f}  {top}")
+
+
+if __name__ == "__main__":
+    main()
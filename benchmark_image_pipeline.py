@@ -0,0 +1,70 @@
+"""
+Benchmark throughput of the profile-image derivative pipeline.
+
+Generates synthetic photos, then runs derivative generation serially and
+through the process pool.
+
+Usage: python benchmark_image_pipeline.py [images] [source_px]
+"""
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import wait
+from pathlib import Path
+
+from PIL import Image
+
+from utils import images
+
+
+def _make_sources(directory: Path, count: int, size: int) -> list:
+    paths = []
+    for index in range(count):
+        image = Image.effect_noise((size, size), random.randint(10, 100)).convert("RGB")
+        path = directory / f"source_{index}.jpg"
+        image.save(path, "JPEG", quality=90)
+        paths.append(str(path))
+    return paths
+
+
+def _clear_derivatives(directory: Path) -> None:
+    for path in directory.glob("source_*_*"):
+        path.unlink()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    directory = Path(tempfile.mkdtemp(prefix="gymble-images-"))
+
+    try:
+        sources = _make_sources(directory, count, size)
+        outputs = len(images.DERIVATIVE_SIZES) * len(images.DERIVATIVE_FORMATS)
+
+        start = time.perf_counter()
+        for source in sources:
+            images.generate_derivatives(source)
+        serial = time.perf_counter() - start
+        _clear_derivatives(directory)
+
+        executor = images._get_executor()
+        # Warm up worker processes so spawn cost is not measured
+        wait([executor.submit(images.generate_derivatives, sources[0])])
+        _clear_derivatives(directory)
+
+        start = time.perf_counter()
+        wait([executor.submit(images.generate_derivatives, source) for source in sources])
+        pooled = time.perf_counter() - start
+        images.shutdown()
+
+        print(f"Images: {count} at {size}x{size}px, {outputs} derivatives each")
+        print(f"Serial:               {count / serial:.1f} images/s")
+        print(f"Process pool ({images.IMAGE_WORKERS} workers): {count / pooled:.1f} images/s")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Login-burst load test against a running Gymble API.
+
+Fires a burst of concurrent logins while probing /health, to show that
+bcrypt work is confined to the password pool (excess logins get 503)
+and that other endpoints stay responsive.
+
+Usage: python benchmark_login_burst.py [base_url] [concurrency] [requests]
+"""
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+EMAIL = "burst@gymble.com"
+PASSWORD = "burst-password"
+
+
+def _post(url: str, payload: dict) -> int:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def _timed_login(base_url: str):
+    start = time.perf_counter()
+    status_code = _post(f"{base_url}/api/users/login", {"email": EMAIL, "password": PASSWORD})
+    return status_code, (time.perf_counter() - start) * 1000
+
+
+def _probe_health(base_url: str, stop: threading.Event, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        urllib.request.urlopen(f"{base_url}/health").read()
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.01)
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main():
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    total = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+
+    _post(f"{base_url}/api/users/register", {
+        "username": "burst_user",
+        "email": EMAIL,
+        "password": PASSWORD,
+    })
+
+    health_latencies: list = []
+    stop = threading.Event()
+    prober = threading.Thread(target=_probe_health, args=(base_url, stop, health_latencies))
+    prober.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: _timed_login(base_url), range(total)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    prober.join()
+
+    by_status: dict = {}
+    for status_code, _ in results:
+        by_status[status_code] = by_status.get(status_code, 0) + 1
+    ok_latencies = [ms for status_code, ms in results if status_code == 200]
+
+    print(f"Logins: {total} at concurrency {concurrency} in {elapsed:.2f}s")
+    print(f"Status counts: {by_status}")
+    if ok_latencies:
+        print(f"Successful login latency: p50 {statistics.median(ok_latencies):.0f} ms, "
+              f"p99 {_percentile(ok_latencies, 0.99):.0f} ms")
+    if health_latencies:
+        print(f"/health during burst: p50 {statistics.median(health_latencies):.1f} ms, "
+              f"p99 {_percentile(health_latencies, 0.99):.1f} ms ({len(health_latencies)} probes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark offset vs keyset (cursor) pagination at increasing page depth.
+
+Seeds a throwaway database (BENCHMARK_DATABASE_URL, default: a temporary
+SQLite file) with enough exercises for `pages` pages and times fetching
+page 1, 10, 100, 1,000 and 10,000 both ways.
+
+Usage: python benchmark_pagination.py [pages] [page_size]
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "BENCHMARK_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='gymble-pagination-'), 'bench.db')}"
+)
+
+from database import Base, SessionLocal, engine  # noqa: E402
+import models  # noqa: E402
+from utils.pagination import encode_cursor, paginate  # noqa: E402
+
+
+def _seed(db, rows: int) -> None:
+    batch = []
+    for index in range(rows):
+        batch.append({
+            "name": f"Exercise {index}",
+            "muscle_group": "legs",
+            "equipment": "barbell",
+            "difficulty": "beginner",
+        })
+        if len(batch) == 10000:
+            db.execute(models.Exercise.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.execute(models.Exercise.__table__.insert(), batch)
+    db.commit()
+
+
+def _time(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(models.Exercise).count() < pages * page_size:
+            print(f"Seeding {pages * page_size} exercises...")
+            _seed(db, pages * page_size)
+
+        ordered_ids = [row.id for row in db.query(models.Exercise.id).order_by(models.Exercise.id)]
+
+        print(f"{'page':>8} {'offset ms':>10} {'cursor ms':>10}")
+        for page in (1, 10, 100, 1000, 10000):
+            if page > pages:
+                break
+            skip = (page - 1) * page_size
+            cursor = encode_cursor((ordered_ids[skip - 1],)) if skip else None
+
+            offset_ms = _time(lambda: paginate(
+                db.query(models.Exercise), models.Exercise.id, models.Exercise.id,
+                skip=skip, limit=page_size
+            ))
+            cursor_ms = _time(lambda: paginate(
+                db.query(models.Exercise), models.Exercise.id, models.Exercise.id,
+                cursor=cursor, limit=page_size
+            ))
+            print(f"{page:>8} {offset_ms:>10.2f} {cursor_ms:>10.2f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Benchmark loading a user's workout plans with nested joinedload vs selectinload.
+
+Seeds a throwaway database (BENCHMARK_DATABASE_URL, default: a temporary
+SQLite file) with one user holding `plans` plans x `workouts` workouts x
+`exercises` exercises, drawn from a catalog with realistic description and
+instructions text, then times loading and serializing the tree both ways
+and counts the rows the database returns.
+
+Usage: python benchmark_plan_listing.py [plans] [workouts] [exercises]
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "BENCHMARK_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='gymble-plans-'), 'bench.db')}"
+)
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+import models  # noqa: E402
+import schemas  # noqa: E402
+from routers.workout_plans import plan_tree_options  # noqa: E402
+
+CATALOG_SIZE = 100
+
+
+def _seed(db, plans: int, workouts: int, exercises: int) -> int:
+    user = models.User(username="bench", email="bench@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+
+    db.execute(models.Exercise.__table__.insert(), [
+        {
+            "name": f"Exercise {index}",
+            "description": "A compound movement. " * 20,
+            "muscle_group": "legs",
+            "equipment": "barbell",
+            "difficulty": "intermediate",
+            "instructions": "Brace, descend under control, drive up. " * 25,
+        }
+        for index in range(CATALOG_SIZE)
+    ])
+    exercise_ids = [row.id for row in db.query(models.Exercise.id)]
+
+    for plan_index in range(plans):
+        plan = models.WorkoutPlan(user_id=user.id, name=f"Plan {plan_index}", description="Program " * 10)
+        db.add(plan)
+        db.flush()
+        for workout_index in range(workouts):
+            db.add(models.Workout(
+                user_id=user.id,
+                plan_id=plan.id,
+                name=f"Day {workout_index}",
+                description="Session " * 10,
+                exercises=[
+                    models.WorkoutExercise(
+                        exercise_id=exercise_ids[(plan_index * workouts + workout_index + order) % CATALOG_SIZE],
+                        sets=3, reps=8, rest_seconds=90, order=order
+                    )
+                    for order in range(exercises)
+                ]
+            ))
+    db.commit()
+    return user.id
+
+
+def _joined_options():
+    return (
+        joinedload(models.WorkoutPlan.workouts)
+        .joinedload(models.Workout.exercises)
+        .joinedload(models.WorkoutExercise.exercise),
+    )
+
+
+def _load(user_id: int, options) -> dict:
+    stats = {"queries": 0}
+
+    def count_queries(conn, cursor, statement, parameters, context, executemany):
+        stats["queries"] += 1
+
+    db = SessionLocal()
+    event.listen(engine, "before_cursor_execute", count_queries)
+    try:
+        start = time.perf_counter()
+        plans = db.query(models.WorkoutPlan).options(*options).filter(
+            models.WorkoutPlan.user_id == user_id
+        ).all()
+        payload = [schemas.WorkoutPlan.model_validate(plan).model_dump() for plan in plans]
+        stats["ms"] = (time.perf_counter() - start) * 1000
+        stats["plans"] = len(payload)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_queries)
+        db.close()
+    return stats
+
+
+def _result_size(user_id: int, options) -> tuple:
+    """(rows, approximate bytes) the database sends back for the same load"""
+    db = SessionLocal()
+    try:
+        query = db.query(models.WorkoutPlan).options(*options).filter(models.WorkoutPlan.user_id == user_id)
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            query.all()
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+
+        rows = 0
+        size = 0
+        raw = engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            for statement, parameters in statements:
+                cursor.execute(statement, parameters)
+                for row in cursor.fetchall():
+                    rows += 1
+                    size += sum(len(str(value)) for value in row if value is not None)
+        finally:
+            raw.close()
+        return rows, size
+    finally:
+        db.close()
+
+
+def _best(user_id: int, options, repeat: int = 5) -> dict:
+    runs = [_load(user_id, options) for _ in range(repeat)]
+    return min(runs, key=lambda run: run["ms"])
+
+
+def main():
+    plans = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    workouts = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    exercises = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user_id = _seed(db, plans, workouts, exercises)
+    finally:
+        db.close()
+
+    print(f"{plans} plans x {workouts} workouts x {exercises} exercises")
+    print(f"{'strategy':>14} {'ms':>9} {'queries':>8} {'rows':>8} {'KB':>8}")
+    for name, options in (("joinedload", _joined_options()), ("selectinload", plan_tree_options())):
+        result = _best(user_id, options)
+        rows, size = _result_size(user_id, options)
+        print(f"{name:>14} {result['ms']:>9.2f} {result['queries']:>8} {rows:>8} {size / 1024:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark bulk user import against creating users one by one.
+
+Generates `users` NDJSON rows, imports them into a throwaway database
+(BENCHMARK_DATABASE_URL, default: a temporary SQLite file) with the bulk
+importer, and times the one-by-one path (two uniqueness queries, one hash
+and one commit per user, like /register) on a sample for comparison.
+
+bcrypt dominates both paths, so results scale with BCRYPT_ROUNDS and
+PASSWORD_HASH_WORKERS. Use a low cost (e.g. BCRYPT_ROUNDS=4) to measure the
+database side on its own.
+
+Usage: python benchmark_user_import.py [users] [sample]
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "BENCHMARK_DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='gymble-import-'), 'bench.db')}"
+)
+
+from database import Base, SessionLocal, engine  # noqa: E402
+import models  # noqa: E402
+from utils.passwords import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, get_password_hash  # noqa: E402
+from utils.user_import import USER_IMPORT_BATCH_SIZE, UserImporter, iter_rows  # noqa: E402
+
+
+def _ndjson(prefix: str, count: int) -> io.BytesIO:
+    lines = (
+        json.dumps({"username": f"{prefix}{index}", "email": f"{prefix}{index}@example.com", "password": "password123"})
+        for index in range(count)
+    )
+    return io.BytesIO("\n".join(lines).encode("utf-8"))
+
+
+def _one_by_one(db, prefix: str, count: int) -> None:
+    for index in range(count):
+        email = f"{prefix}{index}@example.com"
+        username = f"{prefix}{index}"
+        db.query(models.User).filter(models.User.email == email).first()
+        db.query(models.User).filter(models.User.username == username).first()
+        db.add(models.User(username=username, email=email, hashed_password=get_password_hash("password123")))
+        db.commit()
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    sample = int(sys.argv[2]) if len(sys.argv) > 2 else min(users, 1000)
+
+    Base.metadata.create_all(bind=engine)
+    print(f"bcrypt rounds={BCRYPT_ROUNDS} workers={PASSWORD_HASH_WORKERS} batch={USER_IMPORT_BATCH_SIZE}")
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        _one_by_one(db, "single", sample)
+        single_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = UserImporter(db).run(iter_rows(_ndjson("bulk", users), "ndjson"))
+        bulk_seconds = time.perf_counter() - start
+    finally:
+        db.close()
+
+    print(f"{'path':>12} {'users':>8} {'seconds':>9} {'users/s':>9}")
+    print(f"{'one-by-one':>12} {sample:>8} {single_seconds:>9.2f} {sample / single_seconds:>9.0f}")
+    print(f"{'bulk':>12} {result.created:>8} {bulk_seconds:>9.2f} {result.created / bulk_seconds:>9.0f}")
+    if result.failed:
+        print(f"{result.failed} rows failed, first errors: {result.errors[:3]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 from models import WorkoutPlan, Workout, Base
+import utils.sync_feed  # noqa: F401  stamps sync revisions on the rows created here
 import time
 
 # Wait for database to be ready
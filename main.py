@@ -1,17 +1,48 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from routers import workouts, exercises, users, sessions, dashboard, workout_plans
-from database import engine, Base
-from pathlib import Path
+from routers import workouts, exercises, users, sessions, dashboard, workout_plans, sync
+from database import engine, Base, SessionLocal
+from utils.auth import revocation_list, REVOCATION_PRUNE_SECONDS, REVOCATION_REFRESH_SECONDS
+from utils.rate_limit import RateLimitMiddleware, InMemoryRateLimitStorage, default_route_limits, RATE_LIMIT_MAX_KEYS
+from utils.uploads import UPLOAD_DIR
+from utils.static_files import UploadStaticFiles
+from utils import images
+from utils.exercise_catalog import exercise_catalog, EXERCISE_CATALOG_REFRESH_SECONDS
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the token revocation list and keep it in sync with other workers
+    db = SessionLocal()
+    try:
+        revocation_list.load(db)
+        # Exercise listings are served from memory
+        exercise_catalog.load(db)
+    finally:
+        db.close()
+    revocation_list.start_refresh(SessionLocal, REVOCATION_REFRESH_SECONDS, REVOCATION_PRUNE_SECONDS)
+    exercise_catalog.start_refresh(SessionLocal, EXERCISE_CATALOG_REFRESH_SECONDS)
+    yield
+    exercise_catalog.stop_refresh()
+    revocation_list.stop_refresh()
+    images.shutdown()
+
 app = FastAPI(
     title="Gymble API",
     description="A gym workout tracking API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Rate limit the password-hashing routes (login/registration).
+# Added before CORS so CORS stays outermost and 429s carry its headers.
+app.add_middleware(
+    RateLimitMiddleware,
+    limits=default_route_limits(),
+    storage=InMemoryRateLimitStorage(max_keys=RATE_LIMIT_MAX_KEYS),
 )
 
 # Configure CORS
@@ -21,14 +52,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Catalog-Version"],
 )
 
 # Create uploads directory if it doesn't exist
-upload_dir = Path("uploads")
-upload_dir.mkdir(exist_ok=True)
+UPLOAD_DIR.mkdir(exist_ok=True)
 
-# Mount static files for uploads
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Mount static files for uploads (immutable caching for content-addressed files)
+app.mount("/uploads", UploadStaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 # Include routers
 app.include_router(users.router, prefix="/api/users", tags=["users"])
@@ -36,6 +67,7 @@ app.include_router(workouts.router, prefix="/api/workouts", tags=["workouts"])
 app.include_router(workout_plans.router, prefix="/api/workout-plans", tags=["workout plans"])
 app.include_router(exercises.router, prefix="/api/exercises", tags=["exercises"])
 app.include_router(sessions.router, prefix="/api/sessions", tags=["sessions"])
+app.include_router(sync.router, prefix="/api/sync", tags=["sync"])
 app.include_router(dashboard.router, tags=["dashboard"])
 
 @app.get("/")
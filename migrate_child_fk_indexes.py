@@ -0,0 +1,24 @@
+"""
+Migration script to index the child-row foreign keys used by chunked user deletion
+(workout_exercises.workout_id, session_exercises.session_id).
+"""
+from sqlalchemy import text
+from database import engine
+
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_workout_exercises_workout_id ON workout_exercises (workout_id)",
+    "CREATE INDEX IF NOT EXISTS ix_session_exercises_session_id ON session_exercises (session_id)",
+]
+
+
+def main():
+    with engine.begin() as connection:
+        for statement in INDEXES:
+            connection.execute(text(statement))
+            print(f"✓ {statement}")
+
+
+if __name__ == "__main__":
+    main()
+    print("Child foreign key indexes applied.")
@@ -0,0 +1,74 @@
+"""
+Migration script to make built-in exercise names unique, which the
+idempotent exercise seeding (INSERT ... ON CONFLICT (name) WHERE user_id IS
+NULL) relies on. Custom exercises (exercises.user_id set) may share names,
+so the unique index is partial.
+
+Requires exercises.user_id (migrate_exercise_user_id.py). Duplicate built-in
+names must be resolved by hand first; the script lists them and stops. On
+PostgreSQL the index is built CONCURRENTLY so the table stays writable.
+An earlier version of this script made ix_exercises_name itself unique; that
+index is turned back into a plain one.
+"""
+from sqlalchemy import func, inspect, text
+from database import SessionLocal, engine
+import models
+from utils.exercise_upsert import BUILTIN_NAME_INDEX
+
+
+def _duplicates():
+    db = SessionLocal()
+    try:
+        return (
+            db.query(models.Exercise.name, func.count(models.Exercise.id))
+            .filter(models.Exercise.user_id.is_(None))
+            .group_by(models.Exercise.name)
+            .having(func.count(models.Exercise.id) > 1)
+            .all()
+        )
+    finally:
+        db.close()
+
+
+def migrate():
+    inspector = inspect(engine)
+    if "user_id" not in [column["name"] for column in inspector.get_columns("exercises")]:
+        print("exercises.user_id is missing: run migrate_exercise_user_id.py first")
+        return
+    indexes = {index["name"]: index for index in inspector.get_indexes("exercises")}
+
+    statements = []
+    if BUILTIN_NAME_INDEX not in indexes:
+        duplicates = _duplicates()
+        if duplicates:
+            print("Cannot add the unique index, these built-in exercise names are duplicated:")
+            for name, count in duplicates:
+                print(f"  {name!r}: {count} rows")
+            return
+        statements.append(
+            "CREATE UNIQUE INDEX {concurrently}IF NOT EXISTS " + BUILTIN_NAME_INDEX
+            + " ON exercises (name) WHERE user_id IS NULL"
+        )
+    if indexes.get("ix_exercises_name", {}).get("unique"):
+        statements += [
+            "DROP INDEX {concurrently}IF EXISTS ix_exercises_name",
+            "CREATE INDEX {concurrently}IF NOT EXISTS ix_exercises_name ON exercises (name)",
+        ]
+    if not statements:
+        print("Built-in exercise names are already unique")
+        return
+
+    if engine.dialect.name == "postgresql":
+        # CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            for statement in statements:
+                connection.execute(text(statement.format(concurrently="CONCURRENTLY ")))
+    else:
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement.format(concurrently="")))
+    print("✓ Built-in exercise names are now unique")
+
+
+if __name__ == "__main__":
+    migrate()
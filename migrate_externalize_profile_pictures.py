@@ -0,0 +1,112 @@
+"""
+Backfill job moving base64 profile pictures out of the users table.
+
+Rows are processed in small keyset-ordered batches, each in its own short
+transaction, so the users table is never locked for long. Thumbnails are
+generated after the batch commits and recorded in a second short transaction. Only the ids of
+oversized rows are scanned; the heavy column is read one batch at a time.
+Safe to re-run: converted rows no longer match.
+
+Usage: python migrate_externalize_profile_pictures.py [batch_size] [pause_seconds]
+"""
+import json
+import sys
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import func
+
+import models
+from database import SessionLocal
+from utils.images import generate_derivatives
+from utils.uploads import MAX_PROFILE_PICTURE_REFERENCE_LENGTH, decode_base64_image, store_bytes
+
+
+def _is_inline(column):
+    return (column.like("data:%")) | (func.length(column) > MAX_PROFILE_PICTURE_REFERENCE_LENGTH)
+
+
+def _record_derivatives(stored):
+    """Generate thumbnails outside any transaction, then record them in one short one"""
+    derivatives = {}
+    for user_id, path in stored:
+        try:
+            derivatives[user_id] = (path, json.dumps(generate_derivatives(path)))
+        except Exception as e:
+            print(f"✗ user {user_id}: could not generate derivatives: {e}")
+    if not derivatives:
+        return
+
+    db = SessionLocal()
+    try:
+        for user_id, (path, value) in derivatives.items():
+            db.query(models.User).filter(
+                models.User.id == user_id,
+                models.User.profile_picture == path
+            ).update({models.User.profile_picture_derivatives: value}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def migrate(batch_size: int = 100, pause_seconds: float = 0.1):
+    converted = 0
+    skipped = 0
+    last_id = 0
+
+    while True:
+        db = SessionLocal()
+        try:
+            rows = db.query(models.User.id, models.User.profile_picture).filter(
+                models.User.id > last_id,
+                models.User.profile_picture.isnot(None),
+                _is_inline(models.User.profile_picture)
+            ).order_by(models.User.id).limit(batch_size).all()
+
+            if not rows:
+                break
+
+            updates = []
+            for user_id, picture in rows:
+                last_id = user_id
+                try:
+                    decoded = decode_base64_image(picture)
+                except HTTPException as e:
+                    decoded = None
+                    print(f"✗ user {user_id}: {e.detail}")
+                if decoded is None:
+                    skipped += 1
+                    continue
+
+                data, extension = decoded
+                updates.append((user_id, picture, store_bytes(data, extension).as_posix()))
+
+            # Files are written before any row is touched, so the UPDATEs hold locks only briefly
+            stored = []
+            for user_id, picture, path in updates:
+                # Guard on the old value so a concurrent profile update wins
+                updated = db.query(models.User).filter(
+                    models.User.id == user_id,
+                    models.User.profile_picture == picture
+                ).update({
+                    models.User.profile_picture: path,
+                    models.User.profile_picture_derivatives: None,
+                }, synchronize_session=False)
+                if updated:
+                    stored.append((user_id, path))
+            db.commit()
+            converted += len(stored)
+        finally:
+            db.close()
+
+        _record_derivatives(stored)
+        print(f"Processed up to user {last_id}: {converted} converted, {skipped} skipped")
+        time.sleep(pause_seconds)
+
+    print(f"\nBackfill complete! {converted} converted, {skipped} skipped")
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    pause_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    migrate(batch_size, pause_seconds)
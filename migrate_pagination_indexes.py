@@ -0,0 +1,23 @@
+"""
+Migration script to add the composite indexes used by keyset (cursor) pagination.
+"""
+from sqlalchemy import text
+from database import engine
+
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_workouts_user_id_id ON workouts (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_workout_sessions_user_started_id ON workout_sessions (user_id, started_at, id)",
+]
+
+
+def main():
+    with engine.begin() as connection:
+        for statement in INDEXES:
+            connection.execute(text(statement))
+            print(f"✓ {statement}")
+
+
+if __name__ == "__main__":
+    main()
+    print("Pagination indexes applied.")
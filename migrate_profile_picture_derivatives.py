@@ -0,0 +1,28 @@
+"""
+Migration script to add the profile_picture_derivatives column to users table.
+Existing pictures get derivatives on their next upload.
+"""
+
+from sqlalchemy import inspect, text
+from database import engine
+
+def migrate():
+    # Check if column already exists
+    inspector = inspect(engine)
+    columns = inspector.get_columns('users')
+    column_names = [c['name'] for c in columns]
+    
+    if 'profile_picture_derivatives' not in column_names:
+        print("Adding profile_picture_derivatives column to users table...")
+        with engine.connect() as connection:
+            connection.execute(text("""
+                ALTER TABLE users
+                ADD COLUMN profile_picture_derivatives TEXT NULL
+            """))
+            connection.commit()
+            print("✓ profile_picture_derivatives column added successfully!")
+    else:
+        print("profile_picture_derivatives column already exists")
+
+if __name__ == "__main__":
+    migrate()
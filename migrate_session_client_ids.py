@@ -0,0 +1,37 @@
+"""
+Migration script adding the client_id columns used by offline session sync
+(workout_sessions.client_id and session_exercises.client_id) and their
+unique indexes. Existing rows keep a NULL client_id. Safe to re-run.
+"""
+from sqlalchemy import inspect, text
+from database import engine
+
+
+COLUMNS = [
+    ("workout_sessions", "client_id"),
+    ("session_exercises", "client_id"),
+]
+
+INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_workout_sessions_user_client_id ON workout_sessions (user_id, client_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_session_exercises_session_client_id ON session_exercises (session_id, client_id)",
+]
+
+
+def migrate():
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table, column in COLUMNS:
+            if column in [c['name'] for c in inspector.get_columns(table)]:
+                print(f"{table}.{column} already exists")
+                continue
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} VARCHAR(36) NULL"))
+            print(f"✓ {table}.{column} added")
+        for statement in INDEXES:
+            connection.execute(text(statement))
+            print(f"✓ {statement}")
+
+
+if __name__ == "__main__":
+    migrate()
+    print("Session client ids applied.")
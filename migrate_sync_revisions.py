@@ -0,0 +1,47 @@
+"""
+Migration script for the delta sync feed: adds users.sync_revision and a
+revision column to workouts, workout_plans and workout_sessions, their
+(user_id, revision) indexes, and the sync_tombstones table.
+
+Existing rows and users start at revision 1 (through the column default, so
+no table rewrite or backfill is needed): a client syncing from 0 receives
+them, later writes are stamped 2 and up. Safe to re-run.
+"""
+from sqlalchemy import inspect, text
+from database import Base, engine
+import models
+
+
+COLUMNS = [
+    ("users", "sync_revision"),
+    ("workouts", "revision"),
+    ("workout_plans", "revision"),
+    ("workout_sessions", "revision"),
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_workouts_user_revision ON workouts (user_id, revision)",
+    "CREATE INDEX IF NOT EXISTS ix_workout_plans_user_revision ON workout_plans (user_id, revision)",
+    "CREATE INDEX IF NOT EXISTS ix_workout_sessions_user_revision ON workout_sessions (user_id, revision)",
+]
+
+
+def migrate():
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table, column in COLUMNS:
+            if column in [c['name'] for c in inspector.get_columns(table)]:
+                print(f"{table}.{column} already exists")
+                continue
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 1"))
+            print(f"✓ {table}.{column} added")
+        for statement in INDEXES:
+            connection.execute(text(statement))
+            print(f"✓ {statement}")
+    Base.metadata.create_all(bind=engine, tables=[models.SyncTombstone.__table__])
+    print("✓ sync_tombstones table ready")
+
+
+if __name__ == "__main__":
+    migrate()
+    print("Sync revisions applied.")
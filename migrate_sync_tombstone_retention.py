@@ -0,0 +1,26 @@
+"""
+Migration script for tombstone retention: adds users.sync_pruned_revision
+(0, nothing pruned yet) and an index on sync_tombstones.deleted_at for
+prune_sync_tombstones.py. Safe to re-run.
+"""
+from sqlalchemy import inspect, text
+from database import engine
+
+
+def migrate():
+    columns = [c['name'] for c in inspect(engine).get_columns('users')]
+    with engine.begin() as connection:
+        if 'sync_pruned_revision' not in columns:
+            connection.execute(text("ALTER TABLE users ADD COLUMN sync_pruned_revision INTEGER NOT NULL DEFAULT 0"))
+            print("✓ users.sync_pruned_revision added")
+        else:
+            print("users.sync_pruned_revision already exists")
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_sync_tombstones_deleted_at ON sync_tombstones (deleted_at)"
+        ))
+        print("✓ ix_sync_tombstones_deleted_at ready")
+
+
+if __name__ == "__main__":
+    migrate()
+    print("Tombstone retention applied.")
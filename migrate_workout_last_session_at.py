@@ -0,0 +1,64 @@
+"""
+Migration script adding workouts.last_session_at and backfilling it.
+
+The column is added if missing, then filled in keyset-ordered batches of
+workouts: one correlated UPDATE and one short transaction per id range.
+Safe to re-run: every batch recomputes the value from workout_sessions.
+
+Usage: python migrate_workout_last_session_at.py [batch_size]
+"""
+import sys
+
+from sqlalchemy import func, inspect, text, update
+
+import models
+from database import SessionLocal, engine
+from utils.last_session import latest_session_start
+
+
+def add_column():
+    columns = [c['name'] for c in inspect(engine).get_columns('workouts')]
+    if 'last_session_at' not in columns:
+        print("Adding last_session_at column to workouts table...")
+        with engine.connect() as connection:
+            connection.execute(text("ALTER TABLE workouts ADD COLUMN last_session_at TIMESTAMP NULL"))
+            connection.commit()
+            print("✓ last_session_at column added successfully!")
+    else:
+        print("last_session_at column already exists")
+
+
+def backfill(batch_size: int = 1000):
+    updated = 0
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            batch = db.query(models.Workout.id).filter(
+                models.Workout.id > last_id
+            ).order_by(models.Workout.id).limit(batch_size).subquery()
+            upper_id, count = db.query(func.max(batch.c.id), func.count()).one()
+            if not count:
+                break
+
+            db.execute(
+                update(models.Workout)
+                .where(models.Workout.id > last_id, models.Workout.id <= upper_id)
+                .values(
+                    last_session_at=latest_session_start(models.Workout.id),
+                    updated_at=models.Workout.updated_at
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            last_id = upper_id
+            updated += count
+            print(f"✓ {updated} workouts backfilled")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    add_column()
+    backfill(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+    print("last_session_at backfill complete.")
@@ -0,0 +1,26 @@
+"""
+Migration script adding the is_shared flags (workouts.is_shared and
+workout_plans.is_shared) that allow other users to clone a workout or plan.
+Existing rows stay private. Safe to re-run.
+"""
+from sqlalchemy import inspect, text
+from database import engine
+
+
+TABLES = ["workouts", "workout_plans"]
+
+
+def migrate():
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in TABLES:
+            if "is_shared" in [c['name'] for c in inspector.get_columns(table)]:
+                print(f"{table}.is_shared already exists")
+                continue
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN is_shared BOOLEAN NOT NULL DEFAULT FALSE"))
+            print(f"✓ {table}.is_shared added")
+
+
+if __name__ == "__main__":
+    migrate()
+    print("Sharing flags applied.")
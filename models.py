@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Enum, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -20,9 +20,12 @@ class User(Base):
     height = Column(Float, nullable=True)  # in cm
     weight = Column(Float, nullable=True)  # in kg
     bio = Column(Text, nullable=True)
-    profile_picture = Column(String, nullable=True)  # URL or base64
+    profile_picture = Column(String, nullable=True)  # URL or uploads/ path (base64 is externalized on write)
+    profile_picture_derivatives = Column(Text, nullable=True)  # JSON: {size: {format: path}}
     role = Column(Enum(UserRole), default=UserRole.member)
     created_at = Column(DateTime, default=datetime.utcnow)
+    sync_revision = Column(Integer, default=0, nullable=False)  # latest revision stamped on this user's data (see utils/sync_feed.py)
+    sync_pruned_revision = Column(Integer, default=0, nullable=False)  # tombstones up to this revision were pruned
     
     workouts = relationship("Workout", back_populates="user")
     workout_sessions = relationship("WorkoutSession", back_populates="user")
@@ -38,7 +41,16 @@ class Exercise(Base):
     equipment = Column(String)  # barbell, dumbbell, machine, bodyweight, cable
     difficulty = Column(String)  # beginner, intermediate, advanced
     instructions = Column(Text)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # NULL = built-in exercise
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Built-in names are unique (the seeding upsert relies on it); custom exercises may repeat them
+        Index(
+            "uq_exercises_builtin_name", "name", unique=True,
+            postgresql_where=text("user_id IS NULL"), sqlite_where=text("user_id IS NULL")
+        ),
+    )
     
     workout_exercises = relationship("WorkoutExercise", back_populates="exercise")
     session_exercises = relationship("SessionExercise", back_populates="exercise")
@@ -53,13 +65,25 @@ class Workout(Base):
     description = Column(Text)
     icon = Column(String, default="fitness")  # Icon name (e.g., "fitness", "barbell", "heart", etc.)
     category = Column(String, default="general")  # Category: strength, cardio, flexibility, sports, general
+    is_shared = Column(Boolean, default=False, nullable=False)  # other users may clone it
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_session_at = Column(DateTime, nullable=True)  # denormalized max(workout_sessions.started_at)
+    revision = Column(Integer, default=0, nullable=False)  # owner's sync revision of the last change
+    
+    __table_args__ = (
+        Index("ix_workouts_user_id_id", "user_id", "id"),  # keyset pagination
+        Index("ix_workouts_user_revision", "user_id", "revision"),  # delta sync
+    )
     
     user = relationship("User", back_populates="workouts")
     plan = relationship("WorkoutPlan", back_populates="workouts")
     exercises = relationship("WorkoutExercise", back_populates="workout", cascade="all, delete-orphan")
     sessions = relationship("WorkoutSession", back_populates="workout")
+    
+    @property
+    def last_session_date(self):
+        return self.last_session_at
 
 
 class WorkoutPlan(Base):
@@ -69,8 +93,14 @@ class WorkoutPlan(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     name = Column(String, index=True)
     description = Column(Text)
+    is_shared = Column(Boolean, default=False, nullable=False)  # other users may clone it and its workouts
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    revision = Column(Integer, default=0, nullable=False)  # owner's sync revision of the last change
+
+    __table_args__ = (
+        Index("ix_workout_plans_user_revision", "user_id", "revision"),  # delta sync
+    )
 
     user = relationship("User", back_populates="workout_plans")
     workouts = relationship("Workout", back_populates="plan")
@@ -79,7 +109,7 @@ class WorkoutExercise(Base):
     __tablename__ = "workout_exercises"
     
     id = Column(Integer, primary_key=True, index=True)
-    workout_id = Column(Integer, ForeignKey("workouts.id"))
+    workout_id = Column(Integer, ForeignKey("workouts.id"), index=True)
     exercise_id = Column(Integer, ForeignKey("exercises.id"))
     sets = Column(Integer)
     reps = Column(Integer)
@@ -106,6 +136,14 @@ class WorkoutSession(Base):
     total_volume = Column(Float, nullable=True)  # Sum of all volumes
     
     notes = Column(Text, nullable=True)
+    client_id = Column(String(36), nullable=True)  # UUID generated by the app, for idempotent offline sync
+    revision = Column(Integer, default=0, nullable=False)  # owner's sync revision of the last change (incl. its exercises)
+    
+    __table_args__ = (
+        Index("ix_workout_sessions_user_started_id", "user_id", "started_at", "id"),  # keyset pagination
+        Index("uq_workout_sessions_user_client_id", "user_id", "client_id", unique=True),
+        Index("ix_workout_sessions_user_revision", "user_id", "revision"),  # delta sync
+    )
     
     user = relationship("User", back_populates="workout_sessions")
     workout = relationship("Workout", back_populates="sessions")
@@ -115,7 +153,7 @@ class SessionExercise(Base):
     __tablename__ = "session_exercises"
     
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("workout_sessions.id"))
+    session_id = Column(Integer, ForeignKey("workout_sessions.id"), index=True)
     exercise_id = Column(Integer, ForeignKey("exercises.id"))
     sets_completed = Column(Integer)
     reps_completed = Column(Integer)
@@ -132,6 +170,49 @@ class SessionExercise(Base):
     avg_rpe = Column(Float, nullable=True)  # Average Rate of Perceived Exertion
     
     notes = Column(Text, nullable=True)
+    client_id = Column(String(36), nullable=True)  # UUID generated by the app, for idempotent offline sync
+    
+    __table_args__ = (
+        Index("uq_session_exercises_session_client_id", "session_id", "client_id", unique=True),
+    )
     
     session = relationship("WorkoutSession", back_populates="exercises")
     exercise = relationship("Exercise", back_populates="session_exercises")
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String, unique=True, index=True, nullable=True)  # NULL = all tokens issued to the user before revoked_at
+    user_id = Column(Integer, index=True)  # no FK: rows must outlive deleted users
+    revoked_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)  # row can be pruned after this
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+
+    # A deleted workout, plan or session, reported by the delta sync feed
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)  # no FK: removed together with the user by the deletion job
+    kind = Column(String(32), nullable=False)  # workouts, workout_plans, sessions
+    object_id = Column(Integer, nullable=False)
+    revision = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_sync_tombstones_user_revision", "user_id", "revision"),
+        Index("ix_sync_tombstones_deleted_at", "deleted_at"),
+    )
+
+class UserCounters(Base):
+    __tablename__ = "user_counters"
+
+    # Denormalized activity totals, maintained in the same transaction as the
+    # rows they count (see utils/counters.py); reconcile_user_counters.py repairs drift
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    workouts = Column(Integer, default=0, nullable=False)
+    sessions = Column(Integer, default=0, nullable=False)
+    completed_sessions = Column(Integer, default=0, nullable=False)
+    workout_plans = Column(Integer, default=0, nullable=False)
+    total_minutes = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
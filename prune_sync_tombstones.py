@@ -0,0 +1,48 @@
+"""
+Retention job for the delta sync feed's tombstones.
+
+Deletes tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS, a batch of
+users per transaction, and records per user the newest pruned revision.
+Clients that last synced before it get a 410 from /api/sync/changes and
+resync from since=0. Safe to run at any time, e.g. nightly from cron.
+
+Usage: python prune_sync_tombstones.py [batch_size]
+"""
+import sys
+from datetime import datetime, timedelta
+
+import models
+from database import SessionLocal
+from utils.sync_feed import SYNC_TOMBSTONE_RETENTION_DAYS, prune_tombstones
+
+
+def prune(batch_size: int = 500):
+    before = datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+    users = 0
+    deleted = 0
+    last_id = 0
+
+    while True:
+        db = SessionLocal()
+        try:
+            user_ids = [row.user_id for row in db.query(models.SyncTombstone.user_id).filter(
+                models.SyncTombstone.deleted_at < before,
+                models.SyncTombstone.user_id > last_id
+            ).distinct().order_by(models.SyncTombstone.user_id).limit(batch_size)]
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+
+            deleted += prune_tombstones(db, before, user_ids)
+            db.commit()
+            users += len(user_ids)
+            print(f"✓ {users} users pruned")
+        finally:
+            db.close()
+
+    print(f"\nPruning complete! {deleted} tombstones older than {SYNC_TOMBSTONE_RETENTION_DAYS} days deleted")
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    prune(batch_size)
@@ -0,0 +1,93 @@
+"""
+Reconciliation job for the denormalized user_counters table.
+
+Recomputes every user's totals with grouped aggregate queries, compares
+them with the stored counters and repairs any drift (missing rows, lost
+updates, rows changed outside the API). Processes users in batches so each
+transaction stays short. Safe to run at any time, e.g. nightly from cron.
+
+Usage: python reconcile_user_counters.py [batch_size]
+"""
+import sys
+
+from sqlalchemy import func
+
+import models
+from database import SessionLocal, engine, Base
+from utils.counters import COUNTER_FIELDS
+
+
+def _grouped(db, user_column, aggregates, user_ids):
+    """{user_id: (aggregate values...)} for one table, in a single GROUP BY query"""
+    rows = db.query(user_column, *aggregates).filter(
+        user_column.in_(user_ids)
+    ).group_by(user_column).all()
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def reconcile(batch_size: int = 500):
+    Base.metadata.create_all(bind=engine)
+    checked = 0
+    repaired = 0
+    last_id = 0
+
+    while True:
+        db = SessionLocal()
+        try:
+            user_ids = [row.id for row in db.query(models.User.id).filter(
+                models.User.id > last_id
+            ).order_by(models.User.id).limit(batch_size)]
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+
+            workouts = _grouped(db, models.Workout.user_id, [func.count(models.Workout.id)], user_ids)
+            sessions = _grouped(db, models.WorkoutSession.user_id, [
+                func.count(models.WorkoutSession.id),
+                func.count(models.WorkoutSession.completed_at),
+                func.coalesce(func.sum(models.WorkoutSession.duration_minutes), 0),
+            ], user_ids)
+            plans = _grouped(db, models.WorkoutPlan.user_id, [func.count(models.WorkoutPlan.id)], user_ids)
+            stored = {
+                row.user_id: row
+                for row in db.query(models.UserCounters).filter(models.UserCounters.user_id.in_(user_ids))
+            }
+
+            for user_id in user_ids:
+                session_counts = sessions.get(user_id, (0, 0, 0))
+                expected = {
+                    "workouts": workouts.get(user_id, (0,))[0],
+                    "sessions": session_counts[0],
+                    "completed_sessions": session_counts[1],
+                    "workout_plans": plans.get(user_id, (0,))[0],
+                    "total_minutes": int(session_counts[2] or 0),
+                }
+                checked += 1
+
+                counters = stored.get(user_id)
+                if counters is None:
+                    db.add(models.UserCounters(user_id=user_id, **expected))
+                    repaired += 1
+                    continue
+
+                drift = {
+                    field: (getattr(counters, field), expected[field])
+                    for field in COUNTER_FIELDS
+                    if getattr(counters, field) != expected[field]
+                }
+                if drift:
+                    print(f"✗ user {user_id} drifted: {drift}")
+                    for field in drift:
+                        setattr(counters, field, expected[field])
+                    repaired += 1
+
+            db.commit()
+        finally:
+            db.close()
+
+    print(f"\nReconciliation complete! {checked} users checked, {repaired} repaired")
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    reconcile(batch_size)
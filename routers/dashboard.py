@@ -1,7 +1,8 @@
 from datetime import datetime, timedelta
+import json
 from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi import APIRouter, Depends, Query, Request, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy import func
@@ -10,7 +11,11 @@ from sqlalchemy.orm import Session, selectinload
 import models
 from database import get_db
 from utils.stats import WorkoutAnalytics
-from utils.auth import verify_token_and_get_user
+from utils.auth import get_current_admin, verify_token_and_get_user
+from utils.static_files import upload_stats
+from utils.pagination import MAX_PAGE_SIZE, paginate
+from utils.counters import get_counters, get_counters_for_users
+from utils.exercise_catalog import exercise_catalog
 
 router = APIRouter()
 
@@ -21,21 +26,26 @@ templates = Jinja2Templates(directory="templates")
 
 @router.get("/users-list")
 def get_users_list(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
     Get list of all users with their statistics
     Used for user management dashboard
+    Pass `next_cursor` back as `cursor` to fetch the next page
     """
-    users = db.query(models.User).offset(skip).limit(limit).all()
+    users, next_cursor = paginate(
+        db.query(models.User), models.User.id, models.User.id,
+        cursor=cursor, skip=skip, limit=limit
+    )
+    
+    counters = get_counters_for_users(db, [user.id for user in users])
     
     users_list = []
     for user in users:
-        workout_count = db.query(models.Workout).filter(models.Workout.user_id == user.id).count()
-        session_count = db.query(models.WorkoutSession).filter(models.WorkoutSession.user_id == user.id).count()
-        
+        user_counters = counters[user.id]
         users_list.append({
             "id": user.id,
             "username": user.username,
@@ -47,12 +57,22 @@ def get_users_list(
             "bio": user.bio,
             "role": user.role.value if hasattr(user.role, 'value') else str(user.role),
             "profile_picture": user.profile_picture,
+            "profile_picture_derivatives": json.loads(user.profile_picture_derivatives) if user.profile_picture_derivatives else None,
             "created_at": user.created_at.isoformat() if user.created_at else None,
-            "workout_count": workout_count,
-            "session_count": session_count,
+            "workout_count": user_counters.workouts,
+            "session_count": user_counters.sessions,
         })
     
-    return {"data": users_list, "total": len(users_list)}
+    return {"data": users_list, "total": len(users_list), "next_cursor": next_cursor}
+
+
+@router.get("/uploads-stats")
+def get_uploads_stats(admin: models.User = Depends(get_current_admin)):
+    """
+    Get /uploads serving counters
+    Shows how many bytes conditional requests and precompressed files saved
+    """
+    return upload_stats.as_dict()
 
 
 @router.get("/user/{user_id}/stats")
@@ -68,21 +88,13 @@ def get_user_stats(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    workout_count = db.query(models.Workout).filter(models.Workout.user_id == user_id).count()
-    session_count = db.query(models.WorkoutSession).filter(models.WorkoutSession.user_id == user_id).count()
-    
-    # Get total time trained
-    total_minutes = db.query(func.sum(models.WorkoutSession.duration_minutes)).filter(
-        models.WorkoutSession.user_id == user_id,
-        models.WorkoutSession.duration_minutes.isnot(None)
-    ).scalar() or 0
+    counters = get_counters(db, user_id)
+    workout_count = counters.workouts
+    session_count = counters.sessions
+    total_minutes = counters.total_minutes
+    completed_sessions = counters.completed_sessions
     
     # Get completion rate
-    completed_sessions = db.query(models.WorkoutSession).filter(
-        models.WorkoutSession.user_id == user_id,
-        models.WorkoutSession.completed_at.isnot(None)
-    ).count()
-    
     completion_rate = round((completed_sessions / session_count * 100), 1) if session_count > 0 else 0
     
     return {
@@ -119,15 +131,18 @@ def get_comprehensive_stats(
         models.WorkoutSession.completed_at >= cutoff_date
     ).order_by(models.WorkoutSession.completed_at.desc()).all()
     
-    # Get all unique exercises trained
-    exercises = db.query(models.Exercise).join(
-        models.SessionExercise
-    ).join(
+    # Get all unique exercises trained (details come from the in-memory catalog)
+    catalog = exercise_catalog.snapshot
+    exercise_ids = db.query(models.SessionExercise.exercise_id).join(
         models.WorkoutSession
     ).filter(
         models.WorkoutSession.user_id == user_id,
         models.WorkoutSession.completed_at >= cutoff_date
     ).distinct().all()
+    exercises = [
+        catalog.get(exercise_id) for (exercise_id,) in exercise_ids
+        if catalog.get(exercise_id) is not None
+    ]
     
     # Build comprehensive data
     stats = {
@@ -224,7 +239,7 @@ def get_exercise_detailed_stats(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    exercise = db.query(models.Exercise).filter(models.Exercise.id == exercise_id).first()
+    exercise = exercise_catalog.snapshot.get(exercise_id)
     if not exercise:
         raise HTTPException(status_code=404, detail="Exercise not found")
     
@@ -441,7 +456,8 @@ def dashboard(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
     
     total_users = db.query(models.User).count()
     total_workouts = db.query(models.Workout).count()
-    total_exercises = db.query(models.Exercise).count()
+    catalog = exercise_catalog.snapshot
+    total_exercises = len(catalog.by_id)
     total_sessions = db.query(models.WorkoutSession).count()
 
     completed_sessions = (
@@ -487,10 +503,11 @@ def dashboard(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
         .all()
     )
 
+    all_counters = get_counters_for_users(db, [user_item.id for user_item in all_users_query])
+
     all_users = []
     for user_item in all_users_query:
-        workout_count = db.query(models.Workout).filter(models.Workout.user_id == user_item.id).count()
-        session_count = db.query(models.WorkoutSession).filter(models.WorkoutSession.user_id == user_item.id).count()
+        user_counters = all_counters[user_item.id]
         all_users.append({
             "id": user_item.id,
             "username": user_item.username,
@@ -502,8 +519,8 @@ def dashboard(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
             "bio": user_item.bio,
             "role": user_item.role.value,
             "created_at": _format_datetime(user_item.created_at),
-            "workout_count": workout_count,
-            "session_count": session_count,
+            "workout_count": user_counters.workouts,
+            "session_count": user_counters.sessions,
         })
 
     days_back = 6
@@ -543,15 +560,8 @@ def dashboard(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
         .all()
     )
 
-    muscle_distribution = (
-        db.query(
-            models.Exercise.muscle_group.label("group"),
-            func.count(models.Exercise.id).label("total"),
-        )
-        .group_by(models.Exercise.muscle_group)
-        .order_by(func.count(models.Exercise.id).desc())
-        .all()
-    )
+    _, facets = catalog.facets.facet_counts()
+    muscle_distribution = sorted(facets["muscle_group"].items(), key=lambda item: -item[1])
 
     context: Dict[str, object] = {
         "request": request,
@@ -594,8 +604,8 @@ def dashboard(request: Request, db: Session = Depends(get_db)) -> HTMLResponse:
             for row in top_exercises
         ],
         "muscle_distribution": [
-            {"group": row.group or "unspecified", "total": row.total}
-            for row in muscle_distribution
+            {"group": group or "unspecified", "total": total}
+            for group, total in muscle_distribution
         ],
     }
     context["generated_at"] = _format_datetime(datetime.utcnow())
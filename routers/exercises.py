@@ -1,44 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import models
 import schemas
 from database import get_db
+from utils.conditional import conditional_response, weak_etag
+from utils.exercise_catalog import exercise_catalog
+from utils.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, set_next_cursor
 
 router = APIRouter()
 
+CATALOG_VERSION_HEADER = "X-Catalog-Version"
+
+def _commit_unique_name(db: Session) -> None:
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="An exercise with this name already exists")
+
 @router.post("/", response_model=schemas.Exercise, status_code=status.HTTP_201_CREATED)
 def create_exercise(exercise: schemas.ExerciseCreate, db: Session = Depends(get_db)):
     db_exercise = models.Exercise(**exercise.dict())
     db.add(db_exercise)
-    db.commit()
+    _commit_unique_name(db)
     db.refresh(db_exercise)
+    exercise_catalog.upsert(db_exercise)
     return db_exercise
 
 @router.get("/", response_model=List[schemas.Exercise])
 def get_exercises(
-    skip: int = 0, 
-    limit: int = 100,
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     muscle_group: Optional[str] = None,
     equipment: Optional[str] = None,
-    difficulty: Optional[str] = None,
-    db: Session = Depends(get_db)
+    difficulty: Optional[str] = None
 ):
-    query = db.query(models.Exercise)
+    """List exercises from the in-memory catalog (no database access)"""
+    catalog = exercise_catalog.snapshot
+    response.headers[CATALOG_VERSION_HEADER] = str(catalog.version)
+    not_modified = conditional_response(
+        request, response, weak_etag("exercises", catalog.digest, request.url.query)
+    )
+    if not_modified:
+        return not_modified
     
-    if muscle_group:
-        query = query.filter(models.Exercise.muscle_group == muscle_group)
-    if equipment:
-        query = query.filter(models.Exercise.equipment == equipment)
-    if difficulty:
-        query = query.filter(models.Exercise.difficulty == difficulty)
-    
-    exercises = query.offset(skip).limit(limit).all()
+    ids = catalog.filter_ids(muscle_group=muscle_group, equipment=equipment, difficulty=difficulty)
+    after_id = decode_cursor(cursor, [models.Exercise.id])[0] if cursor else None
+    exercises, last_id = catalog.page(ids, after_id=after_id, skip=skip, limit=limit)
+    set_next_cursor(response, encode_cursor((last_id,)) if last_id is not None else None)
     return exercises
 
+@router.get("/search", response_model=List[schemas.Exercise])
+def search_exercises(
+    response: Response,
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    muscle_group: Optional[str] = None,
+    equipment: Optional[str] = None,
+    difficulty: Optional[str] = None
+):
+    """
+    Typeahead / fuzzy search over exercise name, description and equipment,
+    best matches first (served from the in-memory catalog)
+    """
+    catalog = exercise_catalog.snapshot
+    response.headers[CATALOG_VERSION_HEADER] = str(catalog.version)
+    allowed_ids = None
+    if muscle_group or equipment or difficulty:
+        allowed_ids = set(catalog.filter_ids(muscle_group=muscle_group, equipment=equipment, difficulty=difficulty))
+    results = catalog.search_index.search(q, allowed_ids=allowed_ids, limit=limit)
+    return [catalog.by_id[exercise_id] for exercise_id, _ in results]
+
+@router.get("/facets", response_model=schemas.ExerciseFacets)
+def get_exercise_facets(
+    request: Request,
+    response: Response,
+    muscle_group: Optional[str] = None,
+    equipment: Optional[str] = None,
+    difficulty: Optional[str] = None
+):
+    """
+    Exercise counts per muscle group, equipment and difficulty. Each facet
+    is counted under the other facets' filters, e.g. ?muscle_group=chest
+    gives the equipment and difficulty breakdown of chest exercises.
+    """
+    catalog = exercise_catalog.snapshot
+    response.headers[CATALOG_VERSION_HEADER] = str(catalog.version)
+    not_modified = conditional_response(
+        request, response, weak_etag("exercise-facets", catalog.digest, request.url.query)
+    )
+    if not_modified:
+        return not_modified
+
+    total, facets = catalog.facets.facet_counts(
+        muscle_group=muscle_group, equipment=equipment, difficulty=difficulty
+    )
+    return {
+        "total": total,
+        "facets": {
+            field: [
+                {"value": value, "count": count}
+                for value, count in sorted(counts.items(), key=lambda item: (-item[1], item[0] or ""))
+            ]
+            for field, counts in facets.items()
+        },
+    }
+
 @router.get("/{exercise_id}", response_model=schemas.Exercise)
-def get_exercise(exercise_id: int, db: Session = Depends(get_db)):
-    exercise = db.query(models.Exercise).filter(models.Exercise.id == exercise_id).first()
+def get_exercise(exercise_id: int):
+    exercise = exercise_catalog.snapshot.get(exercise_id)
     if exercise is None:
         raise HTTPException(status_code=404, detail="Exercise not found")
     return exercise
@@ -56,8 +131,9 @@ def update_exercise(
     for key, value in exercise.dict().items():
         setattr(db_exercise, key, value)
     
-    db.commit()
+    _commit_unique_name(db)
     db.refresh(db_exercise)
+    exercise_catalog.upsert(db_exercise)
     return db_exercise
 
 @router.delete("/{exercise_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -68,4 +144,5 @@ def delete_exercise(exercise_id: int, db: Session = Depends(get_db)):
     
     db.delete(db_exercise)
     db.commit()
+    exercise_catalog.remove(exercise_id)
     return None
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 import models
@@ -7,10 +7,19 @@ from database import get_db
 from datetime import datetime
 from utils.stats import WorkoutAnalytics
 from utils.auth import get_current_user
+from utils.pagination import MAX_PAGE_SIZE, paginate, set_next_cursor
+from utils.counters import adjust_counters, counter_deltas, session_counter_values
+from utils.conditional import conditional_response, session_etag
+from utils.last_session import record_session_start, refresh_last_session
+from utils.exercise_catalog import exercise_catalog
+from utils.session_sets import append_set, get_or_create_session_exercise, set_log_result
+from utils.session_sync import SessionSync
 import json
 
 router = APIRouter()
 
+MAX_SESSION_SYNC_BATCH_SIZE = 100
+
 @router.post("/", response_model=schemas.WorkoutSession, status_code=status.HTTP_201_CREATED)
 def create_session(
     session: schemas.WorkoutSessionCreate, 
@@ -36,6 +45,9 @@ def create_session(
             user_readiness=session.user_readiness
         )
         db.add(db_session)
+        db.flush()
+        record_session_start(db, db_session.workout_id, db_session.started_at)
+        adjust_counters(db, user_id, sessions=1)
         db.commit()
         db.refresh(db_session)
         return db_session
@@ -46,23 +58,61 @@ def create_session(
         print(f"Error creating session: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create session: {str(e)}")
 
+@router.post("/sync", response_model=schemas.SessionSyncResponse)
+def sync_sessions(
+    batch: schemas.SessionSyncRequest,
+    user_id: int = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload sessions recorded offline in one request and one transaction.
+    Sessions and their exercises are matched on client-generated UUIDs, so
+    replaying a batch (e.g. after a lost response) is safe. Returns one
+    result per session, in request order; a failed item does not stop the
+    others.
+    """
+    if len(batch.sessions) > MAX_SESSION_SYNC_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many sessions in one batch (max {MAX_SESSION_SYNC_BATCH_SIZE})"
+        )
+    client_ids = [str(item.client_id) for item in batch.sessions]
+    if len(set(client_ids)) != len(client_ids):
+        raise HTTPException(status_code=400, detail="Duplicate session client_id in batch")
+    
+    return {"results": SessionSync(db, user_id).run(batch.sessions)}
+
 @router.get("/", response_model=List[schemas.WorkoutSession])
 def get_sessions(
+    response: Response,
     user_id: int = Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    sessions = db.query(models.WorkoutSession).options(
+    query = db.query(models.WorkoutSession).options(
         selectinload(models.WorkoutSession.exercises).selectinload(models.SessionExercise.exercise),
         selectinload(models.WorkoutSession.workout)
     ).filter(
         models.WorkoutSession.user_id == user_id
-    ).order_by(models.WorkoutSession.started_at.desc()).offset(skip).limit(limit).all()
+    )
+    sessions, next_cursor = paginate(
+        query, models.WorkoutSession.started_at, models.WorkoutSession.id,
+        cursor=cursor, skip=skip, limit=limit, descending=True
+    )
+    set_next_cursor(response, next_cursor)
     return sessions
 
 @router.get("/{session_id}", response_model=schemas.WorkoutSession)
-def get_session(session_id: int, db: Session = Depends(get_db)):
+def get_session(session_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    etag = session_etag(db, session_id)
+    if etag is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    not_modified = conditional_response(request, response, etag)
+    if not_modified:
+        return not_modified
+    
     session = db.query(models.WorkoutSession).filter(
         models.WorkoutSession.id == session_id
     ).first()
@@ -77,18 +127,12 @@ def update_session(
     db: Session = Depends(get_db)
 ):
     try:
-        print(f"\n=== UPDATE SESSION {session_id} ===")
-        print(f"Session update data: {session_update}")
-        if session_update.exercises:
-            print(f"Number of exercises: {len(session_update.exercises)}")
-            for i, ex in enumerate(session_update.exercises):
-                print(f"Exercise {i}: {ex}")
-        
         db_session = db.query(models.WorkoutSession).filter(
             models.WorkoutSession.id == session_id
         ).first()
         if db_session is None:
             raise HTTPException(status_code=404, detail="Session not found")
+        counters_before = session_counter_values(db_session)
         
         # Update session fields
         if session_update.completed_at is not None:
@@ -108,6 +152,14 @@ def update_session(
         
         # Add exercises if provided
         if session_update.exercises:
+            # Exercises resent with a known client_id update their entry instead of adding one
+            client_ids = {str(e.client_id) for e in session_update.exercises if e.client_id is not None}
+            known = {
+                entry.client_id: entry for entry in db.query(models.SessionExercise).filter(
+                    models.SessionExercise.session_id == session_id,
+                    models.SessionExercise.client_id.in_(client_ids)
+                )
+            } if client_ids else {}
             for exercise_data in session_update.exercises:
                 try:
                     exercise_dict = exercise_data.dict()
@@ -118,14 +170,20 @@ def update_session(
                         'best_set_weight', 'best_set_reps', 'avg_rpe', 'notes'
                     }
                     filtered_dict = {k: v for k, v in exercise_dict.items() if k in valid_fields}
+                    client_id = str(exercise_data.client_id) if exercise_data.client_id is not None else None
                     
-                    print(f"Adding exercise with data: {filtered_dict}")
-                    
+                    if client_id in known:
+                        for key, value in filtered_dict.items():
+                            setattr(known[client_id], key, value)
+                        continue
                     db_session_exercise = models.SessionExercise(
                         session_id=session_id,
+                        client_id=client_id,
                         **filtered_dict
                     )
                     db.add(db_session_exercise)
+                    if client_id is not None:
+                        known[client_id] = db_session_exercise
                 except Exception as e:
                     db.rollback()
                     print(f"Error adding exercise: {e}")
@@ -133,6 +191,9 @@ def update_session(
                     traceback.print_exc()
                     raise HTTPException(status_code=400, detail=f"Error adding exercise: {str(e)}")
         
+        adjust_counters(db, db_session.user_id, **counter_deltas(
+            counters_before, session_counter_values(db_session)
+        ))
         db.commit()
         # Refresh with eager loading to ensure all relationships are populated for response
         db_session = db.query(models.WorkoutSession).options(
@@ -152,6 +213,47 @@ def update_session(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to update session: {str(e)}")
 
+@router.post(
+    "/{session_id}/exercises/{exercise_id}/sets",
+    response_model=schemas.SetLogResult,
+    status_code=status.HTTP_201_CREATED
+)
+def log_set(
+    session_id: int,
+    exercise_id: int,
+    set_data: schemas.SetData,
+    user_id: int = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Append one set to an exercise of a session (creating the session's entry
+    for it on the first set) and return the updated aggregates and whether
+    the set is a personal record against the user's other sessions
+    """
+    if set_data.reps <= 0 or set_data.weight < 0:
+        raise HTTPException(status_code=400, detail="A set needs at least one rep and a non-negative weight")
+    db_session = db.query(models.WorkoutSession).filter(
+        models.WorkoutSession.id == session_id,
+        models.WorkoutSession.user_id == user_id
+    ).first()
+    if db_session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if exercise_catalog.snapshot.get(exercise_id) is None:
+        raise HTTPException(status_code=404, detail="Exercise not found")
+    
+    session_exercise = get_or_create_session_exercise(db, session_id, exercise_id)
+    set_number = append_set(db, session_exercise, set_data)
+    db.flush()
+    pr_details = WorkoutAnalytics.is_new_pr(
+        db, user_id, exercise_id, set_data.weight, set_data.reps, exclude_session_id=session_id
+    )
+    session_total_volume = db.query(models.WorkoutSession.total_volume).filter(
+        models.WorkoutSession.id == session_id
+    ).scalar()
+    result = set_log_result(session_exercise, set_number, pr_details, session_total_volume)
+    db.commit()
+    return result
+
 @router.post("/{session_id}/complete", response_model=schemas.WorkoutSession)
 def complete_session(session_id: int, db: Session = Depends(get_db)):
     try:
@@ -163,12 +265,16 @@ def complete_session(session_id: int, db: Session = Depends(get_db)):
         ).first()
         if db_session is None:
             raise HTTPException(status_code=404, detail="Session not found")
+        counters_before = session_counter_values(db_session)
         
         db_session.completed_at = datetime.utcnow()
         if db_session.started_at:
             duration = (db_session.completed_at - db_session.started_at).total_seconds() / 60
             db_session.duration_minutes = int(duration)
         
+        adjust_counters(db, db_session.user_id, **counter_deltas(
+            counters_before, session_counter_values(db_session)
+        ))
         db.commit()
         db.refresh(db_session)
         return db_session
@@ -190,6 +296,8 @@ def delete_session(session_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Session not found")
     
     db.delete(db_session)
+    adjust_counters(db, db_session.user_id, **counter_deltas(session_counter_values(db_session), {}))
+    refresh_last_session(db, db_session.workout_id)
     db.commit()
     return None
 
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+import schemas
+from database import get_db
+from utils.auth import get_current_user
+from utils.sync_feed import SYNC_CHANGES_PAGE_SIZE, ResyncRequiredError, RevisionAheadError, collect_changes
+
+router = APIRouter()
+
+@router.get("/changes", response_model=schemas.SyncChanges)
+def get_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(SYNC_CHANGES_PAGE_SIZE, ge=1, le=1000),
+    user_id: int = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    The caller's workouts, plans and sessions changed after revision `since`,
+    plus what was deleted. Start with since=0 for everything, then pass the
+    returned `revision`; repeat while `has_more` is true. A 410 means the
+    client must drop its local copy and resync from since=0.
+    """
+    try:
+        return collect_changes(db, user_id, since, limit)
+    except RevisionAheadError:
+        raise HTTPException(
+            status_code=410,
+            detail="Revision is ahead of the server, resync from since=0"
+        )
+    except ResyncRequiredError:
+        raise HTTPException(
+            status_code=410,
+            detail="Changes since this revision are no longer available, resync from since=0"
+        )
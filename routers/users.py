@@ -1,29 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Response
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status, File, UploadFile, Response
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import models
 import schemas
-from database import get_db
-from passlib.context import CryptContext
-from utils.auth import create_access_token, verify_token
-import os
-import base64
-from pathlib import Path
+from database import get_db, SessionLocal
+from utils.auth import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    create_token_pair,
+    get_current_admin,
+    revoke_token,
+    revoke_user_tokens,
+    verify_refresh_token,
+    verify_token,
+)
+from utils.passwords import get_password_hash_async, verify_and_update_password_async
+from utils.uploads import (
+    IMAGE_EXTENSIONS,
+    MAX_PROFILE_IMAGE_BYTES,
+    externalize_profile_picture,
+    store_upload,
+)
+from utils.images import schedule_profile_derivatives
+from utils.pagination import MAX_PAGE_SIZE, paginate, set_next_cursor
+from utils.counters import get_counters
+from utils.user_deletion import deletion_jobs
+from utils.user_import import IMPORT_FORMATS, UserImporter, detect_format, iter_rows
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def _set_access_cookie(response: Response, access_token: str) -> None:
+    # Set httponly cookie so browser sends it automatically
+    response.set_cookie(
+        key="access_token",
+        value=access_token,
+        httponly=True,
+        secure=False,  # Set to True in production with HTTPS
+        samesite="Lax",
+        max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    )
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# The async endpoints await the password pool; their database work runs in
+# the threadpool so it never blocks the event loop
 
-@router.post("/register", response_model=schemas.Token, status_code=status.HTTP_201_CREATED)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    """Register a new user"""
-    # Check if user exists
+def _check_user_available(db: Session, user: schemas.UserCreate) -> None:
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
@@ -31,9 +53,8 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db_user = db.query(models.User).filter(models.User.username == user.username).first()
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
-    
-    # Create new user
-    hashed_password = get_password_hash(user.password)
+
+def _add_user(db: Session, user: schemas.UserCreate, hashed_password: str) -> models.User:
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -43,51 +64,109 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    return db_user
+
+def _find_user_by_email(db: Session, email: str) -> Optional[models.User]:
+    return db.query(models.User).filter(models.User.email == email).first()
+
+def _save_password_hash(db: Session, db_user: models.User, hashed_password: str) -> None:
+    db_user.hashed_password = hashed_password
+    db.commit()
+    db.refresh(db_user)
+
+@router.post("/register", response_model=schemas.Token, status_code=status.HTTP_201_CREATED)
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    """Register a new user"""
+    # Check if user exists
+    await run_in_threadpool(_check_user_available, db, user)
     
-    # Generate token - safely get role value
-    role_value = db_user.role.value if hasattr(db_user.role, 'value') else str(db_user.role)
-    access_token = create_access_token(
-        data={"user_id": db_user.id, "email": db_user.email, "role": role_value}
-    )
+    # Create new user
+    hashed_password = await get_password_hash_async(user.password)
+    db_user = await run_in_threadpool(_add_user, db, user, hashed_password)
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": db_user
-    }
+    # Generate access/refresh token pair
+    tokens = create_token_pair(db_user)
+    
+    return {**tokens, "user": db_user}
 
 @router.post("/login", response_model=schemas.Token)
-def login_user(user_login: schemas.UserLogin, response: Response, db: Session = Depends(get_db)):
+async def login_user(user_login: schemas.UserLogin, response: Response, db: Session = Depends(get_db)):
     """Login user with email and password"""
     # Find user by email
-    db_user = db.query(models.User).filter(models.User.email == user_login.email).first()
-    if not db_user or not verify_password(user_login.password, db_user.hashed_password):
+    db_user = await run_in_threadpool(_find_user_by_email, db, user_login.email)
+    if not db_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
+
+    is_valid, new_hash = await verify_and_update_password_async(user_login.password, db_user.hashed_password)
+    if not is_valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password"
+        )
+
+    # Transparently upgrade hashes created with a different bcrypt cost
+    if new_hash:
+        await run_in_threadpool(_save_password_hash, db, db_user, new_hash)
     
-    # Generate token - safely get role value
-    role_value = db_user.role.value if hasattr(db_user.role, 'value') else str(db_user.role)
-    access_token = create_access_token(
-        data={"user_id": db_user.id, "email": db_user.email, "role": role_value}
-    )
+    # Generate access/refresh token pair
+    tokens = create_token_pair(db_user)
     
-    # Set httponly cookie so browser sends it automatically
-    response.set_cookie(
-        key="access_token",
-        value=access_token,
-        httponly=True,
-        secure=False,  # Set to True in production with HTTPS
-        samesite="Lax",
-        max_age=86400  # 24 hours
-    )
+    _set_access_cookie(response, tokens["access_token"])
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": db_user
-    }
+    return {**tokens, "user": db_user}
+
+@router.post("/refresh", response_model=schemas.TokenPair)
+def refresh_tokens(refresh_request: schemas.RefreshRequest, response: Response, db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access/refresh token pair"""
+    token_data = verify_refresh_token(refresh_request.refresh_token)
+    db_user = db.query(models.User).filter(models.User.id == token_data.user_id).first()
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Rotate: the presented refresh token can only be used once, so of two
+    # concurrent refreshes with the same token only one gets a new pair
+    if not revoke_token(db, token_data):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token already used",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # Role and email are re-read from the database, so changes apply on refresh
+    tokens = create_token_pair(db_user)
+    # Keeps cookie-based sessions (the admin dashboard) alive
+    _set_access_cookie(response, tokens["access_token"])
+    return tokens
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout_user(
+    request: Request,
+    response: Response,
+    refresh_request: Optional[schemas.RefreshRequest] = None,
+    db: Session = Depends(get_db)
+):
+    """Revoke the current access token and, if provided, its refresh token"""
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing or invalid authorization header",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    token = auth_header.split(" ")[1]
+    token_data = verify_token(token)
+    revoke_token(db, token_data, token)
+    
+    if refresh_request is not None:
+        refresh_data = verify_refresh_token(refresh_request.refresh_token)
+        if refresh_data.user_id == token_data.user_id:
+            revoke_token(db, refresh_data)
+    
+    response.delete_cookie("access_token")
+    return None
 
 @router.get("/me", response_model=schemas.User)
 def get_current_user_profile(request: Request, db: Session = Depends(get_db)):
@@ -129,39 +208,58 @@ def update_user_profile(
     
     # Update allowed fields
     update_fields = ["full_name", "age", "height", "weight", "bio", "profile_picture"]
+    picture_changed = False
+    picture_stored = False
     for field, value in user_update.items():
         if field in update_fields and value is not None:
+            if field == "profile_picture":
+                value, picture_stored = externalize_profile_picture(value)
+                picture_changed = value != db_user.profile_picture
             setattr(db_user, field, value)
     
+    if picture_changed:
+        db_user.profile_picture_derivatives = None
     db.commit()
     db.refresh(db_user)
+    
+    # Only for files in the store, never for an arbitrary client-supplied path
+    if picture_changed and picture_stored:
+        schedule_profile_derivatives(db_user.id, db_user.profile_picture)
     return db_user
 
 @router.post("/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """Create a new user (legacy endpoint)"""
     # Check if user exists
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already taken")
+    await run_in_threadpool(_check_user_available, db, user)
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
-    db_user = models.User(
-        username=user.username,
-        email=user.email,
-        full_name=user.full_name,
-        hashed_password=hashed_password
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    hashed_password = await get_password_hash_async(user.password)
+    db_user = await run_in_threadpool(_add_user, db, user, hashed_password)
     return db_user
 
+@router.post("/import", response_model=dict)
+def import_users(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    db: Session = Depends(get_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    """
+    Bulk-create users from an NDJSON or CSV file (admin endpoint)
+    Each row needs username, email and password (full_name optional). Rows that
+    fail validation or uniqueness are reported by line; the rest are created.
+    """
+    import_format = format or detect_format(file.filename, file.content_type)
+    if import_format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail="Unknown import format, pass format=ndjson or format=csv"
+        )
+    
+    result = UserImporter(db).run(iter_rows(file.file, import_format))
+    return result.as_dict()
+
 @router.get("/test-role/{email}")
 def test_role(email: str, db: Session = Depends(get_db)):
     """Test endpoint to check user role"""
@@ -177,9 +275,19 @@ def test_role(email: str, db: Session = Depends(get_db)):
     }
 
 @router.get("/", response_model=List[schemas.User])
-def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all users"""
-    users = db.query(models.User).offset(skip).limit(limit).all()
+def get_users(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get all users (pass the X-Next-Cursor header back as `cursor` for the next page)"""
+    users, next_cursor = paginate(
+        db.query(models.User), models.User.id, models.User.id,
+        cursor=cursor, skip=skip, limit=limit
+    )
+    set_next_cursor(response, next_cursor)
     return users
 
 @router.get("/{user_id}", response_model=schemas.User)
@@ -199,6 +307,8 @@ def update_user(user_id: int, user_update: dict, db: Session = Depends(get_db)):
     
     # Update allowed fields
     update_fields = ["username", "email", "full_name", "age", "height", "weight", "bio", "profile_picture"]
+    picture_changed = False
+    picture_stored = False
     for field, value in user_update.items():
         if field in update_fields and value is not None:
             if field == "username" or field == "email":
@@ -209,26 +319,74 @@ def update_user(user_id: int, user_update: dict, db: Session = Depends(get_db)):
                 ).first()
                 if existing:
                     raise HTTPException(status_code=400, detail=f"{field} already taken")
+            if field == "profile_picture":
+                value, picture_stored = externalize_profile_picture(value)
+                picture_changed = value != db_user.profile_picture
             setattr(db_user, field, value)
     
+    if picture_changed:
+        db_user.profile_picture_derivatives = None
     db.commit()
     db.refresh(db_user)
+    
+    # Only for files in the store, never for an arbitrary client-supplied path
+    if picture_changed and picture_stored:
+        schedule_profile_derivatives(db_user.id, db_user.profile_picture)
     return db_user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    """Delete user by ID (admin endpoint)"""
+def delete_user(
+    user_id: int,
+    background_tasks: BackgroundTasks,
+    background: bool = False,
+    db: Session = Depends(get_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    """
+    Delete user by ID and all their data (admin endpoint)
+    Rows are removed bottom-up in small committed chunks. With `background=true`
+    the request returns 202 at once with a job to poll at /deletion-jobs/{job_id}.
+    """
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Delete related data
-    db.query(models.WorkoutSession).filter(models.WorkoutSession.user_id == user_id).delete()
-    db.query(models.Workout).filter(models.Workout.user_id == user_id).delete()
-    db.query(models.WorkoutPlan).filter(models.WorkoutPlan.user_id == user_id).delete()
+    job = deletion_jobs.active_for_user(user_id)
+    if job is None:
+        # Lock the user out first so nothing new is written while we delete
+        revoke_user_tokens(db, user_id)
+        job = deletion_jobs.create(user_id)
+        if background:
+            background_tasks.add_task(job.run, SessionLocal)
+        else:
+            job.run(SessionLocal)
     
-    db.delete(db_user)
-    db.commit()
+    if background or job.status in ("pending", "running"):
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job.as_dict())
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Failed to delete user: {job.error}")
+    return None
+
+@router.get("/deletion-jobs/{job_id}", response_model=dict)
+def get_deletion_job(job_id: str, admin: models.User = Depends(get_current_admin)):
+    """Get progress of a user deletion job"""
+    job = deletion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job.as_dict()
+
+@router.post("/{user_id}/revoke-tokens", status_code=status.HTTP_204_NO_CONTENT)
+def revoke_tokens_for_user(
+    user_id: int,
+    db: Session = Depends(get_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    """Revoke all tokens issued to a user, e.g. after a role change (admin endpoint)"""
+    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    revoke_user_tokens(db, user_id)
     return None
 
 @router.get("/{user_id}/stats", response_model=dict)
@@ -238,22 +396,15 @@ def get_user_stats(user_id: int, db: Session = Depends(get_db)):
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    total_workouts = db.query(models.Workout).filter(models.Workout.user_id == user_id).count()
-    total_sessions = db.query(models.WorkoutSession).filter(models.WorkoutSession.user_id == user_id).count()
-    completed_sessions = db.query(models.WorkoutSession).filter(
-        models.WorkoutSession.user_id == user_id,
-        models.WorkoutSession.completed_at.isnot(None)
-    ).count()
-    
-    total_plans = db.query(models.WorkoutPlan).filter(models.WorkoutPlan.user_id == user_id).count()
+    counters = get_counters(db, user_id)
     
     return {
         "user_id": user_id,
         "username": db_user.username,
-        "total_workouts": total_workouts,
-        "total_sessions": total_sessions,
-        "completed_sessions": completed_sessions,
-        "total_workout_plans": total_plans,
+        "total_workouts": counters.workouts,
+        "total_sessions": counters.sessions,
+        "completed_sessions": counters.completed_sessions,
+        "total_workout_plans": counters.workout_plans,
     }
 
 
@@ -262,18 +413,12 @@ async def upload_profile_image(request: Request, file: UploadFile = File(...), d
     """Upload profile image for current user"""
     # Verify token and get user_id
     auth_header = request.headers.get("Authorization")
-    if not auth_header:
+    if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    try:
-        token = auth_header.split(" ")[1]
-        token_data = verify_token(token)
-        user_id = token_data.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token data")
-    except Exception as e:
-        print(f"Token verification error: {str(e)}")
-        raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
+    token = auth_header.split(" ")[1]
+    token_data = verify_token(token)
+    user_id = token_data.user_id
     
     # Get user
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -284,31 +429,21 @@ async def upload_profile_image(request: Request, file: UploadFile = File(...), d
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
-    # Check file size (max 5MB)
-    contents = await file.read()
-    if len(contents) > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large (max 5MB)")
-    
-    # Check file type
-    if file.content_type not in ['image/jpeg', 'image/png', 'image/gif', 'image/webp']:
+    # Check file type before reading any content
+    extension = IMAGE_EXTENSIONS.get(file.content_type)
+    if extension is None:
         raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, GIF, and WebP allowed")
     
-    # Create uploads directory if it doesn't exist
-    upload_dir = Path("uploads")
-    upload_dir.mkdir(exist_ok=True)
-    
-    # Save file with user_id as filename
-    file_extension = Path(file.filename).suffix
-    file_path = upload_dir / f"profile_{user_id}{file_extension}"
-    
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    # Stream to disk (max 5MB), stored under the SHA-256 of its content
+    file_path = await store_upload(file, extension, MAX_PROFILE_IMAGE_BYTES)
     
     # Store file path in database
-    db_user.profile_picture = str(file_path)
+    db_user.profile_picture = file_path.as_posix()
+    db_user.profile_picture_derivatives = None
     db.commit()
     db.refresh(db_user)
     
+    # Thumbnails are generated in a worker process and recorded on the user when ready
+    schedule_profile_derivatives(db_user.id, db_user.profile_picture)
+    
     return db_user
-
-
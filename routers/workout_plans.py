@@ -1,14 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
+from datetime import datetime
 import models
 import schemas
 from database import get_db
 from utils.auth import get_current_user
+from utils.counters import adjust_counters
+from utils.cloning import clone_plan
+from utils.conditional import conditional_response, plan_list_etag, plan_validators
 
 router = APIRouter()
 
 
+def plan_tree_options():
+    """
+    Load plans -> workouts -> exercises -> exercise with one IN query per level
+    (no cartesian row explosion); last_session_date is a Workout column.
+    """
+    return (
+        selectinload(models.WorkoutPlan.workouts)
+        .selectinload(models.Workout.exercises)
+        .selectinload(models.WorkoutExercise.exercise),
+    )
+
+
 def _validate_user(db: Session, user_id: int) -> models.User:
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
@@ -41,9 +57,11 @@ def create_workout_plan(
     db_plan = models.WorkoutPlan(
         user_id=user_id,
         name=plan.name,
-        description=plan.description
+        description=plan.description,
+        is_shared=plan.is_shared
     )
     db.add(db_plan)
+    adjust_counters(db, user_id, workout_plans=1)
     db.commit()
     db.refresh(db_plan)
 
@@ -58,25 +76,37 @@ def create_workout_plan(
 
 
 @router.get("/", response_model=List[schemas.WorkoutPlan])
-def get_workout_plans(user_id: int = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_workout_plans(
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     _validate_user(db, user_id)
 
-    plans = db.query(models.WorkoutPlan).options(
-        joinedload(models.WorkoutPlan.workouts)
-        .joinedload(models.Workout.exercises)
-        .joinedload(models.WorkoutExercise.exercise)
-    ).filter(models.WorkoutPlan.user_id == user_id).all()
+    not_modified = conditional_response(request, response, plan_list_etag(db, user_id))
+    if not_modified:
+        return not_modified
+
+    plans = db.query(models.WorkoutPlan).options(*plan_tree_options()).filter(
+        models.WorkoutPlan.user_id == user_id
+    ).all()
 
     return plans
 
 
 @router.get("/{plan_id}", response_model=schemas.WorkoutPlan)
-def get_workout_plan(plan_id: int, db: Session = Depends(get_db)):
-    plan = db.query(models.WorkoutPlan).options(
-        joinedload(models.WorkoutPlan.workouts)
-        .joinedload(models.Workout.exercises)
-        .joinedload(models.WorkoutExercise.exercise)
-    ).filter(models.WorkoutPlan.id == plan_id).first()
+def get_workout_plan(plan_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    validators = plan_validators(db, plan_id)
+    if validators is None:
+        raise HTTPException(status_code=404, detail="Workout plan not found")
+    not_modified = conditional_response(request, response, *validators)
+    if not_modified:
+        return not_modified
+
+    plan = db.query(models.WorkoutPlan).options(*plan_tree_options()).filter(
+        models.WorkoutPlan.id == plan_id
+    ).first()
 
     if not plan:
         raise HTTPException(status_code=404, detail="Workout plan not found")
@@ -84,6 +114,30 @@ def get_workout_plan(plan_id: int, db: Session = Depends(get_db)):
     return plan
 
 
+@router.post("/{plan_id}/clone", response_model=schemas.WorkoutPlan, status_code=status.HTTP_201_CREATED)
+def clone_workout_plan(
+    plan_id: int,
+    clone: Optional[schemas.CloneRequest] = None,
+    user_id: int = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Copy a plan, its workouts and their exercises into the current user's account"""
+    _validate_user(db, user_id)
+
+    plan = db.query(models.WorkoutPlan).filter(models.WorkoutPlan.id == plan_id).first()
+    # Other users' plans can only be cloned when shared
+    if not plan or (plan.user_id != user_id and not plan.is_shared):
+        raise HTTPException(status_code=404, detail="Workout plan not found")
+
+    new_plan, workout_ids = clone_plan(db, plan, user_id, name=clone.name if clone else None)
+    adjust_counters(db, user_id, workout_plans=1, workouts=len(workout_ids))
+    db.commit()
+
+    return db.query(models.WorkoutPlan).options(*plan_tree_options()).filter(
+        models.WorkoutPlan.id == new_plan.id
+    ).first()
+
+
 @router.put("/{plan_id}", response_model=schemas.WorkoutPlan)
 def update_workout_plan(
     plan_id: int,
@@ -100,7 +154,12 @@ def update_workout_plan(
     if plan_update.description is not None:
         plan.description = plan_update.description
 
+    if plan_update.is_shared is not None:
+        plan.is_shared = plan_update.is_shared
+
     if plan_update.workout_ids is not None:
+        # Membership lives on the workouts; move the plan's Last-Modified forward
+        plan.updated_at = datetime.utcnow()
         new_workouts = _fetch_workouts_for_plan(db, plan.user_id, plan_update.workout_ids)
         new_ids = {workout.id for workout in new_workouts}
 
@@ -128,6 +187,7 @@ def delete_workout_plan(plan_id: int, db: Session = Depends(get_db)):
         workout.plan_id = None
 
     db.delete(plan)
+    adjust_counters(db, plan.user_id, workout_plans=-1)
     db.commit()
 
     return None
@@ -1,22 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
+from datetime import datetime
 import models
 import schemas
 from database import get_db
 from utils.auth import get_current_user
+from utils.pagination import MAX_PAGE_SIZE, paginate, set_next_cursor
+from utils.counters import adjust_counters
+from utils.sync_feed import next_revision
+from utils.cloning import can_clone_workout, clone_workouts
+from utils.conditional import conditional_response, workout_list_etag, workout_validators
+from utils.workout_exercises import build_workout_exercises, sync_workout_exercises, validate_exercise_ids
 
 router = APIRouter()
 
-def add_last_session_date(workout: models.Workout, db: Session):
-    """Add the last session date to a workout object"""
-    last_session = db.query(models.WorkoutSession).filter(
-        models.WorkoutSession.workout_id == workout.id
-    ).order_by(desc(models.WorkoutSession.started_at)).first()
-    
-    workout.last_session_date = last_session.started_at if last_session else None
-    return workout
+MAX_WORKOUT_BATCH_SIZE = 200
+
+def _get_plan_for(db: Session, plan_id: int, user_id: int) -> models.WorkoutPlan:
+    plan = db.query(models.WorkoutPlan).filter(
+        models.WorkoutPlan.id == plan_id,
+        models.WorkoutPlan.user_id == user_id
+    ).first()
+    if not plan:
+        raise HTTPException(status_code=404, detail="Workout plan not found")
+    return plan
+
+def _touch_plan(db: Session, plan_id: int, user_id: int) -> None:
+    db.query(models.WorkoutPlan).filter(models.WorkoutPlan.id == plan_id).update(
+        {models.WorkoutPlan.updated_at: datetime.utcnow(), models.WorkoutPlan.revision: next_revision(db, user_id)},
+        synchronize_session=False
+    )
+
+def _build_workout(user_id: int, workout: schemas.WorkoutCreate) -> models.Workout:
+    return models.Workout(
+        user_id=user_id,
+        plan_id=workout.plan_id,
+        name=workout.name,
+        description=workout.description,
+        icon=workout.icon,
+        category=workout.category,
+        is_shared=workout.is_shared,
+        exercises=build_workout_exercises(workout.exercises)
+    )
 
 @router.post("/", response_model=schemas.Workout, status_code=status.HTTP_201_CREATED)
 def create_workout(
@@ -30,69 +56,148 @@ def create_workout(
         raise HTTPException(status_code=404, detail="User not found")
 
     if workout.plan_id is not None:
-        plan = db.query(models.WorkoutPlan).filter(
-            models.WorkoutPlan.id == workout.plan_id,
-            models.WorkoutPlan.user_id == user_id
-        ).first()
-        if not plan:
-            raise HTTPException(status_code=404, detail="Workout plan not found")
+        _get_plan_for(db, workout.plan_id, user_id)
+    validate_exercise_ids(db, (exercise.exercise_id for exercise in workout.exercises))
     
-    # Create workout
-    db_workout = models.Workout(
-        user_id=user_id,
-        plan_id=workout.plan_id,
-        name=workout.name,
-        description=workout.description,
-        icon=workout.icon,
-        category=workout.category
-    )
+    # Workout and exercises are inserted in one transaction
+    db_workout = _build_workout(user_id, workout)
     db.add(db_workout)
+    adjust_counters(db, user_id, workouts=1)
     db.commit()
     db.refresh(db_workout)
-    
-    # Add exercises to workout
-    for index, exercise_data in enumerate(workout.exercises):
-        exercise_dict = exercise_data.dict()
-        # If order is not provided, use the index
-        if exercise_dict.get('order') is None:
-            exercise_dict['order'] = index
-        db_workout_exercise = models.WorkoutExercise(
-            workout_id=db_workout.id,
-            **exercise_dict
+    return db_workout
+
+@router.post("/batch", response_model=List[schemas.Workout], status_code=status.HTTP_201_CREATED)
+def create_workouts_batch(
+    batch: schemas.WorkoutBatchCreate,
+    user_id: int = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Create many workouts at once, e.g. when importing a coach's program.
+    Everything is validated up front and created in one transaction: either all
+    workouts are created or none are.
+    """
+    if len(batch.workouts) > MAX_WORKOUT_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many workouts in one batch (max {MAX_WORKOUT_BATCH_SIZE})"
         )
-        db.add(db_workout_exercise)
     
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    plan_ids = {workout.plan_id for workout in batch.workouts if workout.plan_id is not None}
+    if plan_ids:
+        found = {plan.id for plan in db.query(models.WorkoutPlan.id).filter(
+            models.WorkoutPlan.id.in_(plan_ids),
+            models.WorkoutPlan.user_id == user_id
+        )}
+        if plan_ids - found:
+            raise HTTPException(status_code=404, detail=f"Workout plans not found: {sorted(plan_ids - found)}")
+    validate_exercise_ids(db, (
+        exercise.exercise_id for workout in batch.workouts for exercise in workout.exercises
+    ))
+    
+    db_workouts = [_build_workout(user_id, workout) for workout in batch.workouts]
+    db.add_all(db_workouts)
+    adjust_counters(db, user_id, workouts=len(db_workouts))
     db.commit()
-    db.refresh(db_workout)
-    return db_workout
+    
+    workout_ids = [db_workout.id for db_workout in db_workouts]
+    loaded = {
+        db_workout.id: db_workout for db_workout in db.query(models.Workout).options(
+            selectinload(models.Workout.exercises).selectinload(models.WorkoutExercise.exercise)
+        ).filter(models.Workout.id.in_(workout_ids))
+    } if workout_ids else {}
+    return [loaded[workout_id] for workout_id in workout_ids]
 
 @router.get("/", response_model=List[schemas.Workout])
 def get_workouts(
+    request: Request,
+    response: Response,
     user_id: int = Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    workouts = db.query(models.Workout).filter(
-        models.Workout.user_id == user_id
-    ).offset(skip).limit(limit).all()
-    
-    # Add last session date to each workout
-    for workout in workouts:
-        add_last_session_date(workout, db)
+    not_modified = conditional_response(request, response, workout_list_etag(db, user_id, request.url.query))
+    if not_modified:
+        return not_modified
     
+    # last_session_date comes from the denormalized last_session_at column
+    query = db.query(models.Workout).options(
+        selectinload(models.Workout.exercises).selectinload(models.WorkoutExercise.exercise)
+    ).filter(models.Workout.user_id == user_id)
+    workouts, next_cursor = paginate(
+        query, models.Workout.id, models.Workout.id,
+        cursor=cursor, skip=skip, limit=limit
+    )
+    set_next_cursor(response, next_cursor)
     return workouts
 
 @router.get("/{workout_id}", response_model=schemas.Workout)
-def get_workout(workout_id: int, db: Session = Depends(get_db)):
-    workout = db.query(models.Workout).filter(models.Workout.id == workout_id).first()
+def get_workout(workout_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    validators = workout_validators(db, workout_id)
+    if validators is None:
+        raise HTTPException(status_code=404, detail="Workout not found")
+    not_modified = conditional_response(request, response, *validators)
+    if not_modified:
+        return not_modified
+    
+    workout = db.query(models.Workout).options(
+        selectinload(models.Workout.exercises).selectinload(models.WorkoutExercise.exercise)
+    ).filter(models.Workout.id == workout_id).first()
     if workout is None:
         raise HTTPException(status_code=404, detail="Workout not found")
+    return workout
+
+def _apply_workout_update(db: Session, db_workout: models.Workout, changes: dict) -> models.Workout:
+    """Apply changed fields and diff the exercise list, then commit"""
+    if changes.get("plan_id") is not None:
+        _get_plan_for(db, changes["plan_id"], db_workout.user_id)
+    if "plan_id" in changes and db_workout.plan_id not in (None, changes["plan_id"]):
+        # The old plan lost a workout: move its Last-Modified forward
+        _touch_plan(db, db_workout.plan_id, db_workout.user_id)
     
-    # Add last session date
-    add_last_session_date(workout, db)
+    for field in ("name", "description", "plan_id", "icon", "category", "is_shared"):
+        if field in changes and getattr(db_workout, field) != changes[field]:
+            setattr(db_workout, field, changes[field])
     
-    return workout
+    if changes.get("exercises") is not None:
+        counts = sync_workout_exercises(db, db_workout, changes["exercises"])
+        if counts["inserted"] or counts["updated"] or counts["deleted"]:
+            db_workout.updated_at = datetime.utcnow()
+    
+    db.commit()
+    db.refresh(db_workout)
+    return db_workout
+
+@router.post("/{workout_id}/clone", response_model=schemas.Workout, status_code=status.HTTP_201_CREATED)
+def clone_workout(
+    workout_id: int,
+    clone: Optional[schemas.CloneRequest] = None,
+    user_id: int = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Copy a workout and its exercises into the current user's account"""
+    source = db.query(models.Workout).filter(models.Workout.id == workout_id).first()
+    # Other users' workouts can only be cloned when shared, directly or through their plan
+    if source is None or not can_clone_workout(db, source, user_id):
+        raise HTTPException(status_code=404, detail="Workout not found")
+    
+    # A copy of your own workout stays in its plan; someone else's plan is not yours
+    plan_id = source.plan_id if source.user_id == user_id else None
+    name = clone.name if clone and clone.name else f"{source.name} (copy)"
+    (new_id,) = clone_workouts(db, [workout_id], user_id, plan_id=plan_id, names={workout_id: name})
+    adjust_counters(db, user_id, workouts=1)
+    db.commit()
+    
+    return db.query(models.Workout).options(
+        selectinload(models.Workout.exercises).selectinload(models.WorkoutExercise.exercise)
+    ).filter(models.Workout.id == new_id).first()
 
 @router.put("/{workout_id}", response_model=schemas.Workout)
 def update_workout(
@@ -100,44 +205,38 @@ def update_workout(
     workout: schemas.WorkoutCreate, 
     db: Session = Depends(get_db)
 ):
+    """Replace a workout; exercises are diffed against the stored ones, not re-inserted"""
     db_workout = db.query(models.Workout).filter(models.Workout.id == workout_id).first()
     if db_workout is None:
         raise HTTPException(status_code=404, detail="Workout not found")
-
-    if workout.plan_id is not None:
-        plan = db.query(models.WorkoutPlan).filter(
-            models.WorkoutPlan.id == workout.plan_id,
-            models.WorkoutPlan.user_id == db_workout.user_id
-        ).first()
-        if not plan:
-            raise HTTPException(status_code=404, detail="Workout plan not found")
     
-    db_workout.name = workout.name
-    db_workout.description = workout.description
-    db_workout.plan_id = workout.plan_id
-    db_workout.icon = workout.icon
-    db_workout.category = workout.category
-    
-    # Delete existing exercises
-    db.query(models.WorkoutExercise).filter(
-        models.WorkoutExercise.workout_id == workout_id
-    ).delete()
-    
-    # Add new exercises
-    for index, exercise_data in enumerate(workout.exercises):
-        exercise_dict = exercise_data.dict()
-        # If order is not provided, use the index
-        if exercise_dict.get('order') is None:
-            exercise_dict['order'] = index
-        db_workout_exercise = models.WorkoutExercise(
-            workout_id=workout_id,
-            **exercise_dict
-        )
-        db.add(db_workout_exercise)
+    changes = {
+        "name": workout.name,
+        "description": workout.description,
+        "plan_id": workout.plan_id,
+        "icon": workout.icon,
+        "category": workout.category,
+        "is_shared": workout.is_shared,
+        "exercises": workout.exercises,
+    }
+    return _apply_workout_update(db, db_workout, changes)
+
+@router.patch("/{workout_id}", response_model=schemas.Workout)
+def patch_workout(
+    workout_id: int,
+    workout: schemas.WorkoutUpdate,
+    db: Session = Depends(get_db)
+):
+    """Partially update a workout: only the fields sent are changed"""
+    db_workout = db.query(models.Workout).filter(models.Workout.id == workout_id).first()
+    if db_workout is None:
+        raise HTTPException(status_code=404, detail="Workout not found")
     
-    db.commit()
-    db.refresh(db_workout)
-    return db_workout
+    changes = {field: getattr(workout, field) for field in workout.model_fields_set}
+    for field in ("name", "icon", "category", "is_shared"):
+        if field in changes and changes[field] is None:
+            raise HTTPException(status_code=400, detail=f"{field} cannot be null")
+    return _apply_workout_update(db, db_workout, changes)
 
 @router.delete("/{workout_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_workout(workout_id: int, db: Session = Depends(get_db)):
@@ -145,6 +244,9 @@ def delete_workout(workout_id: int, db: Session = Depends(get_db)):
     if db_workout is None:
         raise HTTPException(status_code=404, detail="Workout not found")
     
+    if db_workout.plan_id is not None:
+        _touch_plan(db, db_workout.plan_id, db_workout.user_id)
     db.delete(db_workout)
+    adjust_counters(db, db_workout.user_id, workouts=-1)
     db.commit()
     return None
@@ -1,6 +1,8 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, field_validator
+from typing import Optional, List, Dict
 from datetime import datetime
+from uuid import UUID
+import json
 
 # User Schemas
 class UserBase(BaseModel):
@@ -22,9 +24,18 @@ class User(UserBase):
     height: Optional[float] = None  # in cm
     weight: Optional[float] = None  # in kg
     bio: Optional[str] = None
-    profile_picture: Optional[str] = None  # URL or base64
+    profile_picture: Optional[str] = None  # URL or uploads/ path
+    profile_picture_derivatives: Optional[Dict[str, Dict[str, str]]] = None  # {size: {format: path}}
     role: str = "member"  # admin or member
     
+    @field_validator("profile_picture_derivatives", mode="before")
+    @classmethod
+    def parse_derivatives(cls, value):
+        # Stored as a JSON string on the model
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+    
     class Config:
         from_attributes = True
         use_enum_values = True
@@ -36,12 +47,26 @@ class User(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # access token lifetime in seconds
     user: User
 
+class TokenPair(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str
+    expires_in: int
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class TokenData(BaseModel):
     user_id: int
     email: Optional[str] = None
     role: Optional[str] = None
+    jti: Optional[str] = None
+    issued_at: Optional[float] = None
+    expires_at: Optional[float] = None
 
 # Exercise Schemas
 class ExerciseBase(BaseModel):
@@ -63,6 +88,14 @@ class Exercise(ExerciseBase):
     class Config:
         from_attributes = True
 
+class FacetValue(BaseModel):
+    value: Optional[str] = None
+    count: int
+
+class ExerciseFacets(BaseModel):
+    total: int
+    facets: Dict[str, List[FacetValue]]
+
 # Workout Exercise Schemas
 class WorkoutExerciseBase(BaseModel):
     exercise_id: int
@@ -74,6 +107,9 @@ class WorkoutExerciseBase(BaseModel):
 class WorkoutExerciseCreate(WorkoutExerciseBase):
     pass
 
+class WorkoutExerciseUpdate(WorkoutExerciseCreate):
+    id: Optional[int] = None  # existing row to update; matched by (exercise_id, order) when omitted
+
 class WorkoutExercise(WorkoutExerciseBase):
     id: int
     exercise: Exercise
@@ -88,10 +124,27 @@ class WorkoutBase(BaseModel):
     plan_id: Optional[int] = None
     icon: str = "fitness"  # Icon name for the workout
     category: str = "general"  # Category: strength, cardio, flexibility, sports, general
+    is_shared: bool = False  # lets other users clone it
 
 class WorkoutCreate(WorkoutBase):
     exercises: List[WorkoutExerciseCreate] = []
 
+class CloneRequest(BaseModel):
+    name: Optional[str] = None  # defaults to the source name (workouts: "<name> (copy)")
+
+class WorkoutBatchCreate(BaseModel):
+    workouts: List[WorkoutCreate]
+
+class WorkoutUpdate(BaseModel):
+    """Partial workout update: only the fields sent are changed"""
+    name: Optional[str] = None
+    description: Optional[str] = None
+    plan_id: Optional[int] = None
+    icon: Optional[str] = None
+    category: Optional[str] = None
+    is_shared: Optional[bool] = None
+    exercises: Optional[List[WorkoutExerciseUpdate]] = None
+
 class Workout(WorkoutBase):
     id: int
     user_id: int
@@ -108,6 +161,7 @@ class Workout(WorkoutBase):
 class WorkoutPlanBase(BaseModel):
     name: str
     description: Optional[str] = None
+    is_shared: bool = False  # lets other users clone it and its workouts
 
 
 class WorkoutPlanCreate(WorkoutPlanBase):
@@ -117,6 +171,7 @@ class WorkoutPlanCreate(WorkoutPlanBase):
 class WorkoutPlanUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
+    is_shared: Optional[bool] = None
     workout_ids: Optional[List[int]] = None
 
 
@@ -165,6 +220,7 @@ class SessionExerciseCreate(BaseModel):
     best_set_weight: Optional[float] = None
     best_set_reps: Optional[int] = None
     avg_rpe: Optional[float] = None
+    client_id: Optional[UUID] = None  # replays with the same id update instead of duplicating
 
 class SessionExercise(BaseModel):
     id: int
@@ -179,11 +235,29 @@ class SessionExercise(BaseModel):
     best_set_weight: Optional[float] = None
     best_set_reps: Optional[int] = None
     avg_rpe: Optional[float] = None
+    client_id: Optional[str] = None
     exercise: Exercise
     
     class Config:
         from_attributes = True
 
+class SetLogResult(BaseModel):
+    """Running aggregates after appending one set, and its PR status"""
+    session_exercise_id: int
+    exercise_id: int
+    set_number: int
+    sets_completed: int
+    reps_completed: int
+    total_volume: Optional[float] = None
+    best_set_weight: Optional[float] = None
+    best_set_reps: Optional[int] = None
+    avg_rpe: Optional[float] = None
+    time_under_tension: Optional[float] = None
+    session_total_volume: Optional[float] = None
+    is_personal_record: bool
+    prs_achieved: List[str]
+    details: Dict[str, bool]
+
 # Workout Session Schemas
 class WorkoutSessionBase(BaseModel):
     workout_id: int
@@ -207,6 +281,7 @@ class WorkoutSessionUpdate(BaseModel):
 class WorkoutSession(WorkoutSessionBase):
     id: int
     user_id: int
+    workout_id: Optional[int] = None  # cleared when the workout's owner is deleted
     started_at: datetime
     completed_at: Optional[datetime] = None
     duration_minutes: Optional[int] = None
@@ -214,9 +289,89 @@ class WorkoutSession(WorkoutSessionBase):
     user_readiness: Optional[int] = None
     training_load: Optional[float] = None
     total_volume: Optional[float] = None
-    workout: Workout
+    client_id: Optional[str] = None
+    workout: Optional[Workout] = None
     exercises: List[SessionExercise] = []
     
     class Config:
         from_attributes = True
         use_enum_values = True
+
+# Offline Sync Schemas
+class SyncSessionExercise(SessionExerciseBase):
+    client_id: UUID
+
+class SyncSession(BaseModel):
+    """
+    Full state of a session recorded on the device. `exercises` replaces the
+    session's synced exercises; leave it out to keep them as they are.
+    """
+    client_id: UUID
+    workout_id: int
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    duration_minutes: Optional[int] = None
+    session_rpe: Optional[float] = None
+    user_readiness: Optional[int] = None
+    training_load: Optional[float] = None
+    total_volume: Optional[float] = None
+    notes: Optional[str] = None
+    exercises: Optional[List[SyncSessionExercise]] = None
+
+class SessionSyncRequest(BaseModel):
+    sessions: List[SyncSession]
+
+class SessionSyncItemResult(BaseModel):
+    client_id: str
+    status: str  # created, updated, unchanged or failed
+    session_id: Optional[int] = None
+    error: Optional[str] = None
+
+class SessionSyncResponse(BaseModel):
+    results: List[SessionSyncItemResult]
+
+# Delta Sync Schemas
+class ChangedWorkout(Workout):
+    revision: int
+
+class ChangedWorkoutPlan(WorkoutPlanBase):
+    """A plan without its workouts: they are sent separately, linked by plan_id"""
+    id: int
+    user_id: int
+    created_at: datetime
+    updated_at: datetime
+    revision: int
+
+    class Config:
+        from_attributes = True
+
+class ChangedSession(WorkoutSessionBase):
+    """A session without its workout, which is sent separately"""
+    id: int
+    user_id: int
+    workout_id: Optional[int] = None
+    started_at: datetime
+    completed_at: Optional[datetime] = None
+    duration_minutes: Optional[int] = None
+    training_load: Optional[float] = None
+    total_volume: Optional[float] = None
+    client_id: Optional[str] = None
+    revision: int
+    exercises: List[SessionExercise] = []
+
+    class Config:
+        from_attributes = True
+
+class DeletedObject(BaseModel):
+    kind: str  # workouts, workout_plans or sessions
+    id: int
+    revision: int
+
+class SyncChanges(BaseModel):
+    since: int
+    revision: int  # send as `since` on the next call
+    has_more: bool
+    workouts: List[ChangedWorkout] = []
+    workout_plans: List[ChangedWorkoutPlan] = []
+    sessions: List[ChangedSession] = []
+    deleted: List[DeletedObject] = []
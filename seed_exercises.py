@@ -1,8 +1,13 @@
 """
 Script to seed the database with an expanded catalog of common exercises.
+
+Safe to rerun: exercises are upserted by name, so existing entries are
+updated in place (only when their details changed) instead of duplicated.
+Running workers pick the changes up on their next catalog refresh.
 """
 from database import SessionLocal, engine, Base
 import models
+from utils.exercise_upsert import has_unique_name_index, upsert_exercises
 
 
 def seed_exercises():
@@ -379,24 +384,18 @@ def seed_exercises():
         },
     ]
 
-    existing_names = {name for (name,) in db.query(models.Exercise.name).all()}
-    new_entries = []
-
-    for entry in exercise_data:
-        if entry["name"] in existing_names:
-            continue
-        new_entries.append(models.Exercise(**entry))
-
-    if not new_entries:
-        print("All seed exercises already exist in the database")
+    try:
+        if not has_unique_name_index(db):
+            print("Built-in exercise names have no unique index yet: run migrate_exercise_name_unique.py first")
+            return
+        counts = upsert_exercises(db, exercise_data)
+        total = db.query(models.Exercise).count()
+    finally:
         db.close()
-        return
-
-    db.add_all(new_entries)
-    db.commit()
-    print(f"Added {len(new_entries)} exercises. Total catalog size: {len(existing_names) + len(new_entries)}")
-    db.close()
-
+    print(
+        f"Inserted {counts['inserted']}, updated {counts['updated']}, unchanged {counts['unchanged']} exercises. "
+        f"Total catalog size: {total}"
+    )
 
 if __name__ == "__main__":
     seed_exercises()
@@ -9,29 +9,56 @@ import models
 import schemas
 import os
 from dotenv import load_dotenv
+from utils.token_cache import VerifiedTokenCache
+from utils.revocation import RevocationList
+import uuid
 
 load_dotenv()
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 43200))  # 30 days
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 30))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))  # 0 disables the cache
+REVOCATION_REFRESH_SECONDS = int(os.getenv("REVOCATION_REFRESH_SECONDS", 30))
+REVOCATION_PRUNE_SECONDS = int(os.getenv("REVOCATION_PRUNE_SECONDS", 3600))  # 0 disables pruning
 
 security = HTTPBearer()
+token_cache = VerifiedTokenCache(max_size=TOKEN_CACHE_SIZE)
+revocation_list = RevocationList()
+
+def _encode_token(data: dict, token_type: str, expires_delta: timedelta) -> str:
+    now = datetime.now(timezone.utc)
+    to_encode = data.copy()
+    to_encode.update({
+        "exp": now + expires_delta,
+        "iat": now.timestamp(),
+        "jti": uuid.uuid4().hex,
+        "type": token_type,
+    })
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    return _encode_token(data, "access", expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
 
-def verify_token(token: str) -> schemas.TokenData:
-    """Verify JWT token and return token data"""
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """Create JWT refresh token"""
+    return _encode_token(data, "refresh", expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+
+def create_token_pair(user: models.User) -> dict:
+    """Create an access/refresh token pair for a user"""
+    role_value = user.role.value if hasattr(user.role, 'value') else str(user.role)
+    data = {"user_id": user.id, "email": user.email, "role": role_value}
+    return {
+        "access_token": create_access_token(data),
+        "refresh_token": create_refresh_token(data),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+def _decode_token(token: str, token_type: str) -> schemas.TokenData:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -42,13 +69,63 @@ def verify_token(token: str) -> schemas.TokenData:
         user_id: int = payload.get("user_id")
         email: str = payload.get("email")
         role: str = payload.get("role", "member")
-        if user_id is None:
+        # Tokens issued before refresh tokens existed carry no type and are access tokens
+        if user_id is None or payload.get("type", "access") != token_type:
             raise credentials_exception
-        token_data = schemas.TokenData(user_id=user_id, email=email, role=role)
+        token_data = schemas.TokenData(
+            user_id=user_id,
+            email=email,
+            role=role,
+            jti=payload.get("jti"),
+            issued_at=payload.get("iat"),
+            expires_at=payload.get("exp"),
+        )
     except jwt.InvalidTokenError:
         raise credentials_exception
+
+    if revocation_list.is_revoked(token_data.jti, token_data.user_id, token_data.issued_at):
+        raise credentials_exception
+    return token_data
+
+def verify_token(token: str) -> schemas.TokenData:
+    """Verify JWT access token and return token data"""
+    cached = token_cache.get(token)
+    if cached is not None:
+        if revocation_list.is_revoked(cached.jti, cached.user_id, cached.issued_at):
+            token_cache.discard(token)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return cached
+
+    token_data = _decode_token(token, "access")
+    if token_data.expires_at is not None:
+        token_cache.put(token, token_data, token_data.expires_at)
     return token_data
 
+def verify_refresh_token(token: str) -> schemas.TokenData:
+    """Verify JWT refresh token and return token data"""
+    return _decode_token(token, "refresh")
+
+def revoke_token(db: Session, token_data: schemas.TokenData, token: Optional[str] = None) -> bool:
+    """Revoke a single access or refresh token; False if it was already revoked"""
+    if token_data.jti is None:
+        # Legacy token without an ID: the only way to kill it is revoking the user
+        revoke_user_tokens(db, token_data.user_id)
+        return True
+    claimed = revocation_list.revoke_token(db, token_data.jti, token_data.user_id, token_data.expires_at)
+    if token is not None:
+        token_cache.discard(token)
+    return claimed
+
+def revoke_user_tokens(db: Session, user_id: int) -> None:
+    """Revoke every token issued to a user so far (e.g. after a role change)"""
+    max_lifetime = max(ACCESS_TOKEN_EXPIRE_MINUTES * 60, REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+    revocation_list.revoke_user(db, user_id, max_lifetime)
+    token_cache.discard_user(user_id)
+
 def get_current_user(request: Request) -> int:
     """Get current user ID from JWT token"""
     auth_header = request.headers.get("Authorization")
@@ -83,10 +160,9 @@ def get_current_user_with_db(
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
-def get_current_admin(request: Request, db: Session = Depends(None)) -> models.User:
+def get_current_admin(request: Request) -> models.User:
     """Get current user and verify they are an admin"""
-    from database import get_db
-    db_instance = next(get_db())
+    from database import SessionLocal
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(
@@ -96,7 +172,11 @@ def get_current_admin(request: Request, db: Session = Depends(None)) -> models.U
         )
     token = auth_header.split(" ")[1]
     token_data = verify_token(token)
-    user = db_instance.query(models.User).filter(models.User.id == token_data.user_id).first()
+    db_instance = SessionLocal()
+    try:
+        user = db_instance.query(models.User).filter(models.User.id == token_data.user_id).first()
+    finally:
+        db_instance.close()
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     if user.role != models.UserRole.admin:
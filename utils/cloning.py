@@ -0,0 +1,111 @@
+"""
+Set-based copies of workouts and plans
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+import models
+from utils.sync_feed import next_revision
+
+WORKOUT_COPY_FIELDS = ("name", "description", "icon", "category")
+WORKOUT_EXERCISE_COPY_FIELDS = ("exercise_id", "sets", "reps", "rest_seconds", "order")
+
+
+def can_clone_workout(db: Session, workout: models.Workout, user_id: int) -> bool:
+    """Owners can clone their workouts; anyone can clone shared ones or those in a shared plan"""
+    if workout.user_id == user_id or workout.is_shared:
+        return True
+    if workout.plan_id is None:
+        return False
+    return bool(db.query(models.WorkoutPlan.is_shared).filter(
+        models.WorkoutPlan.id == workout.plan_id
+    ).scalar())
+
+
+def clone_workouts(
+    db: Session,
+    workout_ids: Sequence[int],
+    user_id: int,
+    plan_id: Optional[int] = None,
+    names: Optional[Dict[int, str]] = None,
+) -> List[int]:
+    """
+    Copy workouts and their exercises to `user_id`, optionally into `plan_id`.
+
+    The cost is a fixed number of statements however many workouts and
+    exercises are copied: one SELECT and one multi-row INSERT per table.
+    (The workouts INSERT needs its RETURNING ids in parameter order; that is
+    a single statement on PostgreSQL, SQLite falls back to one per row.)
+    Returns the new workout ids in the order of `workout_ids`. Does not commit.
+    """
+    if not workout_ids:
+        return []
+    names = names or {}
+
+    columns = [getattr(models.Workout, field) for field in WORKOUT_COPY_FIELDS]
+    sources = {
+        row.id: row for row in db.execute(
+            select(models.Workout.id, *columns).where(models.Workout.id.in_(workout_ids))
+        )
+    }
+    source_ids = [workout_id for workout_id in workout_ids if workout_id in sources]
+    if not source_ids:
+        return []
+
+    # A bulk INSERT bypasses the ORM flush hook that stamps sync revisions
+    revision = next_revision(db, user_id)
+    workout_rows = []
+    for workout_id in source_ids:
+        row = {field: getattr(sources[workout_id], field) for field in WORKOUT_COPY_FIELDS}
+        row.update(user_id=user_id, plan_id=plan_id, revision=revision)
+        if workout_id in names:
+            row["name"] = names[workout_id]
+        workout_rows.append(row)
+    new_ids = db.execute(
+        insert(models.Workout).returning(models.Workout.id, sort_by_parameter_order=True),
+        workout_rows
+    ).scalars().all()
+    id_map = dict(zip(source_ids, new_ids))
+
+    exercise_columns = [getattr(models.WorkoutExercise, field) for field in WORKOUT_EXERCISE_COPY_FIELDS]
+    exercise_rows = [
+        dict(
+            {field: getattr(row, field) for field in WORKOUT_EXERCISE_COPY_FIELDS},
+            workout_id=id_map[row.workout_id]
+        )
+        for row in db.execute(
+            select(models.WorkoutExercise.workout_id, *exercise_columns)
+            .where(models.WorkoutExercise.workout_id.in_(source_ids))
+            .order_by(models.WorkoutExercise.workout_id, models.WorkoutExercise.id)
+        )
+    ]
+    if exercise_rows:
+        db.execute(insert(models.WorkoutExercise), exercise_rows)
+    return list(new_ids)
+
+
+def clone_plan(
+    db: Session,
+    plan: models.WorkoutPlan,
+    user_id: int,
+    name: Optional[str] = None,
+) -> Tuple[models.WorkoutPlan, List[int]]:
+    """
+    Copy a plan with all its workouts and their exercises to `user_id`.
+    Copies start unshared. Returns the new plan and its new workout ids.
+    Does not commit.
+    """
+    new_plan = models.WorkoutPlan(
+        user_id=user_id,
+        name=name or plan.name,
+        description=plan.description
+    )
+    db.add(new_plan)
+    db.flush()
+
+    workout_ids = [row.id for row in db.query(models.Workout.id).filter(
+        models.Workout.plan_id == plan.id
+    ).order_by(models.Workout.id)]
+    return new_plan, clone_workouts(db, workout_ids, user_id, plan_id=new_plan.id)
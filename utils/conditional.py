@@ -0,0 +1,148 @@
+"""
+Conditional GET support: weak ETags, Last-Modified and 304 responses
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+
+# Clients may keep a copy but must revalidate it before every use
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+
+
+def weak_etag(*parts: Any) -> str:
+    """Weak ETag from the values that make up a resource's revision"""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return f'W/"{hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]}"'
+
+
+def _latest(*values: Optional[datetime]) -> Optional[datetime]:
+    present = [value for value in values if value is not None]
+    return max(present) if present else None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Weak comparison: W/"x" and "x" are the same entity tag
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since is None:
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have one-second resolution
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+) -> Optional[Response]:
+    """
+    Set ETag / Last-Modified / Cache-Control on `response` and return a 304
+    response if the client's copy is current (If-None-Match wins over
+    If-Modified-Since), otherwise None.
+    """
+    headers = {"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = bool(if_modified_since and last_modified
+                            and _not_modified_since(if_modified_since, last_modified))
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+# Revisions: a handful of aggregates standing in for the full nested tree.
+# Lists and sessions only get an ETag: deletions and session edits leave no
+# timestamp behind, so a Last-Modified for them could wrongly answer 304.
+# Sessions use their sync revision (see utils/sync_feed.py) instead.
+
+def _workouts_revision(db: Session, *criteria) -> tuple:
+    count, max_id, updated_at, last_session_at = db.query(
+        func.count(models.Workout.id),
+        func.max(models.Workout.id),
+        func.max(models.Workout.updated_at),
+        func.max(models.Workout.last_session_at),
+    ).filter(*criteria).one()
+    exercise_count, exercise_max_id = db.query(
+        func.count(models.WorkoutExercise.id),
+        func.max(models.WorkoutExercise.id),
+    ).join(models.Workout, models.WorkoutExercise.workout_id == models.Workout.id).filter(*criteria).one()
+    return (count, max_id, updated_at, last_session_at, exercise_count, exercise_max_id)
+
+
+def workout_validators(db: Session, workout_id: int) -> Optional[tuple]:
+    """(etag, last_modified) of one workout, or None if it does not exist"""
+    row = db.query(models.Workout.updated_at, models.Workout.last_session_at).filter(
+        models.Workout.id == workout_id
+    ).first()
+    if row is None:
+        return None
+    revision = _workouts_revision(db, models.Workout.id == workout_id)
+    return weak_etag("workout", workout_id, *revision), _latest(row.updated_at, row.last_session_at)
+
+
+def workout_list_etag(db: Session, user_id: int, query_string: str) -> str:
+    """ETag of a user's workout list page"""
+    revision = _workouts_revision(db, models.Workout.user_id == user_id)
+    return weak_etag("workouts", user_id, query_string, *revision)
+
+
+def plan_validators(db: Session, plan_id: int) -> Optional[tuple]:
+    """(etag, last_modified) of one plan including its workouts, or None if it does not exist"""
+    row = db.query(models.WorkoutPlan.updated_at).filter(models.WorkoutPlan.id == plan_id).first()
+    if row is None:
+        return None
+    revision = _workouts_revision(db, models.Workout.plan_id == plan_id)
+    return weak_etag("plan", plan_id, row.updated_at, *revision), _latest(row.updated_at, revision[2], revision[3])
+
+
+def plan_list_etag(db: Session, user_id: int) -> str:
+    """ETag of a user's plans including their workouts"""
+    count, max_id, updated_at = db.query(
+        func.count(models.WorkoutPlan.id),
+        func.max(models.WorkoutPlan.id),
+        func.max(models.WorkoutPlan.updated_at),
+    ).filter(models.WorkoutPlan.user_id == user_id).one()
+    plan_ids = db.query(models.WorkoutPlan.id).filter(models.WorkoutPlan.user_id == user_id)
+    revision = _workouts_revision(db, models.Workout.plan_id.in_(plan_ids.scalar_subquery()))
+    return weak_etag("plans", user_id, count, max_id, updated_at, *revision)
+
+
+def session_etag(db: Session, session_id: int) -> Optional[str]:
+    """ETag of one session (with its exercises and workout), or None if it does not exist"""
+    # Sync revisions are stamped on every change, including edits to child rows
+    row = db.query(models.WorkoutSession.revision, models.Workout.revision).outerjoin(
+        models.Workout, models.WorkoutSession.workout_id == models.Workout.id
+    ).filter(models.WorkoutSession.id == session_id).first()
+    if row is None:
+        return None
+    return weak_etag("session", session_id, *row)
@@ -0,0 +1,116 @@
+"""
+Denormalized per-user activity counters
+"""
+from datetime import datetime
+from typing import Dict, Iterable
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+
+COUNTER_FIELDS = ("workouts", "sessions", "completed_sessions", "workout_plans", "total_minutes")
+
+_DIALECT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def compute_counters(db: Session, user_id: int) -> Dict[str, int]:
+    """Count everything from the source tables (the slow path)"""
+    db.flush()
+    workouts = db.query(func.count(models.Workout.id)).filter(
+        models.Workout.user_id == user_id
+    ).scalar()
+    sessions, completed_sessions, total_minutes = db.query(
+        func.count(models.WorkoutSession.id),
+        func.count(models.WorkoutSession.completed_at),
+        func.coalesce(func.sum(models.WorkoutSession.duration_minutes), 0),
+    ).filter(models.WorkoutSession.user_id == user_id).one()
+    workout_plans = db.query(func.count(models.WorkoutPlan.id)).filter(
+        models.WorkoutPlan.user_id == user_id
+    ).scalar()
+    return {
+        "workouts": workouts or 0,
+        "sessions": sessions or 0,
+        "completed_sessions": completed_sessions or 0,
+        "workout_plans": workout_plans or 0,
+        "total_minutes": int(total_minutes or 0),
+    }
+
+
+def create_counters(db: Session, user_id: int) -> bool:
+    """
+    Insert a user's counters row built from the source tables, unless one
+    exists already (INSERT ... ON CONFLICT DO NOTHING, so concurrent first
+    writes don't collide). Returns True if this call created it. Does not commit.
+    """
+    values = compute_counters(db, user_id)
+    table = models.UserCounters.__table__
+    dialect_insert = _DIALECT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is None:
+        raise ValueError(f"Counter upsert is not supported on {db.get_bind().dialect.name}")
+    statement = dialect_insert(table).values(
+        user_id=user_id, updated_at=datetime.utcnow(), **values
+    ).on_conflict_do_nothing(index_elements=[table.c.user_id]).returning(table.c.user_id)
+    return db.execute(statement).first() is not None
+
+
+def adjust_counters(db: Session, user_id: int, **deltas: int) -> None:
+    """
+    Apply deltas (e.g. workouts=1) in the caller's transaction, as a single
+    atomic UPDATE so concurrent requests don't lose increments. Call it after
+    adding/deleting the counted rows and before committing.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    values = {getattr(models.UserCounters, field): getattr(models.UserCounters, field) + delta
+              for field, delta in deltas.items()}
+    values[models.UserCounters.updated_at] = datetime.utcnow()
+    query = db.query(models.UserCounters).filter(models.UserCounters.user_id == user_id)
+    if query.update(values, synchronize_session=False):
+        return
+    # No row yet: build it from the source tables, which already include this
+    # change. If a concurrent request created it first, apply the deltas to it.
+    if not create_counters(db, user_id):
+        query.update(values, synchronize_session=False)
+
+
+def session_counter_values(session: models.WorkoutSession) -> Dict[str, int]:
+    """What a single session contributes to its owner's counters"""
+    return {
+        "sessions": 1,
+        "completed_sessions": 1 if session.completed_at is not None else 0,
+        "total_minutes": session.duration_minutes or 0,
+    }
+
+
+def counter_deltas(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    """Difference between two contributions; a missing side counts as zero"""
+    return {field: after.get(field, 0) - before.get(field, 0) for field in set(before) | set(after)}
+
+
+def get_counters(db: Session, user_id: int) -> models.UserCounters:
+    """
+    A user's counters. Read-only: a missing row is computed from the source
+    tables but not stored (the next write or reconcile_user_counters.py creates it).
+    """
+    counters = db.get(models.UserCounters, user_id)
+    if counters is None:
+        counters = models.UserCounters(user_id=user_id, **compute_counters(db, user_id))
+    return counters
+
+
+def get_counters_for_users(db: Session, user_ids: Iterable[int]) -> Dict[int, models.UserCounters]:
+    """Load counters for many users with one query, computing (not storing) any missing rows"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    counters = {
+        row.user_id: row
+        for row in db.query(models.UserCounters).filter(models.UserCounters.user_id.in_(user_ids))
+    }
+    for user_id in user_ids:
+        if user_id not in counters:
+            counters[user_id] = models.UserCounters(user_id=user_id, **compute_counters(db, user_id))
+    return counters
@@ -0,0 +1,313 @@
+"""
+In-process, versioned snapshot of the exercise catalog
+"""
+import bisect
+import hashlib
+import os
+import threading
+from functools import cached_property
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from utils.exercise_search import ExerciseSearchIndex
+
+load_dotenv()
+
+# Configuration
+EXERCISE_CATALOG_REFRESH_SECONDS = float(os.getenv("EXERCISE_CATALOG_REFRESH_SECONDS", 60))
+
+# Listings can be filtered on these fields; each gets a precomputed index
+INDEXED_FIELDS = ("muscle_group", "equipment", "difficulty")
+
+
+FacetKey = Tuple[Optional[str], ...]
+
+
+def _facet_key(exercise: schemas.Exercise) -> FacetKey:
+    return tuple(getattr(exercise, field) for field in INDEXED_FIELDS)
+
+
+class FacetIndex:
+    """
+    Number of exercises per (muscle_group, equipment, difficulty)
+    combination. There are only a few hundred combinations at most, so any
+    filtered count is a scan of this table rather than of the catalog.
+    """
+
+    def __init__(self, counts: Dict[FacetKey, int]):
+        self.counts = {key: count for key, count in counts.items() if count > 0}
+
+    @classmethod
+    def build(cls, exercises: Iterable[schemas.Exercise]) -> "FacetIndex":
+        return cls(Counter(_facet_key(exercise) for exercise in exercises))
+
+    def apply(
+        self,
+        removed: Optional[schemas.Exercise] = None,
+        added: Optional[schemas.Exercise] = None,
+    ) -> "FacetIndex":
+        """New index with one exercise removed and/or added"""
+        counts = dict(self.counts)
+        if removed is not None:
+            counts[_facet_key(removed)] -= 1
+        if added is not None:
+            counts[_facet_key(added)] = counts.get(_facet_key(added), 0) + 1
+        return FacetIndex(counts)
+
+    def facet_counts(self, **filters: Optional[str]) -> Tuple[int, Dict[str, Dict[Optional[str], int]]]:
+        """
+        Total matching every filter, and per-field value counts. A field's
+        counts ignore that field's own filter, so they show what selecting
+        another value would return (counts of equipment within
+        muscle_group=chest stay unchanged when equipment is also chosen).
+        """
+        active = {INDEXED_FIELDS.index(field): value for field, value in filters.items() if value}
+        total = 0
+        facets: Dict[str, Counter] = {field: Counter() for field in INDEXED_FIELDS}
+        for key, count in self.counts.items():
+            mismatches = [position for position, value in active.items() if key[position] != value]
+            if not mismatches:
+                total += count
+                for position, field in enumerate(INDEXED_FIELDS):
+                    facets[field][key[position]] += count
+            elif len(mismatches) == 1:
+                # Only counted for the field whose own filter excluded it
+                field = INDEXED_FIELDS[mismatches[0]]
+                facets[field][key[mismatches[0]]] += count
+        return total, {field: dict(counts) for field, counts in facets.items()}
+
+
+def _entry_hash(exercise: schemas.Exercise) -> int:
+    return int.from_bytes(hashlib.sha1(exercise.model_dump_json().encode("utf-8")).digest(), "big")
+
+
+def _insert_id(ids: Tuple[int, ...], exercise_id: int) -> Tuple[int, ...]:
+    position = bisect.bisect_left(ids, exercise_id)
+    return ids[:position] + (exercise_id,) + ids[position:]
+
+
+def _remove_id(ids: Tuple[int, ...], exercise_id: int) -> Tuple[int, ...]:
+    position = bisect.bisect_left(ids, exercise_id)
+    if position < len(ids) and ids[position] == exercise_id:
+        return ids[:position] + ids[position + 1:]
+    return ids
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of every exercise. Never modified after construction:
+    changes build a new snapshot that replaces the old one in one assignment,
+    so readers never need a lock.
+    """
+
+    def __init__(self, exercises: Iterable[schemas.Exercise], version: int, facets: Optional[FacetIndex] = None):
+        self.version = version
+        self.by_id: Dict[int, schemas.Exercise] = {exercise.id: exercise for exercise in exercises}
+        self.facets = facets if facets is not None else FacetIndex.build(self.by_id.values())
+        self.ids: Tuple[int, ...] = tuple(sorted(self.by_id))
+        self.indexes: Dict[str, Dict[str, Tuple[int, ...]]] = {}
+        for field in INDEXED_FIELDS:
+            index: Dict[str, List[int]] = {}
+            for exercise_id in self.ids:
+                index.setdefault(getattr(self.by_id[exercise_id], field), []).append(exercise_id)
+            self.indexes[field] = {value: tuple(ids) for value, ids in index.items()}
+
+        # XOR of per-entry hashes, so a single change updates it in O(1)
+        self.hashes: Dict[int, int] = {exercise_id: _entry_hash(entry) for exercise_id, entry in self.by_id.items()}
+        combined = 0
+        for entry_hash in self.hashes.values():
+            combined ^= entry_hash
+        self._combined = combined
+
+    @property
+    def digest(self) -> str:
+        """Identifies the content across worker processes, unlike `version`"""
+        return f"{self._combined:040x}"
+
+    def with_change(
+        self,
+        version: int,
+        removed_id: Optional[int] = None,
+        added: Optional[schemas.Exercise] = None,
+    ) -> "CatalogSnapshot":
+        """
+        New snapshot with one exercise removed and/or added (an update is
+        both, with the same id). Only that entry is rehashed and reindexed;
+        everything else is shared with or shallow-copied from this snapshot.
+        """
+        snapshot = object.__new__(CatalogSnapshot)
+        snapshot.version = version
+        by_id = dict(self.by_id)
+        hashes = dict(self.hashes)
+        indexes = {field: dict(values) for field, values in self.indexes.items()}
+        ids = self.ids
+        combined = self._combined
+
+        removed = by_id.pop(removed_id, None) if removed_id is not None else None
+        if removed is not None:
+            combined ^= hashes.pop(removed.id)
+            ids = _remove_id(ids, removed.id)
+            for field in INDEXED_FIELDS:
+                value = getattr(removed, field)
+                remaining = _remove_id(indexes[field].get(value, ()), removed.id)
+                if remaining:
+                    indexes[field][value] = remaining
+                else:
+                    indexes[field].pop(value, None)
+        if added is not None:
+            by_id[added.id] = added
+            hashes[added.id] = _entry_hash(added)
+            combined ^= hashes[added.id]
+            ids = _insert_id(ids, added.id)
+            for field in INDEXED_FIELDS:
+                value = getattr(added, field)
+                indexes[field][value] = _insert_id(indexes[field].get(value, ()), added.id)
+
+        snapshot.by_id = by_id
+        snapshot.hashes = hashes
+        snapshot.indexes = indexes
+        snapshot.ids = ids
+        snapshot._combined = combined
+        snapshot.facets = self.facets.apply(removed=removed, added=added)
+        return snapshot
+
+    def get(self, exercise_id: int) -> Optional[schemas.Exercise]:
+        return self.by_id.get(exercise_id)
+
+    @cached_property
+    def search_index(self) -> ExerciseSearchIndex:
+        """Built on first search, once per snapshot"""
+        return ExerciseSearchIndex(self.by_id[exercise_id] for exercise_id in self.ids)
+
+    def filter_ids(self, **filters: Optional[str]) -> Tuple[int, ...]:
+        """Sorted ids matching every given field value, from the indexes"""
+        active = [(field, value) for field, value in filters.items() if value]
+        if not active:
+            return self.ids
+        candidates = sorted(
+            (self.indexes[field].get(value, ()) for field, value in active), key=len
+        )
+        if len(candidates) == 1:
+            return candidates[0]
+        others = [set(ids) for ids in candidates[1:]]
+        return tuple(exercise_id for exercise_id in candidates[0] if all(exercise_id in ids for ids in others))
+
+    def page(
+        self,
+        ids: Tuple[int, ...],
+        after_id: Optional[int] = None,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> Tuple[List[schemas.Exercise], Optional[int]]:
+        """
+        One page of `ids` in id order, after `after_id` (keyset) or from
+        `skip`. Returns the exercises and the last id if more rows follow.
+        """
+        start = bisect.bisect_right(ids, after_id) if after_id is not None else max(skip, 0)
+        page_ids = ids[start:start + limit]
+        has_more = start + limit < len(ids)
+        return [self.by_id[exercise_id] for exercise_id in page_ids], (page_ids[-1] if has_more and page_ids else None)
+
+
+def _to_entry(exercise: models.Exercise) -> schemas.Exercise:
+    return schemas.Exercise.model_validate(exercise)
+
+
+class ExerciseCatalog:
+    """
+    Holds the current CatalogSnapshot. Writes in this process swap it
+    immediately; a daemon thread reloads it periodically so changes made by
+    other workers show up within EXERCISE_CATALOG_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._writes = 0  # local writes so far, lets a reload detect that it raced one
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            from database import SessionLocal
+
+            db = SessionLocal()
+            try:
+                self.load(db)
+            finally:
+                db.close()
+            snapshot = self._snapshot
+        return snapshot
+
+    def _next_version(self) -> int:
+        # Callers hold self._lock
+        return self._snapshot.version + 1 if self._snapshot is not None else 1
+
+    def load(self, db: Session) -> CatalogSnapshot:
+        """
+        Reload from the database; the version only moves if the content
+        changed. A write made in this process while the rows were being read
+        may be newer than what was read, so the reload is then skipped and
+        left to the next refresh.
+        """
+        with self._lock:
+            writes_before = self._writes
+        exercises = [_to_entry(exercise) for exercise in db.query(models.Exercise).order_by(models.Exercise.id)]
+        loaded = CatalogSnapshot(exercises, 0)
+        with self._lock:
+            if self._snapshot is not None:
+                if self._writes != writes_before or loaded.digest == self._snapshot.digest:
+                    return self._snapshot
+            loaded.version = self._next_version()
+            self._snapshot = loaded
+            return loaded
+
+    def upsert(self, exercise: models.Exercise) -> CatalogSnapshot:
+        """Swap in a snapshot containing a created or updated exercise (call after commit)"""
+        entry = _to_entry(exercise)
+        self.snapshot  # make sure the rest of the catalog is loaded
+        with self._lock:
+            self._writes += 1
+            self._snapshot = self._snapshot.with_change(self._next_version(), removed_id=entry.id, added=entry)
+            return self._snapshot
+
+    def remove(self, exercise_id: int) -> CatalogSnapshot:
+        """Swap in a snapshot without a deleted exercise (call after commit)"""
+        self.snapshot  # make sure the rest of the catalog is loaded
+        with self._lock:
+            self._writes += 1
+            self._snapshot = self._snapshot.with_change(self._next_version(), removed_id=exercise_id)
+            return self._snapshot
+
+    def start_refresh(self, session_factory, refresh_seconds: float) -> None:
+        """Reload the catalog periodically in a daemon thread"""
+        if self._refresh_thread is not None or refresh_seconds <= 0:
+            return
+        self._stop.clear()
+
+        def _run():
+            while not self._stop.wait(refresh_seconds):
+                db = session_factory()
+                try:
+                    self.load(db)
+                except Exception as e:
+                    print(f"Failed to refresh exercise catalog: {str(e)}")
+                finally:
+                    db.close()
+
+        self._refresh_thread = threading.Thread(target=_run, name="exercise-catalog-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop_refresh(self) -> None:
+        self._stop.set()
+        self._refresh_thread = None
+
+
+exercise_catalog = ExerciseCatalog()
@@ -0,0 +1,219 @@
+"""
+Typeahead and typo-tolerant search over the exercise catalog
+"""
+import heapq
+import itertools
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import schemas
+
+# Fields searched, with how much a match in each counts
+SEARCH_FIELD_WEIGHTS = {"name": 3.0, "equipment": 1.5, "description": 1.0}
+# Fields offered for prefix (typeahead) matching
+PREFIX_FIELDS = ("name", "equipment")
+
+EXACT_MATCH_SCORE = 1.0
+PREFIX_MATCH_SCORE = 0.8
+FUZZY_MATCH_SCALE = 0.6  # applied to the trigram similarity
+MIN_TRIGRAM_SIMILARITY = 0.3
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 3
+# Swapped letters break most trigrams: tokens sharing a couple of trigrams
+# are also accepted when they are this many edits away
+TYPO_EDIT_DISTANCE = 1
+TYPO_SIMILARITY = 0.5
+# Further words are ignored
+MAX_QUERY_TOKENS = 6
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.lower()) if text else []
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance (a transposition counts as one edit),
+    giving up with max_distance + 1 once it is certain to exceed max_distance
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _merge_max(target: Dict[int, float], source: Dict[int, float]) -> None:
+    for exercise_id, score in source.items():
+        if score > target.get(exercise_id, 0.0):
+            target[exercise_id] = score
+
+
+def _best_matching(token_scores: List[Dict[int, float]], allowed_ids: Optional[Set[int]], limit: int) -> Set[int]:
+    """
+    Ids matching as many query tokens as possible, at least `limit` of them
+    when there are that many. Results are ranked by matched tokens first, so
+    the large sets of exercises matching one common word can usually be
+    skipped without scoring them.
+    """
+    matches = sorted(
+        (scores.keys() & allowed_ids if allowed_ids is not None else set(scores) for scores in token_scores),
+        key=len,
+    )
+    for required in range(len(matches), 1, -1):
+        candidates: Set[int] = set()
+        for combination in itertools.combinations(matches, required):
+            candidates |= combination[0].intersection(*combination[1:])
+        if len(candidates) >= limit:
+            return candidates
+    return set().union(*matches)
+
+
+class PrefixTrie:
+    """
+    Token trie; every node keeps the best score of each exercise reachable
+    below it, so a prefix lookup is a single walk
+    """
+
+    def __init__(self):
+        self.root: Dict = {}
+
+    def insert(self, token: str, exercise_id: int, score: float) -> None:
+        node = self.root
+        for char in token:
+            node = node.setdefault(char, {})
+            scores = node.setdefault("", {})
+            if score > scores.get(exercise_id, 0.0):
+                scores[exercise_id] = score
+
+    def lookup(self, prefix: str) -> Dict[int, float]:
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return {}
+        return node.get("", {})
+
+
+class ExerciseSearchIndex:
+    """
+    Immutable search index over one catalog snapshot:
+
+    - postings token -> {exercise id: best field-weighted score}
+    - a prefix trie over name and equipment tokens for typeahead
+    - a trigram inverted index over the token vocabulary, so a misspelled
+      query token is mapped to the real tokens it most resembles
+    """
+
+    def __init__(self, exercises: Iterable[schemas.Exercise]):
+        self.trie = PrefixTrie()
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self.vocabulary_trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self.name_lengths: Dict[int, int] = {}
+
+        for exercise in exercises:
+            self.name_lengths[exercise.id] = len(exercise.name or "")
+            for field, weight in SEARCH_FIELD_WEIGHTS.items():
+                for token in set(tokenize(getattr(exercise, field))):
+                    scores = self.postings[token]
+                    if EXACT_MATCH_SCORE * weight > scores.get(exercise.id, 0.0):
+                        scores[exercise.id] = EXACT_MATCH_SCORE * weight
+                    if field in PREFIX_FIELDS:
+                        self.trie.insert(token, exercise.id, PREFIX_MATCH_SCORE * weight)
+
+        for token in self.postings:
+            for trigram in trigrams(token):
+                self.vocabulary_trigrams[trigram].add(token)
+
+        # Freeze: plain dicts, so lookups of unknown tokens do not grow the index
+        self.postings = dict(self.postings)
+        self.vocabulary_trigrams = dict(self.vocabulary_trigrams)
+
+    def _similar_tokens(self, token: str) -> List[Tuple[str, float]]:
+        query_trigrams = trigrams(token)
+        shared: Dict[str, int] = defaultdict(int)
+        for trigram in query_trigrams:
+            for candidate in self.vocabulary_trigrams.get(trigram, ()):
+                shared[candidate] += 1
+        similar = []
+        for candidate, count in shared.items():
+            if candidate == token:
+                continue
+            # len(candidate) + 1 == number of trigrams of the padded candidate
+            similarity = count / (len(query_trigrams) + len(candidate) + 1 - count)
+            if similarity < MIN_TRIGRAM_SIMILARITY and count >= 2 and \
+                    edit_distance(token, candidate, TYPO_EDIT_DISTANCE) <= TYPO_EDIT_DISTANCE:
+                similarity = TYPO_SIMILARITY
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                similar.append((candidate, similarity))
+        return similar
+
+    def _token_scores(self, token: str, is_last: bool) -> Dict[int, float]:
+        """Best score per exercise for one query token"""
+        exact = self.postings.get(token, {})
+        # The token being typed is matched as a prefix
+        prefix = self.trie.lookup(token) if is_last and len(token) >= MIN_PREFIX_LENGTH else {}
+        if exact or prefix:
+            if not prefix:
+                return exact
+            scores = dict(prefix)
+            _merge_max(scores, exact)
+            return scores
+
+        # Unknown token: most likely a typo
+        scores: Dict[int, float] = {}
+        if len(token) >= MIN_FUZZY_LENGTH:
+            for candidate, similarity in self._similar_tokens(token):
+                factor = FUZZY_MATCH_SCALE * similarity
+                _merge_max(scores, {
+                    exercise_id: score * factor for exercise_id, score in self.postings[candidate].items()
+                })
+        return scores
+
+    def search(self, query: str, allowed_ids: Optional[Set[int]] = None, limit: int = 20) -> List[Tuple[int, float]]:
+        """
+        Rank exercises for `query`: more matched query tokens first, then
+        total score, then shorter names. Returns (id, score) pairs.
+        """
+        tokens = tokenize(query)[:MAX_QUERY_TOKENS]
+        if not tokens:
+            return []
+
+        token_scores = [self._token_scores(token, position == len(tokens) - 1)
+                        for position, token in enumerate(tokens)]
+        if len(token_scores) == 1:
+            totals = token_scores[0]
+            matched = None
+            if allowed_ids is not None:
+                totals = {exercise_id: score for exercise_id, score in totals.items() if exercise_id in allowed_ids}
+        else:
+            candidates = _best_matching(token_scores, allowed_ids, limit)
+            totals = {exercise_id: sum(scores.get(exercise_id, 0.0) for scores in token_scores)
+                      for exercise_id in candidates}
+            matched = {exercise_id: sum(exercise_id in scores for scores in token_scores)
+                       for exercise_id in candidates}
+
+        name_lengths = self.name_lengths
+        if matched is None:
+            key = lambda item: (item[1], -name_lengths[item[0]], -item[0])
+        else:
+            key = lambda item: (matched[item[0]], item[1], -name_lengths[item[0]], -item[0])
+        return [(exercise_id, round(score, 3)) for exercise_id, score in heapq.nlargest(limit, totals.items(), key=key)]
@@ -0,0 +1,79 @@
+"""
+Idempotent bulk upsert of built-in catalog exercises, keyed on the exercise name
+"""
+import os
+from typing import Dict, Iterable, List
+
+from dotenv import load_dotenv
+from sqlalchemy import inspect, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+
+load_dotenv()
+
+# Configuration
+EXERCISE_UPSERT_BATCH_SIZE = int(os.getenv("EXERCISE_UPSERT_BATCH_SIZE", 1000))
+
+# Columns a seed row may set; everything except the name is updated on conflict
+UPSERT_COLUMNS = ("name", "description", "muscle_group", "equipment", "difficulty", "instructions")
+
+_DIALECT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+BUILTIN_NAME_INDEX = "uq_exercises_builtin_name"
+
+
+def has_unique_name_index(db: Session) -> bool:
+    """ON CONFLICT (name) WHERE user_id IS NULL needs the partial unique index on built-in names"""
+    inspector = inspect(db.get_bind())
+    return any(
+        index["name"] == BUILTIN_NAME_INDEX and index["unique"]
+        for index in inspector.get_indexes("exercises")
+    )
+
+
+def upsert_exercises(db: Session, rows: Iterable[dict], batch_size: int = EXERCISE_UPSERT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Insert new built-in exercises and update changed ones with INSERT ... ON
+    CONFLICT (name) WHERE user_id IS NULL DO UPDATE, two statements per batch: one to find which names
+    exist, one upsert that only rewrites rows whose values differ. Only the
+    affected rows are locked, so it is safe to run against a live database.
+    Commits each batch and returns inserted/updated/unchanged counts.
+    """
+    dialect = db.get_bind().dialect.name
+    dialect_insert = _DIALECT_INSERTS.get(dialect)
+    if dialect_insert is None:
+        raise ValueError(f"Exercise upsert is not supported on {dialect}")
+
+    # One row per name (the last one wins), in name order so that concurrent
+    # seeders lock rows in the same order
+    by_name = {row["name"]: {column: row.get(column) for column in UPSERT_COLUMNS} for row in rows}
+    values = [by_name[name] for name in sorted(by_name)]
+    table = models.Exercise.__table__
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    for start in range(0, len(values), max(1, batch_size)):
+        batch: List[dict] = values[start:start + batch_size]
+        names = [row["name"] for row in batch]
+        existing = {name for (name,) in db.query(models.Exercise.name).filter(
+            models.Exercise.user_id.is_(None),
+            models.Exercise.name.in_(names)
+        )}
+
+        statement = dialect_insert(table).values(batch)
+        updated_columns = [column for column in UPSERT_COLUMNS if column != "name"]
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.name],
+            index_where=table.c.user_id.is_(None),
+            set_={column: statement.excluded[column] for column in updated_columns},
+            where=or_(*(table.c[column].is_distinct_from(statement.excluded[column]) for column in updated_columns)),
+        ).returning(table.c.name)
+        written = {name for (name,) in db.execute(statement)}
+        db.commit()
+
+        counts["inserted"] += len(written - existing)
+        counts["updated"] += len(written & existing)
+        counts["unchanged"] += len(batch) - len(written)
+    return counts
@@ -0,0 +1,153 @@
+"""
+Background pipeline generating resized derivatives of uploaded images
+"""
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+
+load_dotenv()
+
+# Configuration
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+DERIVATIVE_SIZES = (64, 256, 512)
+DERIVATIVE_FORMATS = {
+    "webp": ("WEBP", ".webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", ".jpg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+# Finished jobs waiting to be recorded: (user_id, source_path, generated, recorded)
+_results: "queue.Queue[Optional[tuple]]" = queue.Queue()
+_recorder: Optional[threading.Thread] = None
+_recorder_lock = threading.Lock()
+
+
+def derivative_path(source_path: str, size: int, extension: str) -> Path:
+    """
+    Derivatives live next to their content-addressed original and are named
+    after it, so they are immutable and regenerating them is idempotent.
+    """
+    source = Path(source_path)
+    return source.with_name(f"{source.stem}_{size}{extension}")
+
+
+def generate_derivatives(source_path: str) -> Dict[str, Dict[str, str]]:
+    """
+    Resize an image to every DERIVATIVE_SIZE in every DERIVATIVE_FORMAT.
+    Runs inside a worker process; returns {size: {format: path}}.
+    """
+    derivatives: Dict[str, Dict[str, str]] = {}
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        for size in DERIVATIVE_SIZES:
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            derivatives[str(size)] = {}
+            for format_name, (pil_format, extension, options) in DERIVATIVE_FORMATS.items():
+                target = derivative_path(source_path, size, extension)
+                output = resized.convert("RGB") if pil_format == "JPEG" else resized
+                if not target.exists():
+                    temp_target = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+                    output.save(temp_target, pil_format, **options)
+                    os.replace(temp_target, target)
+                derivatives[str(size)][format_name] = target.as_posix()
+    return derivatives
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn keeps worker processes free of the server's threads and DB connections
+        _executor = ProcessPoolExecutor(
+            max_workers=IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def _record_derivatives(user_id: int, source_path: str, generated: Future) -> None:
+    from database import SessionLocal
+    import models
+
+    try:
+        derivatives = generated.result()
+    except Exception:
+        logger.exception("Failed to generate derivatives for %s", source_path)
+        return
+
+    db = SessionLocal()
+    try:
+        # Only record if the user has not uploaded another picture in the meantime
+        updated = db.query(models.User).filter(
+            models.User.id == user_id,
+            models.User.profile_picture == source_path
+        ).update(
+            {models.User.profile_picture_derivatives: json.dumps(derivatives)},
+            synchronize_session=False
+        )
+        db.commit()
+        if not updated:
+            logger.info("Profile picture for user %s changed, derivatives of %s not recorded", user_id, source_path)
+    finally:
+        db.close()
+
+
+def _run_recorder() -> None:
+    """Record finished jobs in the database, off the executor's management thread"""
+    while True:
+        job = _results.get()
+        if job is None:
+            return
+        user_id, source_path, generated, recorded = job
+        try:
+            _record_derivatives(user_id, source_path, generated)
+        except Exception:
+            logger.exception("Failed to record derivatives of %s for user %s", source_path, user_id)
+        finally:
+            recorded.set_result(None)
+
+
+def _start_recorder() -> None:
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None or not _recorder.is_alive():
+            _recorder = threading.Thread(target=_run_recorder, name="image-derivatives-recorder", daemon=True)
+            _recorder.start()
+
+
+def schedule_profile_derivatives(user_id: int, source_path: str) -> Future:
+    """
+    Queue derivative generation without waiting for it. The returned future
+    completes once the user row has been updated (or the job failed).
+    """
+    _start_recorder()
+    recorded: Future = Future()
+    generated = _get_executor().submit(generate_derivatives, source_path)
+    # The callback only hands the job over; the recorder thread does the DB write
+    generated.add_done_callback(lambda done: _results.put((user_id, source_path, done, recorded)))
+    return recorded
+
+
+def shutdown() -> None:
+    global _executor, _recorder
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    with _recorder_lock:
+        if _recorder is not None:
+            _results.put(None)
+            _recorder = None
@@ -0,0 +1,54 @@
+"""
+Denormalized Workout.last_session_at
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+import models
+from utils.sync_feed import stamp_rows
+
+
+def latest_session_start(workout_id):
+    """Correlated subquery: the latest session start of the workout `workout_id` refers to"""
+    return select(func.max(models.WorkoutSession.started_at)).where(
+        models.WorkoutSession.workout_id == workout_id
+    ).scalar_subquery()
+
+
+def record_session_start(db: Session, workout_id: int, started_at: Optional[datetime]) -> None:
+    """
+    Move a workout's last_session_at forward to `started_at` (does not commit).
+    The guarded UPDATE only ever moves it forward, so concurrent sessions cannot
+    overwrite a later value, and it leaves updated_at alone.
+    """
+    if workout_id is None or started_at is None:
+        return
+    changed = db.execute(
+        update(models.Workout)
+        .where(
+            models.Workout.id == workout_id,
+            or_(models.Workout.last_session_at.is_(None), models.Workout.last_session_at < started_at)
+        )
+        .values(last_session_at=started_at, updated_at=models.Workout.updated_at)
+        .returning(models.Workout.id, models.Workout.user_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    stamp_rows(db, models.Workout, changed)
+
+
+def refresh_last_session(db: Session, workout_id: int) -> None:
+    """Recompute a workout's last_session_at, e.g. after a session was deleted (does not commit)"""
+    if workout_id is None:
+        return
+    db.flush()
+    changed = db.execute(
+        update(models.Workout)
+        .where(models.Workout.id == workout_id)
+        .values(last_session_at=latest_session_start(workout_id), updated_at=models.Workout.updated_at)
+        .returning(models.Workout.id, models.Workout.user_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    stamp_rows(db, models.Workout, changed)
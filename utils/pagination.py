@@ -0,0 +1,104 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values: Tuple[Any, ...]) -> str:
+    """Encode the (sort key, id) of the last row into an opaque cursor"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _coerce(value: Any, column: Any) -> Any:
+    """A cursor value as the column's Python type; ValueError/TypeError if it is not one"""
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if isinstance(value, (bool, list, dict)) or (python_type is str and not isinstance(value, str)):
+        raise ValueError("cursor value has the wrong type")
+    return python_type(value)
+
+
+def decode_cursor(cursor: str, columns: List[Any]) -> Tuple[Any, ...]:
+    """Decode a cursor back into values typed like `columns`"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(columns):
+            raise ValueError("cursor shape mismatch")
+        return tuple(_coerce(value, column) for value, column in zip(payload, columns))
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(
+    query: Query,
+    sort_column: Any,
+    id_column: Any,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    descending: bool = False,
+) -> Tuple[list, Optional[str]]:
+    """
+    Page through `query` ordered by (sort_column, id_column).
+
+    With a cursor, rows strictly after the cursor position are returned
+    (keyset pagination: constant cost at any depth). Without one, the legacy
+    `skip` offset is used. Either way the cursor of the next page is returned,
+    or None on the last page. Pass the same column twice to sort by id alone.
+    """
+    single_key = sort_column is id_column
+    columns = [id_column] if single_key else [sort_column, id_column]
+
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        if single_key:
+            (last_id,) = values
+            query = query.filter(id_column < last_id if descending else id_column > last_id)
+        else:
+            last_sort, last_id = values
+            if descending:
+                query = query.filter(or_(
+                    sort_column < last_sort,
+                    and_(sort_column == last_sort, id_column < last_id)
+                ))
+            else:
+                query = query.filter(or_(
+                    sort_column > last_sort,
+                    and_(sort_column == last_sort, id_column > last_id)
+                ))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    query = query.order_by(*order)
+    if not cursor and skip:
+        query = query.offset(skip)
+    rows = query.limit(limit + 1).all()
+    if not rows or limit < 1:
+        return [], None
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(tuple(getattr(last, column.key) for column in columns))
+    return rows, next_cursor
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
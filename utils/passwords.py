@@ -0,0 +1,124 @@
+"""
+Password hashing on a dedicated, bounded worker pool
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+load_dotenv()
+
+# Configuration
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+PASSWORD_HASH_QUEUE_DEPTH = int(os.getenv("PASSWORD_HASH_QUEUE_DEPTH", 32))
+
+# Pinning min/max rounds to the configured cost makes passlib flag every hash
+# created with a different cost, so it gets rehashed on the next login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+class PasswordWorkerPool:
+    """
+    Run bcrypt work on a fixed number of threads (bcrypt releases the GIL)
+    and reject new work with 503 once `queue_depth` jobs are already
+    running or waiting. Async endpoints await the result (run_async), so a
+    login burst holds no request threads while hashes queue here.
+    """
+
+    def __init__(self, workers: int, queue_depth: int):
+        self.workers = max(1, workers)
+        self.queue_depth = max(self.workers, queue_depth)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="password-hash"
+        )
+        self._slots = threading.BoundedSemaphore(self.queue_depth)
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn: Callable, *args):
+        """Run `fn(*args)` on the pool and block until its result (scripts, sync code)"""
+        return self._submit(fn, *args).result()
+
+    async def run_async(self, fn: Callable, *args):
+        """Run `fn(*args)` on the pool and await its result without holding a thread"""
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    def map(self, fn: Callable, items: Iterable) -> List:
+        """
+        Run `fn(item)` for every item on the pool and return results in order.
+        For batch jobs: instead of failing with 503 this waits for free slots,
+        and keeps at most `workers` jobs queued so interactive requests
+        still find room in the queue.
+        """
+        in_flight = threading.BoundedSemaphore(self.workers)
+        futures = []
+        for item in items:
+            in_flight.acquire()
+            self._slots.acquire()
+            try:
+                future = self._executor.submit(fn, item)
+            except BaseException:
+                self._slots.release()
+                in_flight.release()
+                raise
+            future.add_done_callback(lambda _: (self._slots.release(), in_flight.release()))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+
+password_pool = PasswordWorkerPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_DEPTH)
+
+
+def get_password_hash(password: str) -> str:
+    return password_pool.run(pwd_context.hash, password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_pool.run_async(pwd_context.hash, password)
+
+
+def get_password_hashes(passwords: Iterable[str]) -> List[str]:
+    """Hash many passwords in parallel (bulk imports)"""
+    return password_pool.map(pwd_context.hash, passwords)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return password_pool.run(pwd_context.verify, plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and return (is_valid, new_hash).
+    `new_hash` is set when the stored hash uses an outdated cost and should be replaced.
+    """
+    return password_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """verify_and_update_password for async endpoints"""
+    return await password_pool.run_async(pwd_context.verify_and_update, plain_password, hashed_password)
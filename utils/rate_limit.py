@@ -0,0 +1,225 @@
+"""
+Per-route rate limiting middleware with pluggable bucket storage
+"""
+import json
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+load_dotenv()
+
+# Configuration ("<count>/<second|minute|hour|day>", "0" disables)
+LOGIN_RATE_LIMIT_IP = os.getenv("LOGIN_RATE_LIMIT_IP", "30/minute")
+LOGIN_RATE_LIMIT_EMAIL = os.getenv("LOGIN_RATE_LIMIT_EMAIL", "5/minute")
+REGISTER_RATE_LIMIT_IP = os.getenv("REGISTER_RATE_LIMIT_IP", "10/hour")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+RATE_LIMIT_MAX_BODY_BYTES = int(os.getenv("RATE_LIMIT_MAX_BODY_BYTES", 16384))
+
+
+class RateLimit:
+    """Allow `requests` per `seconds`, keyed by client IP and/or request email"""
+
+    PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+    def __init__(self, requests: int, seconds: float, key_by: Iterable[str] = ("ip",)):
+        if requests <= 0 or seconds <= 0:
+            raise ValueError(f"Rate limit needs a positive count and period, got {requests}/{seconds}s")
+        self.requests = requests
+        self.seconds = seconds
+        self.key_by = tuple(key_by)
+
+    @property
+    def refill_rate(self) -> float:
+        return self.requests / self.seconds
+
+    @classmethod
+    def parse(cls, value: str, key_by: Iterable[str] = ("ip",)) -> Optional["RateLimit"]:
+        """Parse a limit such as "10/minute"; a count of 0 or an empty string disables it"""
+        value = (value or "").strip()
+        if not value:
+            return None
+        count, _, period = value.partition("/")
+        if int(count) == 0:
+            return None
+        seconds = cls.PERIODS.get(period.strip() or "minute")
+        if seconds is None:
+            raise ValueError(f"Unknown rate limit period: {period}")
+        return cls(int(count), seconds, key_by)
+
+
+class RateLimitStorage(ABC):
+    """Interface for bucket storage so limits can later be shared (e.g. Redis)"""
+
+    @abstractmethod
+    def consume(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        """Take one token for `key`; return (allowed, seconds until a token is available)"""
+
+
+class InMemoryRateLimitStorage(RateLimitStorage):
+    """
+    In-process token buckets. The key table is an LRU capped at `max_keys`,
+    so a flood of distinct IPs/emails cannot grow memory without bound.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, limit: RateLimit) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (float(limit.requests), now))
+            tokens = min(float(limit.requests), tokens + (now - updated_at) * limit.refill_rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / limit.refill_rate
+
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying `RateLimit`s to exact (method, path) routes.
+
+    Routes without limits cost one dict lookup. IP buckets are checked
+    first and the first denial stops the check, so a rejected request
+    spends no further tokens. For limits keyed by email, the JSON body (at
+    most `max_body_bytes`) is then buffered and replayed to the endpoint.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limits: Dict[Tuple[str, str], List[RateLimit]],
+        storage: Optional[RateLimitStorage] = None,
+        max_body_bytes: int = RATE_LIMIT_MAX_BODY_BYTES,
+    ):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.limits: Dict[Tuple[str, str], List[RateLimit]] = {}
+        for (method, path), route_limits in limits.items():
+            active = [limit for limit in route_limits if limit is not None]
+            if active:
+                self.limits[(method.upper(), path)] = active
+        self.storage = storage if storage is not None else InMemoryRateLimitStorage()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route_limits = self.limits.get((scope["method"], scope["path"]))
+        if not route_limits:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        ip = client[0] if client else "unknown"
+
+        # IP buckets first: they need no body, so a flood is rejected before reading it
+        checks = sorted(
+            ((index, limit, key_type) for index, limit in enumerate(route_limits) for key_type in limit.key_by),
+            key=lambda check: check[2] != "ip"
+        )
+        email = None
+        body_read = False
+        for index, limit, key_type in checks:
+            if key_type == "email" and not body_read:
+                body, receive = await self._buffer_body(receive, self.max_body_bytes)
+                body_read = True
+                if body is None:
+                    response = JSONResponse(status_code=413, content={"detail": "Request body too large"})
+                    await response(scope, receive, send)
+                    return
+                email = self._extract_email(body)
+
+            if key_type == "ip":
+                identity = ip
+            elif key_type == "email" and email:
+                identity = email
+            else:
+                continue
+            key = f"{scope['path']}:{index}:{key_type}:{identity}"
+            allowed, retry_after = self.storage.consume(key, limit)
+            if not allowed:
+                response = JSONResponse(
+                    status_code=429,
+                    content={"detail": "Too many requests, please try again later"},
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _buffer_body(receive: Receive, max_bytes: int) -> Tuple[Optional[bytes], Receive]:
+        """Read the whole body for replay; None if it exceeds `max_bytes`"""
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > max_bytes:
+                return None, receive
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        replayed = False
+
+        async def replay() -> Message:
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return body, replay
+
+    @staticmethod
+    def _extract_email(body: bytes) -> Optional[str]:
+        try:
+            payload = json.loads(body)
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if not isinstance(payload, dict):
+            return None
+        email = payload.get("email")
+        return email.strip().lower() if isinstance(email, str) else None
+
+
+def default_route_limits() -> Dict[Tuple[str, str], List[RateLimit]]:
+    """Limits for the bcrypt-backed authentication routes"""
+    login_limits = [
+        RateLimit.parse(LOGIN_RATE_LIMIT_IP, key_by=("ip",)),
+        RateLimit.parse(LOGIN_RATE_LIMIT_EMAIL, key_by=("email",)),
+    ]
+    register_limits = [RateLimit.parse(REGISTER_RATE_LIMIT_IP, key_by=("ip",))]
+    return {
+        ("POST", "/api/users/login"): login_limits,
+        ("POST", "/api/users/register"): register_limits,
+        ("POST", "/api/users/"): register_limits,
+    }
@@ -0,0 +1,150 @@
+"""
+In-memory token revocation list backed by the `revoked_tokens` table
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+
+class RevocationList:
+    """
+    Set of revoked token IDs (jti) plus per-user "revoked before" cutoffs.
+
+    Lookups are O(1) and never touch the database; the sets are rebuilt
+    from the `revoked_tokens` table at startup and every `refresh_seconds`
+    so revocations made by other workers are picked up. Revocations made
+    in this process while a reload reads the table are carried over into
+    the rebuilt sets.
+    """
+
+    def __init__(self):
+        self._jtis: Set[str] = set()
+        self._user_cutoffs: Dict[int, float] = {}
+        # Local revocations since the running reload started, None when idle
+        self._pending_jtis: Optional[Set[str]] = None
+        self._pending_cutoffs: Optional[Dict[int, float]] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def is_revoked(self, jti: Optional[str], user_id: int, issued_at: Optional[float]) -> bool:
+        if jti is not None and jti in self._jtis:
+            return True
+        cutoff = self._user_cutoffs.get(user_id)
+        if cutoff is not None and (issued_at is None or issued_at < cutoff):
+            return True
+        return False
+
+    def load(self, db: Session) -> None:
+        """Rebuild the in-memory sets from the unexpired rows of the table"""
+        with self._load_lock:
+            with self._lock:
+                self._pending_jtis = set()
+                self._pending_cutoffs = {}
+            try:
+                now = datetime.now(timezone.utc).replace(tzinfo=None)
+                jtis: Set[str] = set()
+                user_cutoffs: Dict[int, float] = {}
+                rows = db.query(
+                    models.RevokedToken.jti, models.RevokedToken.user_id, models.RevokedToken.revoked_at
+                ).filter(models.RevokedToken.expires_at >= now)
+                for jti, user_id, revoked_at in rows:
+                    if jti:
+                        jtis.add(jti)
+                    else:
+                        cutoff = revoked_at.replace(tzinfo=timezone.utc).timestamp()
+                        user_cutoffs[user_id] = max(cutoff, user_cutoffs.get(user_id, 0))
+
+                with self._lock:
+                    jtis |= self._pending_jtis
+                    for user_id, cutoff in self._pending_cutoffs.items():
+                        user_cutoffs[user_id] = max(cutoff, user_cutoffs.get(user_id, 0))
+                    self._jtis = jtis
+                    self._user_cutoffs = user_cutoffs
+            finally:
+                with self._lock:
+                    self._pending_jtis = None
+                    self._pending_cutoffs = None
+
+    def prune_expired(self, db: Session) -> int:
+        """Delete rows whose tokens have expired; returns how many were deleted"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        deleted = db.query(models.RevokedToken).filter(models.RevokedToken.expires_at < now).delete()
+        db.commit()
+        return deleted
+
+    def revoke_token(self, db: Session, jti: str, user_id: int, expires_at: float) -> bool:
+        """
+        Revoke a single token until its own expiry. Returns False if it was
+        already revoked (the unique jti makes this a claim, even across workers).
+        """
+        db.add(models.RevokedToken(
+            jti=jti,
+            user_id=user_id,
+            expires_at=datetime.fromtimestamp(expires_at, timezone.utc).replace(tzinfo=None),
+        ))
+        try:
+            db.commit()
+            claimed = True
+        except IntegrityError:
+            db.rollback()
+            claimed = False
+        with self._lock:
+            self._jtis.add(jti)
+            if self._pending_jtis is not None:
+                self._pending_jtis.add(jti)
+        return claimed
+
+    def revoke_user(self, db: Session, user_id: int, max_token_lifetime_seconds: float) -> None:
+        """Revoke every token issued to a user up to now"""
+        revoked_at = datetime.now(timezone.utc)
+        db.add(models.RevokedToken(
+            jti=None,
+            user_id=user_id,
+            revoked_at=revoked_at.replace(tzinfo=None),
+            expires_at=datetime.fromtimestamp(
+                revoked_at.timestamp() + max_token_lifetime_seconds, timezone.utc
+            ).replace(tzinfo=None),
+        ))
+        db.commit()
+        with self._lock:
+            self._user_cutoffs[user_id] = revoked_at.timestamp()
+            if self._pending_cutoffs is not None:
+                self._pending_cutoffs[user_id] = revoked_at.timestamp()
+
+    def start_refresh(self, session_factory, refresh_seconds: float, prune_seconds: float = 0) -> None:
+        """
+        Reload the list periodically in a daemon thread, and every
+        `prune_seconds` (0 disables) delete the expired rows as well
+        """
+        if self._refresh_thread is not None or refresh_seconds <= 0:
+            return
+        self._stop.clear()
+
+        def _run():
+            last_prune = time.monotonic()
+            while not self._stop.wait(refresh_seconds):
+                db = session_factory()
+                try:
+                    if prune_seconds > 0 and time.monotonic() - last_prune >= prune_seconds:
+                        last_prune = time.monotonic()
+                        self.prune_expired(db)
+                    self.load(db)
+                except Exception as e:
+                    print(f"Failed to refresh token revocation list: {str(e)}")
+                finally:
+                    db.close()
+
+        self._refresh_thread = threading.Thread(target=_run, name="revocation-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop_refresh(self) -> None:
+        self._stop.set()
+        self._refresh_thread = None
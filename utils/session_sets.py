@@ -0,0 +1,108 @@
+"""
+Appending single sets to a session exercise during a live workout
+"""
+import json
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from utils.stats import WorkoutAnalytics
+
+
+def _latest_session_exercise(db: Session, session_id: int, exercise_id: int) -> Optional[models.SessionExercise]:
+    return db.query(models.SessionExercise).filter(
+        models.SessionExercise.session_id == session_id,
+        models.SessionExercise.exercise_id == exercise_id
+    ).order_by(models.SessionExercise.id.desc()).with_for_update().first()
+
+
+def get_or_create_session_exercise(db: Session, session_id: int, exercise_id: int) -> models.SessionExercise:
+    """
+    The session's entry for an exercise, locked for the rest of the
+    transaction so concurrent appends to it are serialized. Older clients may
+    have created several entries per exercise; sets go to the latest one.
+    """
+    session_exercise = _latest_session_exercise(db, session_id, exercise_id)
+    if session_exercise is None:
+        # No row to lock yet: lock the session instead, so of two concurrent
+        # first sets only one creates the entry and the other finds it
+        db.query(models.WorkoutSession.id).filter(
+            models.WorkoutSession.id == session_id
+        ).with_for_update().first()
+        session_exercise = _latest_session_exercise(db, session_id, exercise_id)
+    if session_exercise is None:
+        session_exercise = models.SessionExercise(
+            session_id=session_id,
+            exercise_id=exercise_id,
+            sets_completed=0,
+            reps_completed=0,
+            weight=0,
+        )
+        db.add(session_exercise)
+    return session_exercise
+
+
+def append_set(db: Session, session_exercise: models.SessionExercise, set_data: schemas.SetData) -> int:
+    """
+    Add one set to `session_exercise` and update its running aggregates in
+    place: sets and total reps, top weight, volume, best set (by weight ×
+    reps), average RPE and time under tension. The session's total volume is
+    incremented in the same transaction. Returns the set's number.
+    """
+    sets = WorkoutAnalytics.parse_sets_data(session_exercise.sets_data)
+    new_set = set_data.model_dump(exclude_none=True)
+    sets.append(new_set)
+    session_exercise.sets_data = json.dumps(sets)
+
+    volume = set_data.weight * set_data.reps
+    session_exercise.sets_completed = (session_exercise.sets_completed or 0) + 1
+    session_exercise.reps_completed = (session_exercise.reps_completed or 0) + set_data.reps
+    session_exercise.weight = max(session_exercise.weight or 0, set_data.weight)
+    session_exercise.total_volume = (session_exercise.total_volume or 0) + volume
+    if set_data.tut is not None:
+        session_exercise.time_under_tension = (session_exercise.time_under_tension or 0) + set_data.tut
+    if set_data.rpe is not None:
+        session_exercise.avg_rpe = WorkoutAnalytics.calculate_avg_rpe(sets)
+
+    best_volume = (session_exercise.best_set_weight or 0) * (session_exercise.best_set_reps or 0)
+    if session_exercise.best_set_weight is None or volume > best_volume:
+        session_exercise.best_set_weight = set_data.weight
+        session_exercise.best_set_reps = set_data.reps
+
+    if volume:
+        # Atomic increment: sets of other exercises may be logged concurrently
+        db.query(models.WorkoutSession).filter(
+            models.WorkoutSession.id == session_exercise.session_id
+        ).update(
+            {models.WorkoutSession.total_volume: func.coalesce(models.WorkoutSession.total_volume, 0) + volume},
+            synchronize_session=False
+        )
+    return len(sets)
+
+
+def set_log_result(
+    session_exercise: models.SessionExercise,
+    set_number: int,
+    pr_details: dict,
+    session_total_volume: Optional[float],
+) -> dict:
+    prs_achieved = [k for k, v in pr_details.items() if v]
+    return {
+        "session_exercise_id": session_exercise.id,
+        "exercise_id": session_exercise.exercise_id,
+        "set_number": set_number,
+        "sets_completed": session_exercise.sets_completed,
+        "reps_completed": session_exercise.reps_completed,
+        "total_volume": session_exercise.total_volume,
+        "best_set_weight": session_exercise.best_set_weight,
+        "best_set_reps": session_exercise.best_set_reps,
+        "avg_rpe": session_exercise.avg_rpe,
+        "time_under_tension": session_exercise.time_under_tension,
+        "session_total_volume": session_total_volume,
+        "is_personal_record": len(prs_achieved) > 0,
+        "prs_achieved": prs_achieved,
+        "details": pr_details,
+    }
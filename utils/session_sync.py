@@ -0,0 +1,211 @@
+"""
+Idempotent batch upload of sessions recorded offline, keyed on
+client-generated UUIDs
+"""
+import json
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+
+import models
+import schemas
+from utils.counters import adjust_counters, counter_deltas, session_counter_values
+from utils.exercise_catalog import exercise_catalog
+from utils.last_session import record_session_start, refresh_last_session
+
+SESSION_SYNC_FIELDS = (
+    "started_at", "completed_at", "duration_minutes", "session_rpe", "user_readiness",
+    "training_load", "total_volume", "notes",
+)
+SESSION_EXERCISE_SYNC_FIELDS = (
+    "exercise_id", "sets_completed", "reps_completed", "weight", "notes", "sets_data",
+    "time_under_tension", "total_volume", "best_set_weight", "best_set_reps", "avg_rpe",
+)
+
+
+def _assign(target, values: dict) -> bool:
+    """Set attributes that differ; True if anything changed"""
+    changed = False
+    for field, value in values.items():
+        if getattr(target, field) != value:
+            setattr(target, field, value)
+            changed = True
+    return changed
+
+
+def _session_values(item: schemas.SyncSession, existing: Optional[models.WorkoutSession]) -> dict:
+    values = {field: getattr(item, field) for field in SESSION_SYNC_FIELDS}
+    if values["started_at"] is None:
+        # Keep the server's start time on updates; creations start now
+        values["started_at"] = existing.started_at if existing is not None else datetime.utcnow()
+    if values["completed_at"] is not None and values["duration_minutes"] is None:
+        values["duration_minutes"] = int((values["completed_at"] - values["started_at"]).total_seconds() / 60)
+    return values
+
+
+def _exercise_values(item: schemas.SyncSessionExercise) -> dict:
+    values = {field: getattr(item, field) for field in SESSION_EXERCISE_SYNC_FIELDS}
+    if item.sets_data is not None:
+        values["sets_data"] = json.dumps([entry.model_dump(exclude_none=True) for entry in item.sets_data])
+    return values
+
+
+class SessionSync:
+    """
+    Applies a batch of offline sessions for one user in a single transaction.
+    Each session is created or updated by (user, client_id), inside its own
+    savepoint: a failing item is reported and rolled back without affecting
+    the rest, and replaying a batch that was already applied changes nothing.
+    """
+
+    def __init__(self, db: Session, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self.counter_totals: Dict[str, int] = {}
+
+    def run(self, items: List[schemas.SyncSession]) -> List[dict]:
+        client_ids = [str(item.client_id) for item in items]
+        existing = self._load(client_ids)
+        workout_ids = {item.workout_id for item in items}
+        known_workouts = {row.id for row in self.db.query(models.Workout.id).filter(
+            models.Workout.id.in_(workout_ids),
+            models.Workout.user_id == self.user_id
+        )} if workout_ids else set()
+
+        results = []
+        for client_id, item in zip(client_ids, items):
+            error = self._validate(item, known_workouts, existing.get(client_id))
+            if error:
+                results.append({"client_id": client_id, "status": "failed", "error": error})
+                continue
+            results.append(self._apply_item(client_id, item, existing))
+
+        adjust_counters(self.db, self.user_id, **self.counter_totals)
+        self.db.commit()
+        return results
+
+    def _load(self, client_ids: List[str]) -> Dict[str, models.WorkoutSession]:
+        if not client_ids:
+            return {}
+        return {
+            session.client_id: session
+            for session in self.db.query(models.WorkoutSession).options(
+                selectinload(models.WorkoutSession.exercises)
+            ).filter(
+                models.WorkoutSession.user_id == self.user_id,
+                models.WorkoutSession.client_id.in_(client_ids)
+            )
+        }
+
+    def _validate(
+        self,
+        item: schemas.SyncSession,
+        known_workouts: set,
+        existing: Optional[models.WorkoutSession],
+    ) -> Optional[str]:
+        # Stored timestamps are naive UTC; comparing aware with naive would raise
+        for field in ("started_at", "completed_at"):
+            value = getattr(item, field)
+            if value is not None and value.tzinfo is not None:
+                setattr(item, field, value.astimezone(timezone.utc).replace(tzinfo=None))
+        if item.workout_id not in known_workouts:
+            return "Workout not found"
+        if existing is not None and existing.workout_id != item.workout_id:
+            return "workout_id cannot change"
+        catalog = exercise_catalog.snapshot
+        unknown = sorted({
+            exercise.exercise_id for exercise in item.exercises or [] if catalog.get(exercise.exercise_id) is None
+        })
+        if unknown:
+            return f"Exercises not found: {unknown}"
+        exercise_client_ids = [str(exercise.client_id) for exercise in item.exercises or []]
+        if len(set(exercise_client_ids)) != len(exercise_client_ids):
+            return "Duplicate exercise client_id"
+        return None
+
+    def _apply_item(
+        self,
+        client_id: str,
+        item: schemas.SyncSession,
+        existing: Dict[str, models.WorkoutSession],
+        retry: bool = True,
+    ) -> dict:
+        savepoint = self.db.begin_nested()
+        try:
+            status, db_session, deltas = self._upsert(client_id, item, existing.get(client_id))
+            self.db.flush()
+            savepoint.commit()
+        except IntegrityError:
+            savepoint.rollback()
+            # The same session was uploaded concurrently: apply this copy as an update
+            reloaded = self._load([client_id]) if retry else {}
+            if client_id not in reloaded:
+                return {"client_id": client_id, "status": "failed", "error": "Conflicting upload, retry later"}
+            existing.update(reloaded)
+            return self._apply_item(client_id, item, existing, retry=False)
+        except Exception as e:
+            savepoint.rollback()
+            print(f"Error syncing session {client_id}: {str(e)}")
+            return {"client_id": client_id, "status": "failed", "error": "Could not save session"}
+
+        existing[client_id] = db_session
+        for field, delta in deltas.items():
+            self.counter_totals[field] = self.counter_totals.get(field, 0) + delta
+        return {"client_id": client_id, "status": status, "session_id": db_session.id}
+
+    def _upsert(
+        self,
+        client_id: str,
+        item: schemas.SyncSession,
+        db_session: Optional[models.WorkoutSession],
+    ) -> Tuple[str, models.WorkoutSession, Dict[str, int]]:
+        """Returns the status, the session and its counter deltas"""
+        values = _session_values(item, db_session)
+        if db_session is None:
+            db_session = models.WorkoutSession(
+                user_id=self.user_id, workout_id=item.workout_id, client_id=client_id, **values
+            )
+            self.db.add(db_session)
+            self._sync_exercises(db_session, item.exercises or [])
+            self.db.flush()
+            record_session_start(self.db, db_session.workout_id, db_session.started_at)
+            return "created", db_session, counter_deltas({}, session_counter_values(db_session))
+
+        counters_before = session_counter_values(db_session)
+        started_at = db_session.started_at
+        changed = _assign(db_session, values)
+        if item.exercises is not None:
+            changed = self._sync_exercises(db_session, item.exercises) or changed
+        if not changed:
+            return "unchanged", db_session, {}
+        self.db.flush()
+        if db_session.started_at != started_at:
+            refresh_last_session(self.db, db_session.workout_id)
+        return "updated", db_session, counter_deltas(counters_before, session_counter_values(db_session))
+
+    def _sync_exercises(self, db_session: models.WorkoutSession, items: List[schemas.SyncSessionExercise]) -> bool:
+        """
+        Match the session's exercises by client_id: update, add, and remove
+        the synced ones missing from `items`. Entries logged without a
+        client_id (online, e.g. set by set) are never removed.
+        """
+        current = {entry.client_id: entry for entry in db_session.exercises if entry.client_id is not None}
+        changed = False
+        wanted = set()
+        for item in items:
+            client_id = str(item.client_id)
+            wanted.add(client_id)
+            values = _exercise_values(item)
+            entry = current.get(client_id)
+            if entry is None:
+                db_session.exercises.append(models.SessionExercise(client_id=client_id, **values))
+                changed = True
+            else:
+                changed = _assign(entry, values) or changed
+        for client_id, entry in current.items():
+            if client_id not in wanted:
+                db_session.exercises.remove(entry)
+                changed = True
+        return changed
@@ -0,0 +1,169 @@
+"""
+Cache-friendly static file serving for /uploads
+"""
+import os
+import re
+from mimetypes import guess_type
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, PathLike, StaticFiles
+from starlette.types import Message, Receive, Scope, Send
+
+# <sha256>.<ext> originals and <sha256>_<size>.<ext> derivatives never change
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}(_\d+)?$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Precompressed variants, in order of preference
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class UploadServingStats:
+    """Counters showing how much traffic the cache policy saves"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.requests = 0
+        self.full_responses = 0
+        self.partial_responses = 0
+        self.not_modified = 0
+        self.precompressed = 0
+        self.bytes_sent = 0
+        self.bytes_saved_not_modified = 0
+        self.bytes_saved_precompressed = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "full_responses": self.full_responses,
+            "partial_responses": self.partial_responses,
+            "not_modified": self.not_modified,
+            "precompressed": self.precompressed,
+            "bytes_sent": self.bytes_sent,
+            "bytes_saved_not_modified": self.bytes_saved_not_modified,
+            "bytes_saved_precompressed": self.bytes_saved_precompressed,
+            "bytes_saved_total": self.bytes_saved_not_modified + self.bytes_saved_precompressed,
+        }
+
+
+upload_stats = UploadServingStats()
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """{coding: q} from an Accept-Encoding header; a missing or bad q counts as 1"""
+    accepted: Dict[str, float] = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+class UploadStaticFiles(StaticFiles):
+    """
+    StaticFiles with a cache policy for content-addressed uploads:
+
+    - content-addressed files get a strong ETag derived from their name and
+      `Cache-Control: immutable`; anything else must revalidate
+    - `If-None-Match` / `If-Modified-Since` answer 304
+    - range requests are served by FileResponse (206)
+    - `<file>.br` / `<file>.gz` siblings are served when the client accepts them
+    """
+
+    def __init__(self, *args, stats: Optional[UploadServingStats] = None, precompressed: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats or upload_stats
+        self.precompressed = precompressed
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        stats = self.stats
+
+        async def counting_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if status_code == 200:
+                    stats.full_responses += 1
+                elif status_code == 206:
+                    stats.partial_responses += 1
+            elif message["type"] == "http.response.body":
+                stats.bytes_sent += len(message.get("body", b""))
+            await send(message)
+
+        stats.requests += 1
+        await super().__call__(scope, receive, counting_send)
+
+    def _select_variant(self, full_path: PathLike, request_headers: Headers) -> Tuple[PathLike, Optional[str], Optional[os.stat_result]]:
+        if not self.precompressed or "range" in request_headers:
+            return full_path, None, None
+        accepted = parse_accept_encoding(request_headers.get("accept-encoding", ""))
+        wildcard = accepted.get("*", 0.0)
+        # Highest q first (q=0 means "not acceptable"), our preference order breaks ties
+        candidates = sorted(
+            ((accepted.get(encoding, wildcard), position, encoding, suffix)
+             for position, (encoding, suffix) in enumerate(PRECOMPRESSED_ENCODINGS)),
+            key=lambda candidate: (-candidate[0], candidate[1])
+        )
+        for q, _, encoding, suffix in candidates:
+            if q <= 0:
+                break
+            try:
+                variant_stat = os.stat(f"{full_path}{suffix}")
+            except OSError:
+                continue
+            return f"{full_path}{suffix}", encoding, variant_stat
+        return full_path, None, None
+
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        name = Path(full_path).name
+        immutable = CONTENT_ADDRESSED_NAME.match(Path(name).stem) is not None
+
+        served_path, encoding, variant_stat = self._select_variant(full_path, request_headers)
+
+        headers = {
+            "cache-control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        }
+        if self.precompressed:
+            headers["vary"] = "Accept-Encoding"
+        if encoding is not None:
+            headers["content-encoding"] = encoding
+        if immutable:
+            headers["etag"] = f'"{name}-{encoding}"' if encoding else f'"{name}"'
+
+        response = FileResponse(
+            served_path,
+            status_code=status_code,
+            headers=headers,
+            media_type=guess_type(full_path)[0] or "text/plain",
+            stat_result=variant_stat or stat_result,
+        )
+
+        if self.is_not_modified(response.headers, request_headers):
+            self.stats.not_modified += 1
+            self.stats.bytes_saved_not_modified += (variant_stat or stat_result).st_size
+            return NotModifiedResponse(response.headers)
+
+        if encoding is not None:
+            self.stats.precompressed += 1
+            self.stats.bytes_saved_precompressed += stat_result.st_size - variant_stat.st_size
+        return response
@@ -0,0 +1,255 @@
+"""
+Per-user sync revisions and tombstones for the delta sync feed
+
+Every write to a user's workouts, plans or sessions stamps the changed rows
+with the next value of users.sync_revision (one value per transaction), and
+every delete leaves a SyncTombstone. A client that remembers the revision it
+last saw only has to fetch rows stamped after it.
+
+ORM writes are stamped by a before_flush hook. Bulk UPDATE/INSERT statements
+bypass it and must stamp their rows themselves (see stamp_rows).
+
+Tombstones are kept for SYNC_TOMBSTONE_RETENTION_DAYS (see
+prune_sync_tombstones.py). Pruning records the highest pruned revision in
+users.sync_pruned_revision; a client whose `since` is older than that may
+have missed deletions and has to resync from 0.
+"""
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, event, func, update
+from sqlalchemy.orm import Session, selectinload
+
+import models
+from database import SessionLocal
+
+load_dotenv()
+
+# Configuration
+SYNC_CHANGES_PAGE_SIZE = int(os.getenv("SYNC_CHANGES_PAGE_SIZE", 500))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", 90))
+
+# Synced models and their name in the feed
+SYNC_KINDS = {
+    models.Workout: "workouts",
+    models.WorkoutPlan: "workout_plans",
+    models.WorkoutSession: "sessions",
+}
+# Children are sent inside their parent, so changing one stamps the parent:
+# model -> (parent model, relationship, foreign key)
+SYNC_PARENTS = {
+    models.WorkoutExercise: (models.Workout, "workout", "workout_id"),
+    models.SessionExercise: (models.WorkoutSession, "session", "session_id"),
+}
+
+_REVISIONS_KEY = "sync_revisions"
+
+
+class RevisionAheadError(Exception):
+    """The client's revision is newer than the server's, e.g. after a restore"""
+
+
+class ResyncRequiredError(Exception):
+    """The client's revision is older than the oldest kept tombstone"""
+
+
+def _is_active_ancestor(transaction, current) -> bool:
+    while current is not None:
+        if current is transaction:
+            return transaction.is_active
+        current = current.parent
+    return False
+
+
+def next_revision(db: Session, user_id: int) -> int:
+    """
+    Revision for this transaction's changes to a user's data. The first call
+    in a transaction increments users.sync_revision; that row lock also
+    serializes the user's concurrent writers, so revisions become visible in
+    order. Later calls in the same transaction (or its savepoints) reuse it.
+    """
+    cache: Dict[int, Tuple[int, object]] = db.info.setdefault(_REVISIONS_KEY, {})
+    current = db.get_nested_transaction() or db.get_transaction()
+    cached = cache.get(user_id)
+    if cached is not None and _is_active_ancestor(cached[1], current):
+        return cached[0]
+
+    users = models.User.__table__
+    with db.no_autoflush:
+        revision = db.execute(
+            update(users)
+            .where(users.c.id == user_id)
+            .values(sync_revision=users.c.sync_revision + 1)
+            .returning(users.c.sync_revision)
+        ).scalar()
+    revision = revision or 0
+    cache[user_id] = (revision, db.get_nested_transaction() or db.get_transaction())
+    return revision
+
+
+def stamp_rows(db: Session, model, rows: Iterable[Tuple[int, int]]) -> None:
+    """Stamp rows changed by a bulk statement, given as (id, user_id) pairs"""
+    by_user: Dict[int, List[int]] = {}
+    for row_id, user_id in rows:
+        if user_id is not None:
+            by_user.setdefault(user_id, []).append(row_id)
+    table = model.__table__
+    for user_id, ids in by_user.items():
+        values = {"revision": next_revision(db, user_id)}
+        if "updated_at" in table.c:
+            values["updated_at"] = table.c.updated_at  # a revision bump is not an edit
+        db.execute(update(table).where(table.c.id.in_(ids)).values(**values))
+
+
+def record_deletions(db: Session, kind: str, rows: Iterable[Tuple[int, int]]) -> None:
+    """Tombstones for rows removed by a bulk DELETE, given as (id, user_id) pairs"""
+    for row_id, user_id in rows:
+        if user_id is not None:
+            db.add(models.SyncTombstone(
+                user_id=user_id, kind=kind, object_id=row_id, revision=next_revision(db, user_id)
+            ))
+
+
+def _stamp(db: Session, obj) -> None:
+    if obj.user_id is not None:
+        obj.revision = next_revision(db, obj.user_id)
+
+
+def _parent_of(db: Session, obj):
+    parent_model, relationship, foreign_key = SYNC_PARENTS[type(obj)]
+    # Loaded relationship first (new children have no foreign key yet),
+    # without triggering a lazy load in the middle of a flush
+    parent = obj.__dict__.get(relationship)
+    if parent is None and getattr(obj, foreign_key) is not None:
+        parent = db.get(parent_model, getattr(obj, foreign_key))
+    return parent
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _stamp_changes(db: Session, flush_context, instances) -> None:
+    deleted = set(db.deleted)
+    for obj in list(db.new) + list(db.dirty):
+        synced = type(obj) in SYNC_KINDS
+        if not synced and type(obj) not in SYNC_PARENTS:
+            continue
+        if obj not in db.new and not db.is_modified(obj, include_collections=False):
+            continue
+        target = obj if synced else _parent_of(db, obj)
+        if target is not None and target not in deleted:
+            _stamp(db, target)
+
+    for obj in deleted:
+        if type(obj) in SYNC_KINDS:
+            if obj.id is not None and obj.user_id is not None:
+                record_deletions(db, SYNC_KINDS[type(obj)], [(obj.id, obj.user_id)])
+        elif type(obj) in SYNC_PARENTS:
+            parent = _parent_of(db, obj)
+            if parent is not None and parent not in deleted:
+                _stamp(db, parent)
+
+
+def _pruned_revision(db: Session, user_id: int) -> int:
+    return db.query(models.User.sync_pruned_revision).filter(models.User.id == user_id).scalar() or 0
+
+
+def prune_tombstones(db: Session, before: datetime, user_ids: Iterable[int]) -> int:
+    """
+    Delete the given users' tombstones recorded before `before` (does not
+    commit). Everything up to the newest pruned revision goes, and that
+    revision is saved as users.sync_pruned_revision. Returns the number of
+    tombstones deleted.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+    tombstones = models.SyncTombstone.__table__
+    users = models.User.__table__
+    pruned = db.query(models.SyncTombstone.user_id, func.max(models.SyncTombstone.revision)).filter(
+        models.SyncTombstone.user_id.in_(user_ids),
+        models.SyncTombstone.deleted_at < before
+    ).group_by(models.SyncTombstone.user_id).all()
+
+    deleted = 0
+    for user_id, revision in pruned:
+        db.execute(
+            update(users)
+            .where(users.c.id == user_id, users.c.sync_pruned_revision < revision)
+            .values(sync_pruned_revision=revision)
+        )
+        deleted += db.execute(
+            delete(tombstones).where(tombstones.c.user_id == user_id, tombstones.c.revision <= revision)
+        ).rowcount
+    return deleted
+
+
+def _page_end(db: Session, model, user_id: int, since: int, limit: int, upto: int) -> int:
+    """
+    Highest revision that keeps this model's rows within `limit`. Rows of
+    one revision are never split across pages, so a single revision with
+    more rows than `limit` is returned whole.
+    """
+    revisions = [revision for (revision,) in db.query(model.revision).filter(
+        model.user_id == user_id,
+        model.revision > since,
+        model.revision <= upto
+    ).order_by(model.revision).limit(limit + 1)]
+    if len(revisions) <= limit:
+        return upto
+    cut = revisions[limit]
+    return cut - 1 if cut - 1 >= revisions[0] else cut
+
+
+def collect_changes(db: Session, user_id: int, since: int, limit: int = SYNC_CHANGES_PAGE_SIZE) -> dict:
+    """
+    Rows and tombstones stamped after `since`, up to a revision chosen so
+    each kind returns about `limit` rows. `revision` is what the client
+    should send as `since` next time; `has_more` asks it to do so right away.
+    """
+    latest, pruned = db.query(models.User.sync_revision, models.User.sync_pruned_revision).filter(
+        models.User.id == user_id
+    ).first() or (0, 0)
+    if since > latest:
+        raise RevisionAheadError()
+    if 0 < since < pruned:
+        # Deletions after `since` may have been pruned; since=0 needs no tombstones
+        raise ResyncRequiredError()
+    changes = {
+        "since": since, "revision": latest, "has_more": False,
+        "workouts": [], "workout_plans": [], "sessions": [], "deleted": [],
+    }
+    if since == latest:
+        # Nothing changed: the common case costs a single query
+        return changes
+
+    upto = latest
+    for model in (*SYNC_KINDS, models.SyncTombstone):
+        upto = _page_end(db, model, user_id, since, limit, upto)
+
+    def changed(model, *options):
+        return db.query(model).options(*options).filter(
+            model.user_id == user_id,
+            model.revision > since,
+            model.revision <= upto
+        ).order_by(model.revision, model.id).all()
+
+    changes["workouts"] = changed(
+        models.Workout,
+        selectinload(models.Workout.exercises).selectinload(models.WorkoutExercise.exercise)
+    )
+    changes["workout_plans"] = changed(models.WorkoutPlan)
+    changes["sessions"] = changed(
+        models.WorkoutSession,
+        selectinload(models.WorkoutSession.exercises).selectinload(models.SessionExercise.exercise)
+    )
+    changes["deleted"] = [
+        {"kind": tombstone.kind, "id": tombstone.object_id, "revision": tombstone.revision}
+        for tombstone in changed(models.SyncTombstone)
+    ]
+    if 0 < since < _pruned_revision(db, user_id):
+        # Pruned while this page was read: its deletions may be incomplete
+        raise ResyncRequiredError()
+    changes["revision"] = upto
+    changes["has_more"] = upto < latest
+    return changes
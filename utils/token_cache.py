@@ -0,0 +1,102 @@
+"""
+Bounded LRU cache of already-verified JWTs
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+import schemas
+
+
+class VerifiedTokenCache:
+    """
+    Remember tokens whose signature has already been checked so repeat
+    requests with the same bearer token skip `jwt.decode`.
+
+    Entries are keyed by a SHA-256 digest of the raw token (the token itself
+    is never kept in memory) and expire at the token's own `exp` claim.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[schemas.TokenData, float]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, token: str) -> Optional[schemas.TokenData]:
+        """Return cached token data, or None if missing or expired"""
+        if not self.enabled:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            token_data, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return token_data
+
+    def put(self, token: str, token_data: schemas.TokenData, expires_at: float) -> None:
+        """Store verified token data until `expires_at` (unix timestamp)"""
+        if not self.enabled or expires_at <= time.time():
+            return
+        key = self._key(token)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (token_data, expires_at)
+            self._keys_by_user.setdefault(token_data.user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+    def discard(self, token: str) -> None:
+        """Drop a single token (e.g. after it has been revoked)"""
+        with self._lock:
+            self._remove(self._key(token))
+
+    def discard_user(self, user_id: int) -> None:
+        """Drop every cached token belonging to a user"""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> None:
+        # Caller must hold the lock
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[0].user_id
+        user_keys = self._keys_by_user.get(user_id)
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._keys_by_user[user_id]
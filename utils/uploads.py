@@ -0,0 +1,185 @@
+"""
+Streaming, content-addressed storage for uploaded files
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+UPLOAD_DIR = Path("uploads")
+# Partial uploads: outside the public /uploads mount, but next to it so the
+# final os.replace stays on the same filesystem
+UPLOAD_TMP_DIR = Path(".uploads-tmp")
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_PROFILE_IMAGE_BYTES = 5 * 1024 * 1024
+
+MAX_PROFILE_PICTURE_REFERENCE_LENGTH = 2048
+
+IMAGE_EXTENSIONS: Dict[str, str] = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+STORED_UPLOAD_NAME = re.compile(r"^(?P<digest>[0-9a-f]{64})(?P<extension>\.[a-z]+)$")
+DATA_URI = re.compile(r"^data:(?P<content_type>[\w/+.-]+)?(;[\w=-]+)*;base64,", re.IGNORECASE)
+BASE64_CHARS = re.compile(r"^[A-Za-z0-9+/\s]+={0,2}\s*$")
+
+
+def content_path(digest: str, extension: str) -> Path:
+    """Path of a content-addressed file, fanned out by the first two hex digits"""
+    return UPLOAD_DIR / digest[:2] / f"{digest}{extension}"
+
+
+def _finalize(temp_path: str, final_path: Path) -> None:
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    if final_path.exists():
+        # Same content already stored
+        os.remove(temp_path)
+        return
+    os.replace(temp_path, final_path)
+
+
+async def store_upload(file: UploadFile, extension: str, max_bytes: int) -> Path:
+    """
+    Stream an upload to disk in chunks, hashing as it goes, and move it to its
+    content-addressed location. Aborts as soon as `max_bytes` is exceeded.
+    All disk I/O runs in the threadpool so the event loop is never blocked.
+    """
+    await run_in_threadpool(UPLOAD_TMP_DIR.mkdir, parents=True, exist_ok=True)
+    temp_file = await run_in_threadpool(
+        tempfile.NamedTemporaryFile, dir=UPLOAD_TMP_DIR, delete=False
+    )
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"File too large (max {max_bytes // (1024 * 1024)}MB)"
+                )
+            hasher.update(chunk)
+            await run_in_threadpool(temp_file.write, chunk)
+        await run_in_threadpool(temp_file.close)
+    except BaseException:
+        await run_in_threadpool(temp_file.close)
+        await run_in_threadpool(os.remove, temp_file.name)
+        raise
+
+    final_path = content_path(hasher.hexdigest(), extension)
+    await run_in_threadpool(_finalize, temp_file.name, final_path)
+    return final_path
+
+
+def store_bytes(data: bytes, extension: str) -> Path:
+    """Write an in-memory payload to its content-addressed location"""
+    final_path = content_path(hashlib.sha256(data).hexdigest(), extension)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    if not final_path.exists():
+        UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=UPLOAD_TMP_DIR, delete=False) as temp_file:
+            temp_file.write(data)
+        _finalize(temp_file.name, final_path)
+    return final_path
+
+
+def _sniff_image_type(data: bytes) -> Optional[str]:
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def decode_base64_image(value: str) -> Optional[Tuple[bytes, str]]:
+    """
+    Decode a data URI or bare base64 image into (bytes, extension).
+    Returns None when the value does not look like base64 at all.
+    """
+    match = DATA_URI.match(value)
+    if match:
+        payload = value[match.end():]
+    elif len(value) > MAX_PROFILE_PICTURE_REFERENCE_LENGTH and BASE64_CHARS.match(value):
+        payload = value
+    else:
+        return None
+
+    try:
+        data = base64.b64decode("".join(payload.split()), validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid base64 image data")
+
+    if len(data) > MAX_PROFILE_IMAGE_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large (max {MAX_PROFILE_IMAGE_BYTES // (1024 * 1024)}MB)"
+        )
+
+    content_type = _sniff_image_type(data)
+    if content_type is None:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, GIF, and WebP allowed")
+    return data, IMAGE_EXTENSIONS[content_type]
+
+
+def externalize_profile_picture(value: str) -> Tuple[str, bool]:
+    """
+    Keep only a short reference in the users table: base64 payloads are moved
+    into the uploads store and replaced by their path. Returns the reference
+    and whether it is a file in the store, i.e. one derivatives can be made of.
+    """
+    if not isinstance(value, str):
+        raise HTTPException(status_code=400, detail="profile_picture must be a string")
+
+    decoded = decode_base64_image(value)
+    if decoded is not None:
+        data, extension = decoded
+        return store_bytes(data, extension).as_posix(), True
+
+    if len(value) > MAX_PROFILE_PICTURE_REFERENCE_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail="profile_picture must be a URL, an uploaded file path or a base64 image"
+        )
+    if is_stored_upload(value):
+        if not Path(value).is_file():
+            raise HTTPException(status_code=400, detail="profile_picture refers to an unknown upload")
+        return Path(value).as_posix(), True
+    if Path(value).parts[:1] in ((UPLOAD_DIR.name,), ("/",), ("..",)):
+        # A local path that is not in the store
+        raise HTTPException(status_code=400, detail="profile_picture refers to an unknown upload")
+    return value, False
+
+
+def is_stored_upload(value: Optional[str]) -> bool:
+    """
+    True if the value is the path of a content-addressed image in the uploads
+    store (uploads/ab/<sha256>.<ext>). Anything else, e.g. uploads/../x.png,
+    is not treated as ours.
+    """
+    if not value:
+        return False
+    path = Path(value)
+    match = STORED_UPLOAD_NAME.match(path.name)
+    if match is None or match.group("extension") not in IMAGE_EXTENSIONS.values():
+        return False
+    if path != content_path(match.group("digest"), match.group("extension")):
+        return False
+    return path.resolve().is_relative_to(UPLOAD_DIR.resolve())
@@ -0,0 +1,236 @@
+"""
+Chunked, bottom-up deletion of a user and everything they own
+"""
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Query, Session
+
+import models
+from utils.last_session import refresh_last_session
+from utils.sync_feed import stamp_rows
+
+load_dotenv()
+
+# Configuration
+USER_DELETE_CHUNK_SIZE = int(os.getenv("USER_DELETE_CHUNK_SIZE", 1000))
+
+
+def _user_workout_ids(user_id: int):
+    return select(models.Workout.id).where(models.Workout.user_id == user_id)
+
+
+def _user_session_ids(user_id: int):
+    return select(models.WorkoutSession.id).where(models.WorkoutSession.user_id == user_id)
+
+
+def _used_by_others(user_id: int):
+    """Exercises referenced from rows that are not deleted with the user"""
+    workout_exercises = select(models.WorkoutExercise.exercise_id).where(or_(
+        models.WorkoutExercise.workout_id.is_(None),
+        models.WorkoutExercise.workout_id.not_in(_user_workout_ids(user_id))
+    ))
+    session_exercises = select(models.SessionExercise.exercise_id).where(or_(
+        models.SessionExercise.session_id.is_(None),
+        models.SessionExercise.session_id.not_in(_user_session_ids(user_id))
+    ))
+    return or_(models.Exercise.id.in_(workout_exercises), models.Exercise.id.in_(session_exercises))
+
+
+# (progress key, model, query selecting ids of the next rows to delete), children first
+DELETION_STEPS: List[Tuple[str, type, Callable[[Session, int], Query]]] = [
+    ("session_exercises", models.SessionExercise, lambda db, user_id: db.query(models.SessionExercise.id).join(
+        models.WorkoutSession, models.SessionExercise.session_id == models.WorkoutSession.id
+    ).filter(models.WorkoutSession.user_id == user_id)),
+    ("workout_sessions", models.WorkoutSession, lambda db, user_id: db.query(models.WorkoutSession.id).filter(
+        models.WorkoutSession.user_id == user_id
+    )),
+    ("workout_exercises", models.WorkoutExercise, lambda db, user_id: db.query(models.WorkoutExercise.id).filter(
+        models.WorkoutExercise.workout_id.in_(_user_workout_ids(user_id))
+    )),
+    ("workouts", models.Workout, lambda db, user_id: db.query(models.Workout.id).filter(
+        models.Workout.user_id == user_id
+    )),
+    ("exercises", models.Exercise, lambda db, user_id: db.query(models.Exercise.id).filter(
+        models.Exercise.user_id == user_id
+    )),
+    ("workout_plans", models.WorkoutPlan, lambda db, user_id: db.query(models.WorkoutPlan.id).filter(
+        models.WorkoutPlan.user_id == user_id
+    )),
+    ("sync_tombstones", models.SyncTombstone, lambda db, user_id: db.query(models.SyncTombstone.id).filter(
+        models.SyncTombstone.user_id == user_id
+    )),
+]
+
+
+class UserDeletionJob:
+    """
+    Deletes a user's rows bottom-up in chunks of `chunk_size`, committing after
+    every chunk so no transaction holds locks on a large range of rows.
+    Progress is readable from another thread while the job runs.
+    """
+
+    def __init__(self, user_id: int, chunk_size: int = USER_DELETE_CHUNK_SIZE):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.status = "pending"
+        self.current_step: Optional[str] = None
+        self.deleted: Dict[str, int] = {name: 0 for name, _, _ in DELETION_STEPS}
+        self.detached_sessions = 0
+        self.released_exercises = 0
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "current_step": self.current_step,
+            "deleted": dict(self.deleted),
+            "detached_sessions": self.detached_sessions,
+            "released_exercises": self.released_exercises,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def _detach_foreign_sessions(self, db: Session) -> None:
+        """
+        Other users' sessions logged against this user's workouts are kept:
+        their workout_id is cleared (in chunks) so the workouts can be deleted.
+        """
+        self.current_step = "detach_sessions"
+        while True:
+            ids = [row[0] for row in db.query(models.WorkoutSession.id).filter(
+                models.WorkoutSession.workout_id.in_(_user_workout_ids(self.user_id)),
+                models.WorkoutSession.user_id != self.user_id
+            ).limit(self.chunk_size)]
+            if not ids:
+                break
+            changed = db.execute(
+                update(models.WorkoutSession)
+                .where(models.WorkoutSession.id.in_(ids))
+                .values(workout_id=None)
+                .returning(models.WorkoutSession.id, models.WorkoutSession.user_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            stamp_rows(db, models.WorkoutSession, changed)
+            db.commit()
+            self.detached_sessions += len(ids)
+
+    def _release_shared_exercises(self, db: Session) -> None:
+        """
+        Custom exercises that other users' workouts or sessions use are kept
+        in the catalog without an owner. One whose name clashes with a
+        built-in exercise gets its id appended, as built-in names are unique.
+        """
+        self.current_step = "release_exercises"
+        while True:
+            rows = db.query(models.Exercise.id, models.Exercise.name).filter(
+                models.Exercise.user_id == self.user_id,
+                _used_by_others(self.user_id)
+            ).limit(self.chunk_size).all()
+            if not rows:
+                break
+            builtin_names = {name for (name,) in db.query(models.Exercise.name).filter(
+                models.Exercise.user_id.is_(None),
+                models.Exercise.name.in_([name for _, name in rows])
+            )}
+            for exercise_id, name in rows:
+                if name in builtin_names:
+                    db.execute(
+                        update(models.Exercise)
+                        .where(models.Exercise.id == exercise_id)
+                        .values(name=f"{name} #{exercise_id}")
+                    )
+            db.execute(
+                update(models.Exercise)
+                .where(models.Exercise.id.in_([exercise_id for exercise_id, _ in rows]))
+                .values(user_id=None)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            self.released_exercises += len(rows)
+
+    def run(self, session_factory: Callable[[], Session]) -> None:
+        self.status = "running"
+        db = session_factory()
+        try:
+            # Other users' workouts whose last_session_at includes this user's sessions
+            affected_workouts = {
+                workout_id for (workout_id,) in db.query(models.WorkoutSession.workout_id).join(
+                    models.Workout, models.WorkoutSession.workout_id == models.Workout.id
+                ).filter(
+                    models.WorkoutSession.user_id == self.user_id,
+                    models.Workout.user_id != self.user_id
+                ).distinct()
+            }
+
+            self._detach_foreign_sessions(db)
+            self._release_shared_exercises(db)
+
+            for name, model, select_ids in DELETION_STEPS:
+                self.current_step = name
+                while True:
+                    ids = [row[0] for row in select_ids(db, self.user_id).limit(self.chunk_size)]
+                    if not ids:
+                        break
+                    db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+                    db.commit()
+                    self.deleted[name] += len(ids)
+
+            self.current_step = "user"
+            db.query(models.UserCounters).filter(models.UserCounters.user_id == self.user_id).delete()
+            db.query(models.User).filter(models.User.id == self.user_id).delete()
+            for workout_id in affected_workouts:
+                refresh_last_session(db, workout_id)
+            db.commit()
+
+            self.current_step = None
+            self.status = "completed"
+        except Exception as e:
+            db.rollback()
+            self.status = "failed"
+            self.error = str(e)
+            print(f"Error deleting user {self.user_id}: {str(e)}")
+        finally:
+            self.finished_at = datetime.utcnow()
+            db.close()
+
+
+class UserDeletionRegistry:
+    """In-process registry of deletion jobs, so progress can be polled"""
+
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self._jobs: Dict[str, UserDeletionJob] = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id: int) -> UserDeletionJob:
+        job = UserDeletionJob(user_id)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                del self._jobs[next(iter(self._jobs))]
+        return job
+
+    def get(self, job_id: str) -> Optional[UserDeletionJob]:
+        return self._jobs.get(job_id)
+
+    def active_for_user(self, user_id: int) -> Optional[UserDeletionJob]:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.user_id == user_id and job.status in ("pending", "running"):
+                    return job
+        return None
+
+
+deletion_jobs = UserDeletionRegistry()
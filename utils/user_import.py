@@ -0,0 +1,198 @@
+"""
+Bulk user import from NDJSON or CSV
+"""
+import codecs
+import csv
+import json
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+from utils.passwords import get_password_hashes
+
+load_dotenv()
+
+# Configuration
+USER_IMPORT_BATCH_SIZE = int(os.getenv("USER_IMPORT_BATCH_SIZE", 500))
+USER_IMPORT_MAX_ERRORS = int(os.getenv("USER_IMPORT_MAX_ERRORS", 1000))
+
+IMPORT_FORMATS = ("ndjson", "csv")
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Guess the import format from the upload's name or content type"""
+    name = (filename or "").lower()
+    content_type = (content_type or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    return None
+
+
+def _iter_lines(stream: BinaryIO) -> Iterator[str]:
+    # Incremental decoding: the file is read line by line, never loaded whole
+    return codecs.getreader("utf-8-sig")(stream)
+
+
+def iter_rows(stream: BinaryIO, import_format: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Yield (line number, row) pairs. `row` is a dict, or a ValueError for a
+    line that could not be parsed.
+    """
+    if import_format == "csv":
+        reader = csv.DictReader(_iter_lines(stream))
+        for row in reader:
+            if None in row:
+                yield reader.line_num, ValueError("Too many fields")
+                continue
+            # Empty CSV cells mean "not provided"
+            yield reader.line_num, {key: value for key, value in row.items() if value not in ("", None)}
+        return
+
+    for line_number, line in enumerate(_iter_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield line_number, ValueError("Each line must be a JSON object")
+            continue
+        yield line_number, row
+
+
+class UserImportResult:
+    """Running totals and per-row errors of an import"""
+
+    def __init__(self, max_errors: int = USER_IMPORT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.processed = 0
+        self.created = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def add_error(self, line: int, error: str, email: Optional[str] = None) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "email": email, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "created": self.created,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+
+class UserImporter:
+    """
+    Imports users in batches: every batch costs one uniqueness query, one
+    parallel hashing pass on the password pool and one multi-row INSERT.
+    """
+
+    def __init__(self, db: Session, batch_size: int = USER_IMPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.result = UserImportResult()
+        # Emails/usernames already taken by earlier rows of the same file
+        self._seen_emails: Set[str] = set()
+        self._seen_usernames: Set[str] = set()
+
+    def run(self, rows: Iterator[Tuple[int, Any]]) -> UserImportResult:
+        batch: List[Tuple[int, schemas.UserCreate]] = []
+        try:
+            for line, row in rows:
+                self._add_row(batch, line, row)
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch)
+                    batch = []
+        except (UnicodeDecodeError, csv.Error) as e:
+            # Unreadable from here on: keep what was parsed so far
+            self.result.add_error(self.result.processed + 1, f"Could not read import file: {e}")
+        if batch:
+            self._import_batch(batch)
+        return self.result
+
+    def _add_row(self, batch: List[Tuple[int, schemas.UserCreate]], line: int, row: Any) -> None:
+        self.result.processed += 1
+        if isinstance(row, Exception):
+            self.result.add_error(line, str(row))
+            return
+        try:
+            user = schemas.UserCreate.model_validate(row)
+        except ValidationError as e:
+            self.result.add_error(line, _validation_message(e), row.get("email"))
+            return
+        batch.append((line, user))
+
+    def _import_batch(self, batch: List[Tuple[int, schemas.UserCreate]]) -> None:
+        emails = {user.email for _, user in batch}
+        usernames = {user.username for _, user in batch}
+        taken_emails: Set[str] = set()
+        taken_usernames: Set[str] = set()
+        for email, username in self.db.query(models.User.email, models.User.username).filter(
+            or_(models.User.email.in_(emails), models.User.username.in_(usernames))
+        ):
+            taken_emails.add(email)
+            taken_usernames.add(username)
+
+        accepted: List[Tuple[int, schemas.UserCreate]] = []
+        for line, user in batch:
+            if user.email in taken_emails or user.email in self._seen_emails:
+                self.result.add_error(line, "Email already registered", user.email)
+            elif user.username in taken_usernames or user.username in self._seen_usernames:
+                self.result.add_error(line, "Username already taken", user.email)
+            else:
+                self._seen_emails.add(user.email)
+                self._seen_usernames.add(user.username)
+                accepted.append((line, user))
+        if not accepted:
+            return
+
+        hashes = get_password_hashes([user.password for _, user in accepted])
+        values = [
+            {
+                "username": user.username,
+                "email": user.email,
+                "full_name": user.full_name,
+                "hashed_password": hashed_password,
+            }
+            for (_, user), hashed_password in zip(accepted, hashes)
+        ]
+
+        try:
+            self.db.execute(insert(models.User), values)
+            self.db.commit()
+            self.result.created += len(values)
+        except IntegrityError:
+            # Someone registered one of these users concurrently: retry row by row
+            self.db.rollback()
+            self._insert_rows(accepted, values)
+
+    def _insert_rows(self, accepted: List[Tuple[int, schemas.UserCreate]], values: List[dict]) -> None:
+        for (line, user), row in zip(accepted, values):
+            try:
+                self.db.execute(insert(models.User), [row])
+                self.db.commit()
+                self.result.created += 1
+            except IntegrityError:
+                self.db.rollback()
+                self.result.add_error(line, "Email or username already exists", user.email)
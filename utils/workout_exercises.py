@@ -0,0 +1,112 @@
+"""
+Diff-based updates of a workout's exercise list
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+import models
+import schemas
+
+WORKOUT_EXERCISE_FIELDS = ("exercise_id", "sets", "reps", "rest_seconds", "order")
+
+
+def validate_exercise_ids(db: Session, exercise_ids: Iterable[int]) -> None:
+    """Check every referenced exercise exists, with one query for the whole set"""
+    wanted = set(exercise_ids)
+    if not wanted:
+        return
+    found = {row.id for row in db.query(models.Exercise.id).filter(models.Exercise.id.in_(wanted))}
+    missing = sorted(wanted - found)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Unknown exercise ids: {missing}")
+
+
+def build_workout_exercises(items: Sequence[schemas.WorkoutExerciseCreate]) -> List[models.WorkoutExercise]:
+    """New WorkoutExercise rows for a workout being created (order defaults to position)"""
+    return [
+        models.WorkoutExercise(**{field: value[field] for field in WORKOUT_EXERCISE_FIELDS})
+        for value in _incoming_values(items)
+    ]
+
+
+def _incoming_values(items: Sequence[schemas.WorkoutExerciseCreate]) -> List[dict]:
+    values = []
+    for index, item in enumerate(items):
+        value = {field: getattr(item, field) for field in WORKOUT_EXERCISE_FIELDS}
+        # If order is not provided, use the index
+        if value["order"] is None:
+            value["order"] = index
+        value["id"] = getattr(item, "id", None)
+        values.append(value)
+    return values
+
+
+def sync_workout_exercises(
+    db: Session,
+    workout: models.Workout,
+    items: Sequence[schemas.WorkoutExerciseCreate],
+) -> Dict[str, int]:
+    """
+    Make the workout's exercises match `items` with the fewest writes.
+
+    Incoming items are matched to existing rows by explicit `id`, then by
+    (exercise_id, order), then by exercise_id alone (a reorder). Matched rows
+    are updated only where a field differs; the rest are inserted or deleted.
+    Does not commit. Returns counts of inserted/updated/deleted/unchanged rows.
+    """
+    existing = {row.id: row for row in workout.exercises}
+    incoming = _incoming_values(items)
+    # Exercises already in the workout are known to exist
+    validate_exercise_ids(db, {value["exercise_id"] for value in incoming} - {
+        row.exercise_id for row in existing.values()
+    })
+    matches: List[Optional[models.WorkoutExercise]] = [None] * len(incoming)
+
+    for index, value in enumerate(incoming):
+        if value["id"] is None:
+            continue
+        row = existing.pop(value["id"], None)
+        if row is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Workout exercise {value['id']} does not belong to this workout"
+            )
+        matches[index] = row
+
+    by_position = {(row.exercise_id, row.order): row for row in existing.values()}
+    for index, value in enumerate(incoming):
+        if matches[index] is None:
+            row = by_position.pop((value["exercise_id"], value["order"]), None)
+            if row is not None:
+                existing.pop(row.id)
+                matches[index] = row
+
+    for index, value in enumerate(incoming):
+        if matches[index] is None:
+            row = next((row for row in existing.values() if row.exercise_id == value["exercise_id"]), None)
+            if row is not None:
+                existing.pop(row.id)
+                matches[index] = row
+
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    for value, row in zip(incoming, matches):
+        if row is None:
+            workout.exercises.append(models.WorkoutExercise(
+                **{field: value[field] for field in WORKOUT_EXERCISE_FIELDS}
+            ))
+            counts["inserted"] += 1
+            continue
+        changed = False
+        for field in WORKOUT_EXERCISE_FIELDS:
+            if getattr(row, field) != value[field]:
+                setattr(row, field, value[field])
+                changed = True
+        counts["updated" if changed else "unchanged"] += 1
+
+    for row in existing.values():
+        # delete-orphan cascade issues the DELETE
+        workout.exercises.remove(row)
+        counts["deleted"] += 1
+    return counts